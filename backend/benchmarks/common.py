@@ -0,0 +1,122 @@
+"""
+Shared pieces of the load benchmarks: the target client (the ASGI app in-process
+or a running server), latency recording and percentile summaries.
+"""
+
+from contextlib import asynccontextmanager
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from httpx import AsyncClient, ASGITransport
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+MEMORY = "memory"
+
+
+@asynccontextmanager
+async def open_target(target: Optional[str], mongo: str = MEMORY, db_name: str = "benchmark", timeout: float = 30.0) -> AsyncIterator[AsyncClient]:
+    """
+    Client for a running server at `target`, or for the ASGI app in-process when
+    target is None. In-process runs the app's lifespan against `mongo`: a MongoDB
+    URL, or "memory" for an in-memory mongomock-motor database.
+    """
+    if target:
+        async with AsyncClient(base_url=target.rstrip("/"), timeout=timeout) as client:
+            yield client
+        return
+
+    os.environ["DB_NAME"] = db_name
+    # Contact bursts must not turn into real emails; unconfigured SMTP makes the outbox skip them
+    os.environ["SMTP_USER"] = ""
+    os.environ["SMTP_PASS"] = ""
+    if mongo != MEMORY:
+        os.environ["MONGO_URL"] = mongo
+
+    import database
+    import server
+
+    if mongo == MEMORY:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--mongo memory needs mongomock-motor (pip install mongomock-motor), or pass a MongoDB URL")
+        database.use_client(AsyncMongoMockClient())
+
+    async with server.app.router.lifespan_context(server.app):
+        transport = ASGITransport(app=server.app, client=("127.0.0.1", 50000))
+        async with AsyncClient(transport=transport, base_url="http://benchmark", timeout=timeout) as client:
+            yield client
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class LatencyRecorder:
+    """Latencies and outcomes per endpoint label"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, client: AsyncClient, label: str, method: str, path: str, **kwargs):
+        """Send one request and record its latency; 5xx and transport errors count as errors"""
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = response.status_code
+        except Exception:
+            status = 0
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][status] += 1
+        if status == 0 or status >= 500:
+            self.errors[label] += 1
+
+    def summary(self, elapsed: float) -> dict:
+        """Throughput, error rate and latency percentiles (ms) per endpoint and overall"""
+        endpoints = {}
+        everything: List[float] = []
+        for label, latencies in sorted(self.latencies.items()):
+            ordered = sorted(latencies)
+            everything.extend(ordered)
+            endpoints[label] = self._stats(ordered, self.errors[label], elapsed)
+            endpoints[label]["statuses"] = {str(status): count for status, count in sorted(self.statuses[label].items())}
+        total = self._stats(sorted(everything), sum(self.errors.values()), elapsed)
+        return {"elapsed": round(elapsed, 3), "total": total, "endpoints": endpoints}
+
+    @staticmethod
+    def _stats(ordered: List[float], errors: int, elapsed: float) -> dict:
+        count = len(ordered)
+        return {
+            "requests": count,
+            "errors": errors,
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "throughput": round(count / elapsed, 1) if elapsed else 0.0,
+            "mean_ms": round(sum(ordered) / count * 1000, 3) if count else 0.0,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0
+        }
+
+
+def print_summary(title: str, summary: dict):
+    print(f"\n{title}  ({summary['elapsed']:.2f}s)")
+    print(f"{'endpoint':<40}{'req':>8}{'err%':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    rows = list(summary["endpoints"].items()) + [("all", summary["total"])]
+    for label, stats in rows:
+        print(
+            f"{label:<40}{stats['requests']:>8}{stats['error_rate'] * 100:>7.1f}{stats['throughput']:>9.0f}"
+            f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+        )
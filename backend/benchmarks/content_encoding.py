@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark for content list responses.
+Compares requests/sec of the original path (build Service/Product/Project models
+and let FastAPI validate and encode them through response_model) against the
+pre-encoded fast path used by the content cache.
+
+Runs fully in-process against the default seed data, so no MongoDB is needed:
+
+    cd backend && python benchmarks/content_encoding.py --requests 5000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from httpx import ASGITransport, AsyncClient
+
+from models import (
+    Service, ServiceListResponse,
+    Product, ProductListResponse,
+    Project, ProjectListResponse
+)
+from utils.responses import EncodedBody, PreEncodedJSONResponse, brotli
+from utils.seed_data import get_default_services, get_default_products, get_default_projects
+
+CONTENT = {
+    "services": (get_default_services(), Service, ServiceListResponse),
+    "products": (get_default_products(), Product, ProductListResponse),
+    "projects": (get_default_projects(), Project, ProjectListResponse),
+}
+
+
+def build_legacy_app() -> FastAPI:
+    """Per-request model construction, validation and encoding (pre-cache behaviour)"""
+    app = FastAPI()
+
+    def add_route(name, documents, item_model, list_model):
+        @app.get(f"/api/{name}", response_model=list_model)
+        async def endpoint():
+            items = [item_model(**document) for document in documents]
+            return list_model(**{name: items, "total": len(items)})
+
+    for name, (documents, item_model, list_model) in CONTENT.items():
+        add_route(name, documents, item_model, list_model)
+    return app
+
+
+def build_fast_app() -> FastAPI:
+    """Bytes serialized once at startup and served directly"""
+    app = FastAPI()
+
+    def add_route(name, body, list_model):
+        @app.get(f"/api/{name}", response_model=list_model)
+        async def endpoint(request: Request):
+            return PreEncodedJSONResponse(body, request.headers.get("accept-encoding"))
+
+    for name, (documents, item_model, list_model) in CONTENT.items():
+        items = [item_model(**document) for document in documents]
+        payload = jsonable_encoder(list_model(**{name: items, "total": len(items)}))
+        add_route(name, EncodedBody(payload), list_model)
+    return app
+
+
+async def run(app: FastAPI, path: str, requests: int, concurrency: int, accept_encoding: str) -> float:
+    """Return requests/sec for `requests` GETs of `path` at the given concurrency"""
+    headers = {"accept-encoding": accept_encoding}
+    remaining = iter(range(requests))
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        # Warm up routing and any lazily built state
+        await client.get(path, headers=headers)
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get(path, headers=headers)
+                assert response.status_code == 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return requests / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    legacy = build_legacy_app()
+    fast = build_fast_app()
+
+    variants = [("pre-encoded", "identity"), ("pre-encoded gzip", "gzip")]
+    if brotli is not None:
+        variants.append(("pre-encoded br", "br"))
+
+    print(f"{'endpoint':<16}{'variant':<22}{'req/s':>10}{'speedup':>10}")
+    for name in CONTENT:
+        path = f"/api/{name}"
+        baseline = await run(legacy, path, args.requests, args.concurrency, "identity")
+        print(f"{path:<16}{'response_model':<22}{baseline:>10.0f}{'1.00x':>10}")
+        for label, encoding in variants:
+            rate = await run(fast, path, args.requests, args.concurrency, encoding)
+            print(f"{path:<16}{label:<22}{rate:>10.0f}{rate / baseline:>9.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
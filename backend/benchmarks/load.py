@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the public and admin endpoints.
+Runs fixed, seeded scenarios and reports throughput and p50/p95/p99 latency per
+endpoint, saving the results as JSON so runs can be compared for regressions.
+
+By default the ASGI app runs in-process (with its lifespan and background jobs)
+on an in-memory database, so nothing needs to be running:
+
+    cd backend && python benchmarks/load.py --requests 2000 --concurrency 32
+
+The in-memory database has no indexes and scans collections on every query, so
+it measures the app's own overhead; use a real mongod for database-bound numbers.
+Against a local mongod, or a server already running under uvicorn:
+
+    python benchmarks/load.py --mongo mongodb://localhost:27017 --db-name benchmark
+    python benchmarks/load.py --target http://localhost:8001
+
+Compare a run with an earlier one (exits 1 when p95 or throughput regress by
+more than --threshold percent):
+
+    python benchmarks/load.py --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+import json
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from common import MEMORY, LatencyRecorder, open_target, print_summary
+
+PAGES = ["home", "services", "products", "projects", "about", "contact"]
+SERVICES = ["Web Development", "Mobile App Development", "Cloud Solutions", "IT Consulting"]
+REFERRERS = [None, "https://www.google.com/search", "https://www.linkedin.com/feed", "https://github.com/"]
+
+# (method, path, request kwargs)
+Request = Tuple[str, str, dict]
+# weight, endpoint label, builder of the i-th request
+Step = Tuple[int, str, Callable[[random.Random, int], Request]]
+
+
+def _get(path: str) -> Callable[[random.Random, int], Request]:
+    return lambda rng, i: ("GET", path, {})
+
+
+def _contact(rng: random.Random, i: int) -> Request:
+    return ("POST", "/api/contacts/", {"json": {
+        "name": f"Benchmark {i}",
+        "email": f"bench{i}@example.com",
+        "company": rng.choice([None, "Acme", "Globex"]),
+        "service": rng.choice(SERVICES),
+        "message": "Load benchmark submission, please ignore."
+    }})
+
+
+def _page_view(rng: random.Random, i: int) -> Request:
+    return ("POST", "/api/analytics/page-view", {
+        "json": {"type": "page_view", "page": rng.choice(PAGES), "metadata": {"referrer": rng.choice(REFERRERS)}},
+        "headers": {"user-agent": f"benchmark/{rng.randrange(500)}"}
+    })
+
+
+def _event_batch(rng: random.Random, i: int) -> Request:
+    events = [{"type": "page_view", "page": rng.choice(PAGES)} for _ in range(20)]
+    return ("POST", "/api/analytics/events", {"json": events, "headers": {"user-agent": f"benchmark/{rng.randrange(500)}"}})
+
+
+SCENARIOS: Dict[str, List[Step]] = {
+    # Landing page traffic: the three cached content lists
+    "content_reads": [
+        (1, "GET /api/services", _get("/api/services")),
+        (1, "GET /api/products", _get("/api/products")),
+        (1, "GET /api/projects", _get("/api/projects")),
+    ],
+    # A burst of contact form submissions (insert, counters, outbox, analytics)
+    "contact_burst": [
+        (1, "POST /api/contacts/", _contact),
+    ],
+    # Tracking beacons, single and batched
+    "page_view_flood": [
+        (9, "POST /api/analytics/page-view", _page_view),
+        (1, "POST /api/analytics/events", _event_batch),
+    ],
+    # Admin dashboards refreshing while traffic is recorded
+    "dashboard_polling": [
+        (3, "GET /api/analytics/dashboard", _get("/api/analytics/dashboard")),
+        (2, "GET /api/contacts/stats", _get("/api/contacts/stats")),
+        (1, "GET /api/analytics/top", _get("/api/analytics/top?dimension=pages&days=7")),
+        (1, "GET /api/analytics/unique-visitors", _get("/api/analytics/unique-visitors")),
+        (1, "GET /api/contacts/", _get("/api/contacts/?limit=20")),
+    ],
+}
+
+
+async def run_scenario(client, steps: List[Step], requests: int, concurrency: int, warmup: int, seed: int) -> dict:
+    """Send `requests` requests drawn from the weighted steps with `concurrency` workers"""
+    rng = random.Random(seed)
+    weights = [weight for weight, _, _ in steps]
+    plan = [(label, build(rng, i)) for i, (_, label, build) in enumerate(rng.choices(steps, weights=weights, k=warmup + requests))]
+
+    warmup_recorder = LatencyRecorder()
+    for label, (method, path, kwargs) in plan[:warmup]:
+        await warmup_recorder.request(client, label, method, path, **kwargs)
+
+    recorder = LatencyRecorder()
+    queue = iter(plan[warmup:])
+
+    async def worker():
+        for label, (method, path, kwargs) in queue:
+            await recorder.request(client, label, method, path, **kwargs)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return recorder.summary(time.perf_counter() - started)
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Endpoints whose p95 rose or throughput fell by more than threshold percent"""
+    regressions = []
+    print(f"\nComparison with baseline from {baseline['meta']['started_at']} (threshold {threshold:.0f}%)")
+    print(f"{'scenario / endpoint':<58}{'p95 ms':>16}{'req/s':>16}")
+    for scenario, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(scenario)
+        if not before:
+            continue
+        rows = list(result["endpoints"].items()) + [("all", result["total"])]
+        for label, stats in rows:
+            old = before["total"] if label == "all" else before["endpoints"].get(label)
+            if not old or not old["p95_ms"] or not old["throughput"]:
+                continue
+            p95_change = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+            rate_change = (stats["throughput"] - old["throughput"]) / old["throughput"] * 100
+            regressed = p95_change > threshold or rate_change < -threshold
+            marker = "  REGRESSION" if regressed else ""
+            print(f"{scenario + ' / ' + label:<58}{p95_change:>+15.1f}%{rate_change:>+15.1f}%{marker}")
+            if regressed:
+                regressions.append(f"{scenario} / {label}")
+    return regressions
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", help="base URL of a running server; omit to run the app in-process")
+    parser.add_argument("--mongo", default=MEMORY, help="MongoDB URL for in-process runs, or 'memory' (default)")
+    parser.add_argument("--db-name", default="benchmark", help="database used by in-process runs")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run (repeatable; default all)")
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests sent first")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="results file (default benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--compare", help="baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args()
+
+    started_at = datetime.utcnow()
+    results = {
+        "meta": {
+            "started_at": started_at.isoformat(),
+            "target": args.target or "in-process",
+            "mongo": None if args.target else ("memory" if args.mongo == MEMORY else "mongod"),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "python": platform.python_version()
+        },
+        "scenarios": {}
+    }
+
+    async with open_target(args.target, args.mongo, args.db_name) as client:
+        for name in args.scenario or list(SCENARIOS):
+            summary = await run_scenario(client, SCENARIOS[name], args.requests, args.concurrency, args.warmup, args.seed)
+            results["scenarios"][name] = summary
+            print_summary(name, summary)
+
+    output = Path(args.output) if args.output else Path(__file__).parent / "results" / f"load-{started_at:%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): " + ", ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Replay recorded traffic against an instance.
+Reads stored analytics events for a time range, from MongoDB or from an NDJSON
+export (GET /api/analytics/export?format=ndjson, optionally gzipped), and
+re-issues the requests that produced them on the original schedule, compressed
+by --speedup. Each recorded event becomes what the frontend sent for it:
+
+    page_view     -> GET /api/services, /api/products, /api/projects + the beacon
+    contact_form  -> POST /api/contacts/, or the beacon
+    anything else -> POST /api/analytics/events
+
+A submission stores two contact_form events: the backend's own, then the
+frontend's beacon a few seconds later. The first event of a visitor's pair
+replays the contact POST and the second one the beacon.
+
+Examples:
+
+    cd backend
+    python benchmarks/replay.py --ndjson analytics.ndjson --speedup 60
+    python benchmarks/replay.py --source-mongo mongodb://prod-replica:27017 --source-db mabratech \\
+        --start 2026-10-01 --end 2026-10-02 --speedup 0 --concurrency 64 --target http://localhost:8001
+
+--speedup 0 sends as fast as --concurrency allows. Without --target the app runs
+in-process, as in load.py.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from common import MEMORY, LatencyRecorder, open_target, percentile, print_summary
+
+CONTENT_PATHS = ["/api/services", "/api/products", "/api/projects"]
+
+# The frontend flushes its beacon queue after 5 s; allow for slow clients
+CONTACT_PAIR_WINDOW = timedelta(seconds=60)
+
+# (endpoint label, method, path, request kwargs)
+Call = Tuple[str, str, str, dict]
+
+
+def _timestamp(value) -> datetime:
+    """Naive UTC datetime from a datetime or an ISO 8601 string"""
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def events_from_ndjson(path: str, start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[dict]:
+    """Events of an NDJSON export in file order, limited to [start, end)"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            event["timestamp"] = _timestamp(event["timestamp"])
+            if (start and event["timestamp"] < start) or (end and event["timestamp"] >= end):
+                continue
+            yield event
+
+
+async def events_from_mongo(url: str, db_name: str, start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[dict]:
+    """Stored events in [start, end) in timestamp order"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    filter_dict = {}
+    if start or end:
+        filter_dict["timestamp"] = {}
+        if start:
+            filter_dict["timestamp"]["$gte"] = start
+        if end:
+            filter_dict["timestamp"]["$lt"] = end
+    projection = {"_id": 0, "type": 1, "page": 1, "timestamp": 1, "ip_address": 1, "user_agent": 1, "metadata": 1}
+
+    client = AsyncIOMotorClient(url)
+    try:
+        cursor = client[db_name].analytics.find(filter_dict, projection).sort("timestamp", 1).batch_size(1000)
+        async for event in cursor:
+            yield event
+    finally:
+        client.close()
+
+
+def _is_contact_beacon(event: dict, pending: Dict[tuple, datetime]) -> bool:
+    """Whether a contact_form event is the beacon of a submission already replayed"""
+    metadata = event.get("metadata") or {}
+    key = (event.get("ip_address"), event.get("user_agent"), metadata.get("service"), metadata.get("company"))
+    submitted = pending.pop(key, None)
+    if submitted is not None and event["timestamp"] - submitted <= CONTACT_PAIR_WINDOW:
+        return True
+
+    pending[key] = event["timestamp"]
+    if len(pending) > 1000:
+        horizon = event["timestamp"] - CONTACT_PAIR_WINDOW
+        for stale in [other for other, timestamp in pending.items() if timestamp < horizon]:
+            del pending[stale]
+    return False
+
+
+def calls_for(event: dict, index: int, pending: Dict[tuple, datetime]) -> List[Call]:
+    """
+    The requests the frontend made that resulted in this event. `pending` holds
+    contact submissions still waiting for their beacon, across calls.
+    """
+    headers = {"user-agent": event.get("user_agent") or "replay"}
+    beacon = {"type": event.get("type"), "page": event.get("page") or "/", "metadata": event.get("metadata") or {}}
+
+    if event.get("type") == "page_view":
+        calls = [(f"GET {path}", "GET", path, {"headers": headers}) for path in CONTENT_PATHS]
+        calls.append(("POST /api/analytics/events", "POST", "/api/analytics/events", {"json": [beacon], "headers": headers}))
+        return calls
+
+    if event.get("type") == "contact_form" and not _is_contact_beacon(event, pending):
+        metadata = event.get("metadata") or {}
+        contact = {
+            "name": f"Replay {index}",
+            "email": f"replay{index}@example.com",
+            "company": metadata.get("company"),
+            "service": metadata.get("service") or "Web Development",
+            "message": "Replayed contact form submission, please ignore."
+        }
+        return [("POST /api/contacts/", "POST", "/api/contacts/", {"json": contact, "headers": headers})]
+
+    return [("POST /api/analytics/events", "POST", "/api/analytics/events", {"json": [beacon], "headers": headers})]
+
+
+async def replay(client, events: AsyncIterator[dict], speedup: float, concurrency: int, limit: Optional[int]) -> dict:
+    """Issue each event's calls at its (compressed) original offset; returns the latency summary"""
+    recorder = LatencyRecorder()
+    slots = asyncio.Semaphore(concurrency)
+    lags: List[float] = []
+    pending_contacts: Dict[tuple, datetime] = {}
+    tasks = set()
+
+    async def visit(calls: List[Call]):
+        try:
+            await asyncio.gather(*(recorder.request(client, label, method, path, **kwargs) for label, method, path, kwargs in calls))
+        finally:
+            slots.release()
+
+    first: Optional[datetime] = None
+    started = time.perf_counter()
+    count = 0
+    async for event in events:
+        if limit is not None and count >= limit:
+            break
+        first = first or event["timestamp"]
+        if speedup > 0:
+            due = started + (event["timestamp"] - first).total_seconds() / speedup
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await slots.acquire()
+        if speedup > 0:
+            # How far behind the recorded schedule we are, i.e. whether the target kept up
+            lags.append(max(0.0, time.perf_counter() - due))
+        task = asyncio.create_task(visit(calls_for(event, count, pending_contacts)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        count += 1
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    summary = recorder.summary(time.perf_counter() - started)
+
+    lags.sort()
+    summary["events"] = count
+    summary["speedup"] = speedup
+    summary["schedule_lag_ms"] = {
+        "p50": round(percentile(lags, 50) * 1000, 3),
+        "p95": round(percentile(lags, 95) * 1000, 3),
+        "max": round(lags[-1] * 1000, 3) if lags else 0.0
+    }
+    return summary
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ndjson", help="NDJSON export of analytics events (.gz accepted)")
+    source.add_argument("--source-mongo", help="MongoDB URL to read stored analytics events from")
+    parser.add_argument("--source-db", help="database holding the analytics collection (with --source-mongo)")
+    parser.add_argument("--start", type=_timestamp, help="first event time (UTC, ISO 8601)")
+    parser.add_argument("--end", type=_timestamp, help="end of the range (exclusive)")
+    parser.add_argument("--limit", type=int, help="replay at most this many events")
+    parser.add_argument("--speedup", type=float, default=1.0, help="time compression factor; 0 replays as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=32, help="events in flight at most")
+    parser.add_argument("--target", help="base URL of the instance; omit to run the app in-process")
+    parser.add_argument("--mongo", default=MEMORY, help="MongoDB URL for in-process runs, or 'memory' (default)")
+    parser.add_argument("--db-name", default="benchmark", help="database used by in-process runs")
+    parser.add_argument("--output", help="write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    if args.source_mongo and not args.source_db:
+        parser.error("--source-mongo needs --source-db")
+
+    if args.ndjson:
+        events = events_from_ndjson(args.ndjson, args.start, args.end)
+    else:
+        events = events_from_mongo(args.source_mongo, args.source_db, args.start, args.end)
+
+    async with open_target(args.target, args.mongo, args.db_name) as client:
+        summary = await replay(client, events, args.speedup, max(1, args.concurrency), args.limit)
+
+    print_summary(f"Replayed {summary['events']} events at {args.speedup:g}x", summary)
+    lag = summary["schedule_lag_ms"]
+    if args.speedup > 0:
+        print(f"schedule lag: p50 {lag['p50']:.1f} ms, p95 {lag['p95']:.1f} ms, max {lag['max']:.1f} ms")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(summary, indent=2))
+        print(f"Results written to {args.output}")
+    return 1 if summary["total"]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
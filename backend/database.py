@@ -1,14 +1,21 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+import asyncio
+import copy
+import json
 import os
 from datetime import datetime
 import logging
 
+from utils.mongo_monitor import command_monitor, configure_command_monitor
+
 logger = logging.getLogger(__name__)
 
 class Database:
     client: AsyncIOMotorClient = None
     database: AsyncIOMotorDatabase = None
+    # True when analytics is a native time-series collection (events carry a meta field)
+    analytics_timeseries: bool = False
 
 db = Database()
 
@@ -16,9 +23,11 @@ async def get_database() -> AsyncIOMotorDatabase:
     return db.database
 
 async def connect_to_mongo():
-    """Create database connection"""
+    """Create database connection (a client set with use_client() beforehand is used instead)"""
     try:
-        db.client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        if db.client is None:
+            configure_command_monitor()
+            db.client = AsyncIOMotorClient(os.environ["MONGO_URL"], event_listeners=[command_monitor])
         db.database = db.client[os.environ["DB_NAME"]]
         
         # Test connection
@@ -36,8 +45,13 @@ async def close_mongo_connection():
     """Close database connection"""
     if db.client:
         db.client.close()
+        db.client = None
         logger.info("Disconnected from MongoDB")
 
+def use_client(client):
+    """Make the next connect_to_mongo() use this client, e.g. an in-memory one for benchmarks"""
+    db.client = client
+
 async def create_indexes():
     """Create database indexes for optimal performance"""
     try:
@@ -47,6 +61,9 @@ async def create_indexes():
         await database.contacts.create_index([("email", ASCENDING)])
         await database.contacts.create_index([("created_at", DESCENDING)])
         await database.contacts.create_index([("status", ASCENDING)])
+        # Keyset pagination on (created_at, _id), optionally filtered by status
+        await database.contacts.create_index([("created_at", DESCENDING), ("_id", DESCENDING)])
+        await database.contacts.create_index([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
         
         # Services collection indexes
         await database.services.create_index([("is_active", ASCENDING), ("order", ASCENDING)])
@@ -62,15 +79,152 @@ async def create_indexes():
         await database.projects.create_index([("client", ASCENDING)])
         
         # Analytics collection indexes
-        await database.analytics.create_index([("timestamp", DESCENDING)])
-        await database.analytics.create_index([("type", ASCENDING)])
-        await database.analytics.create_index([("page", ASCENDING)])
+        await provision_analytics_collection()
+        if db.analytics_timeseries:
+            # Time-series buckets are already clustered by time. Queries filter on the
+            # top-level type/page fields (meta only mirrors them), so index those
+            await database.analytics.create_index([("type", ASCENDING), ("timestamp", DESCENDING)])
+            await database.analytics.create_index([("page", ASCENDING), ("timestamp", DESCENDING)])
+        else:
+            await database.analytics.create_index([("timestamp", DESCENDING)])
+            await database.analytics.create_index([("type", ASCENDING)])
+            await database.analytics.create_index([("page", ASCENDING)])
+        await apply_analytics_ttl()
+        
+        # Email outbox (claim due messages, recover expired leases)
+        await database.email_outbox.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+        await database.email_outbox.create_index([("status", ASCENDING), ("locked_until", ASCENDING)])
+        
+        # Admin digest items (undigested submissions per window)
+        await database.email_digest_items.create_index([("digested", ASCENDING), ("window", ASCENDING)])
+        
+        # Analytics rollups (hour/day counters per type and page)
+        await database.analytics_rollups.create_index([("type", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)])
+        
+        # Unique visitor sketches (per day and page)
+        await database.analytics_hll.create_index([("day", ASCENDING), ("page", ASCENDING)])
+        
+        # Top-K checkpoints (per day, dimension and worker)
+        await database.analytics_topk.create_index([("dimension", ASCENDING), ("day", ASCENDING)])
         
         logger.info("Database indexes created successfully")
         
     except Exception as e:
         logger.error(f"Error creating indexes: {e}")
 
+async def provision_analytics_collection():
+    """
+    Create analytics as a time-series collection when ANALYTICS_TIMESERIES is set.
+    An existing plain collection is left alone; it has to be migrated by hand.
+    """
+    database = db.database
+    wanted = os.getenv("ANALYTICS_TIMESERIES", "false").lower() == "true"
+    
+    try:
+        existing = await database.list_collections(filter={"name": "analytics"}).to_list(length=1)
+        if existing:
+            db.analytics_timeseries = existing[0].get("type") == "timeseries"
+            if wanted and not db.analytics_timeseries:
+                logger.warning("ANALYTICS_TIMESERIES is set but analytics is a regular collection; migrate it to enable time-series storage")
+            return
+        
+        if not wanted:
+            return
+        
+        options = {
+            "timeseries": {"timeField": "timestamp", "metaField": "meta", "granularity": "minutes"}
+        }
+        retention_days = int(os.getenv("ANALYTICS_RAW_RETENTION_DAYS", "0"))
+        if retention_days > 0:
+            options["expireAfterSeconds"] = retention_days * 86400
+        
+        await database.create_collection("analytics", **options)
+        db.analytics_timeseries = True
+        logger.info("Created analytics as a time-series collection")
+        
+    except Exception as e:
+        logger.error(f"Could not provision analytics collection: {e}")
+
+async def apply_analytics_ttl():
+    """Expire raw analytics events after ANALYTICS_RAW_RETENTION_DAYS (0 keeps them forever)"""
+    retention_days = int(os.getenv("ANALYTICS_RAW_RETENTION_DAYS", "0"))
+    database = db.database
+    
+    try:
+        if db.analytics_timeseries:
+            await database.command({
+                "collMod": "analytics",
+                "expireAfterSeconds": retention_days * 86400 if retention_days > 0 else "off"
+            })
+        elif retention_days > 0:
+            # Turn the existing timestamp index into a TTL index rather than adding a second one
+            await database.command({
+                "collMod": "analytics",
+                "index": {"keyPattern": {"timestamp": -1}, "expireAfterSeconds": retention_days * 86400}
+            })
+    except Exception as e:
+        logger.warning(f"Could not apply analytics retention: {e}")
+
+# Single-flight read coalescing: concurrent identical reads share one query
+class _Flight:
+    __slots__ = ("task", "followers")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.followers = []
+
+_inflight = {}
+_singleflight_stats = {"executed": 0, "coalesced": 0}
+
+def _flight_key(*parts) -> str:
+    """Normalize a read into a stable key; filter key order is irrelevant, sort and pipeline order is kept"""
+    return json.dumps(parts, default=lambda value: f"{type(value).__name__}:{value}", separators=(",", ":"))
+
+def _canonical_filter(filter_dict: dict) -> dict:
+    """Sort field and operator names; embedded documents keep their order since they match exactly"""
+    canonical = {}
+    for key in sorted(filter_dict):
+        value = filter_dict[key]
+        if key in ("$and", "$or", "$nor") and isinstance(value, list):
+            value = [_canonical_filter(item) if isinstance(item, dict) else item for item in value]
+        elif isinstance(value, dict) and value and all(str(op).startswith("$") for op in value):
+            value = _canonical_filter(value)
+        canonical[key] = value
+    return canonical
+
+def _settle_followers(key: str, flight: _Flight, task: asyncio.Task):
+    # Runs before the leader resumes, so followers copy the result before anyone mutates it
+    _inflight.pop(key, None)
+    for waiter in flight.followers:
+        if waiter.done():
+            continue
+        if task.cancelled():
+            waiter.cancel()
+        elif task.exception() is not None:
+            waiter.set_exception(task.exception())
+        else:
+            waiter.set_result(copy.deepcopy(task.result()))
+
+async def _single_flight(key: str, query):
+    """Run query() unless an identical one is in flight, in which case share its result"""
+    flight = _inflight.get(key)
+    if flight is not None:
+        _singleflight_stats["coalesced"] += 1
+        waiter = asyncio.get_running_loop().create_future()
+        flight.followers.append(waiter)
+        return await waiter
+
+    _singleflight_stats["executed"] += 1
+    flight = _Flight(asyncio.ensure_future(query()))
+    flight.task.add_done_callback(lambda task: _settle_followers(key, flight, task))
+    _inflight[key] = flight
+    # Shielded so a cancelled leader does not cancel the query for its followers
+    return await asyncio.shield(flight.task)
+
+def get_singleflight_stats() -> dict:
+    """Counters for executed vs coalesced reads"""
+    return {**_singleflight_stats, "in_flight": len(_inflight)}
+
 # Database utility functions
 async def insert_one(collection_name: str, document: dict):
     """Insert a single document"""
@@ -78,17 +232,70 @@ async def insert_one(collection_name: str, document: dict):
     result = await collection.insert_one(document)
     return result
 
+async def insert_many(collection_name: str, documents: list, ordered: bool = False):
+    """Insert multiple documents in a single bulk write"""
+    collection = db.database[collection_name]
+    result = await collection.insert_many(documents, ordered=ordered)
+    return result
+
+async def bulk_write(collection_name: str, operations: list, ordered: bool = False):
+    """Run a batch of write operations in a single round-trip"""
+    collection = db.database[collection_name]
+    result = await collection.bulk_write(operations, ordered=ordered)
+    return result
+
+async def delete_many(collection_name: str, filter_dict: dict):
+    """Delete all documents matching filter"""
+    collection = db.database[collection_name]
+    result = await collection.delete_many(filter_dict)
+    return result
+
+def watch(collection_name: str, pipeline: list = None, **kwargs):
+    """Open a change stream on one collection (requires a replica set or sharded cluster)"""
+    collection = db.database[collection_name]
+    return collection.watch(pipeline or [], **kwargs)
+
 async def find_one(collection_name: str, filter_dict: dict):
     """Find a single document"""
     collection = db.database[collection_name]
     document = await collection.find_one(filter_dict)
     return document
 
-async def find_many(collection_name: str, filter_dict: dict = None, sort_dict: dict = None, limit: int = None):
+async def find_many(collection_name: str, filter_dict: dict = None, sort_dict: dict = None, limit: int = None, skip: int = None):
     """Find multiple documents"""
     collection = db.database[collection_name]
     
-    cursor = collection.find(filter_dict or {})
+    async def query():
+        cursor = collection.find(filter_dict or {})
+        
+        if sort_dict:
+            cursor = cursor.sort(list(sort_dict.items()))
+        
+        if skip:
+            cursor = cursor.skip(skip)
+        
+        if limit:
+            cursor = cursor.limit(limit)
+        
+        return await cursor.to_list(length=None)
+    
+    key = _flight_key("find", collection_name, _canonical_filter(filter_dict or {}), list((sort_dict or {}).items()), limit, skip)
+    documents = await _single_flight(key, query)
+    return documents
+
+async def iter_many(
+    collection_name: str,
+    filter_dict: dict = None,
+    sort_dict: dict = None,
+    projection: dict = None,
+    limit: int = None,
+    batch_size: int = 500,
+    max_time_ms: int = None
+):
+    """Stream matching documents, fetching them from the server batch_size at a time"""
+    collection = db.database[collection_name]
+    
+    cursor = collection.find(filter_dict or {}, projection, batch_size=batch_size)
     
     if sort_dict:
         cursor = cursor.sort(list(sort_dict.items()))
@@ -96,19 +303,43 @@ async def find_many(collection_name: str, filter_dict: dict = None, sort_dict: d
     if limit:
         cursor = cursor.limit(limit)
     
-    documents = await cursor.to_list(length=None)
-    return documents
+    if max_time_ms:
+        cursor = cursor.max_time_ms(max_time_ms)
+    
+    try:
+        async for document in cursor:
+            yield document
+    finally:
+        # Release the server-side cursor if the consumer stops early
+        await cursor.close()
 
-async def update_one(collection_name: str, filter_dict: dict, update_dict: dict):
+async def update_one(collection_name: str, filter_dict: dict, update_dict: dict, upsert: bool = False):
     """Update a single document"""
     collection = db.database[collection_name]
     
     # Add updated_at timestamp
     update_dict.setdefault("$set", {})["updated_at"] = datetime.utcnow()
     
-    result = await collection.update_one(filter_dict, update_dict)
+    result = await collection.update_one(filter_dict, update_dict, upsert=upsert)
     return result
 
+async def update_many(collection_name: str, filter_dict: dict, update_dict: dict):
+    """Update every document matching the filter"""
+    collection = db.database[collection_name]
+    result = await collection.update_many(filter_dict, update_dict)
+    return result
+
+async def find_one_and_update(collection_name: str, filter_dict: dict, update_dict: dict, sort_dict: dict = None, return_before: bool = False):
+    """Atomically update a single document and return it after (or before) the update"""
+    collection = db.database[collection_name]
+    document = await collection.find_one_and_update(
+        filter_dict,
+        update_dict,
+        sort=list(sort_dict.items()) if sort_dict else None,
+        return_document=ReturnDocument.BEFORE if return_before else ReturnDocument.AFTER
+    )
+    return document
+
 async def delete_one(collection_name: str, filter_dict: dict):
     """Delete a single document"""
     collection = db.database[collection_name]
@@ -121,9 +352,43 @@ async def count_documents(collection_name: str, filter_dict: dict = None):
     count = await collection.count_documents(filter_dict or {})
     return count
 
+async def estimated_document_count(collection_name: str):
+    """Approximate collection size from metadata, without scanning"""
+    collection = db.database[collection_name]
+    count = await collection.estimated_document_count()
+    return count
+
 async def aggregate(collection_name: str, pipeline: list):
     """Run aggregation pipeline"""
     collection = db.database[collection_name]
-    cursor = collection.aggregate(pipeline)
-    results = await cursor.to_list(length=None)
-    return results
\ No newline at end of file
+    
+    async def query():
+        cursor = collection.aggregate(pipeline)
+        return await cursor.to_list(length=None)
+    
+    key = _flight_key("aggregate", collection_name, pipeline)
+    results = await _single_flight(key, query)
+    return results
+
+async def iter_aggregate(
+    collection_name: str,
+    pipeline: list,
+    batch_size: int = 500,
+    max_time_ms: int = None,
+    allow_disk_use: bool = False
+):
+    """Stream aggregation results, fetching them from the server batch_size at a time"""
+    collection = db.database[collection_name]
+    
+    options = {"batchSize": batch_size}
+    if max_time_ms:
+        options["maxTimeMS"] = max_time_ms
+    if allow_disk_use:
+        options["allowDiskUse"] = True
+    
+    cursor = collection.aggregate(pipeline, **options)
+    try:
+        async for document in cursor:
+            yield document
+    finally:
+        await cursor.close()
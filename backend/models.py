@@ -125,11 +125,19 @@ class AnalyticsEventCreate(BaseModel):
     type: str
     page: str
     metadata: Optional[dict] = None
+    timestamp: Optional[datetime] = None  # client clock; the batch endpoint honours it within a bounded skew
+
+class AnalyticsBatchResponse(BaseModel):
+    success: bool
+    accepted: int
+    rejected: int
 
 class AnalyticsStats(BaseModel):
     total_page_views: int
     total_contacts: int
+    unique_visitors: Optional[int] = None
     top_pages: List[dict]
+    top_referrers: List[dict] = []
     contacts_by_service: List[dict]
     recent_activity: List[dict]
 
@@ -148,4 +156,5 @@ class ProjectListResponse(BaseModel):
 
 class ContactListResponse(BaseModel):
     contacts: List[Contact]
-    total: int
\ No newline at end of file
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -1,14 +1,28 @@
-from fastapi import APIRouter, HTTPException, Request
-from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter, ValidationError
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import json
 import logging
+import os
 
-from models import AnalyticsEvent, AnalyticsEventCreate, AnalyticsStats
-from database import insert_one, aggregate, count_documents, find_many
-from utils.analytics import track_event
+from models import AnalyticsEvent, AnalyticsEventCreate, AnalyticsStats, AnalyticsBatchResponse
+from database import insert_one, find_many, iter_many
+from utils.analytics import track_event, track_events, build_event_document, listening_since
+from utils.rollups import RebuildInProgress, page_counts, rebuild_rollups
+from utils.hll import unique_visitors, ALL_PAGES
+from utils.topk import topk
+from utils.counters import read_counters
+from utils.snapshots import snapshots
+from utils.export import export_response
+from utils.archive import iter_archive
+from utils.retention import analytics_retention
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 logger = logging.getLogger(__name__)
 
+event_list_adapter = TypeAdapter(List[AnalyticsEventCreate])
+
 @router.post("/page-view")
 async def track_page_view(
     event_data: AnalyticsEventCreate,
@@ -19,7 +33,8 @@ async def track_page_view(
         client_ip = request.client.host
         user_agent = request.headers.get("user-agent", "")
         
-        await track_event(
+        # Only enqueues the event; the ingestion buffer writes it in a later batch
+        accepted = await track_event(
             event_data.type,
             event_data.page,
             client_ip,
@@ -27,82 +42,340 @@ async def track_page_view(
             event_data.metadata
         )
         
-        return {"success": True}
+        return {"success": accepted}
         
     except Exception as e:
         logger.error(f"Error tracking page view: {e}")
         # Don't throw error for analytics, just log
         return {"success": False}
 
+def _batch_limits():
+    max_events = int(os.getenv("ANALYTICS_MAX_BATCH_EVENTS", "500"))
+    max_bytes = int(os.getenv("ANALYTICS_MAX_BATCH_BYTES", str(1024 * 1024)))
+    return max_events, max_bytes
+
+def _event_time(client_time: Optional[datetime], now: datetime, max_skew: timedelta, floor: Optional[datetime] = None) -> datetime:
+    """
+    The client's event time when it is within max_skew of the server clock, else now.
+    Beacons are queued for seconds before they are sent, so the arrival time skews
+    hour edges; the bound keeps clients with wrong clocks from backdating events.
+    """
+    if client_time is None:
+        return now
+    if client_time.tzinfo is not None:
+        client_time = client_time.astimezone(timezone.utc).replace(tzinfo=None)
+    if abs(now - client_time) > max_skew:
+        return now
+    # Never in the future, and never before the listener started, or the rollup
+    # bootstrap would count the event as well
+    client_time = min(client_time, now)
+    return max(client_time, floor) if floor else client_time
+
+async def _read_ndjson(request: Request, max_events: int, max_bytes: int) -> list:
+    """Parse an NDJSON body line by line as it streams in"""
+    items = []
+    buffer = b""
+    received = 0
+
+    def parse_line(line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        if len(items) >= max_events:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {max_events} events")
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON on line {len(items) + 1}")
+
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {max_bytes} bytes")
+
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse_line(line)
+
+    parse_line(buffer)
+    return items
+
+async def _read_json_batch(request: Request, max_events: int, max_bytes: int) -> list:
+    """Parse a JSON body (array, object or {"events": [...]}), falling back to NDJSON when it is a sequence of objects"""
+    received = bytearray()
+    async for chunk in request.stream():
+        received += chunk
+        if len(received) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {max_bytes} bytes")
+
+    body = bytes(received).strip()
+    if not body:
+        return []
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        # Not a single JSON document; accept a sequence of objects, one per line
+        if not (body.startswith(b"{") and b"\n" in body):
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        payload = []
+        for line_number, line in enumerate(body.split(b"\n"), start=1):
+            line = line.strip()
+            if line:
+                try:
+                    payload.append(json.loads(line))
+                except ValueError:
+                    raise HTTPException(status_code=400, detail=f"Invalid JSON on line {line_number}")
+
+    if isinstance(payload, dict):
+        # Accept {"events": [...]} as well as a single event object
+        payload = payload.get("events", [payload])
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of events")
+    items = payload
+
+    if len(items) > max_events:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {max_events} events")
+    return items
+
+def _validate_batch(items: list):
+    """Validate a batch in one pass, dropping the entries that fail"""
+    try:
+        return event_list_adapter.validate_python(items), 0
+    except ValidationError as e:
+        invalid = {error["loc"][0] for error in e.errors() if error["loc"]}
+        valid_items = [item for i, item in enumerate(items) if i not in invalid]
+        return event_list_adapter.validate_python(valid_items), len(items) - len(valid_items)
+
+@router.post("/events", response_model=AnalyticsBatchResponse)
+async def track_event_batch(request: Request):
+    """Track a batch of events sent as a JSON array or NDJSON stream"""
+    max_events, max_bytes = _batch_limits()
+
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = await _read_ndjson(request, max_events, max_bytes)
+    else:
+        # Also covers text/plain, which navigator.sendBeacon uses to avoid a CORS preflight
+        items = await _read_json_batch(request, max_events, max_bytes)
+
+    try:
+        events, rejected = _validate_batch(items)
+
+        client_ip = request.client.host
+        user_agent = request.headers.get("user-agent", "")
+
+        # Kept below the rollup SETTLE_TIME so backdated events still reach open buckets
+        max_skew = timedelta(seconds=float(os.getenv("ANALYTICS_MAX_CLOCK_SKEW", "60")))
+        now = datetime.utcnow()
+        floor = listening_since()
+        documents = [
+            build_event_document(
+                event.type, event.page, client_ip, user_agent, event.metadata,
+                _event_time(event.timestamp, now, max_skew, floor)
+            )
+            for event in events
+        ]
+        accepted = await track_events(documents) if documents else 0
+
+        return AnalyticsBatchResponse(
+            success=accepted == len(documents),
+            accepted=accepted,
+            rejected=rejected + len(documents) - accepted
+        )
+
+    except Exception as e:
+        logger.error(f"Error tracking analytics batch: {e}")
+        # Don't throw error for analytics, just log
+        return AnalyticsBatchResponse(success=False, accepted=0, rejected=len(items))
+
+async def compute_dashboard() -> dict:
+    """Compute analytics dashboard data"""
+    # Get date range (last 30 days)
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=30)
+    
+    # Page views per page from the hour/day rollups
+    page_views = await page_counts(start_date, end_date, "page_view")
+    
+    # Total page views
+    total_page_views = sum(item["count"] for item in page_views)
+    
+    # Contact totals from the maintained contact counters
+    contact_counters = await read_counters()
+    total_contacts = contact_counters["total"].get(None, 0)
+    
+    # Top pages are exact from the rollups; the summaries only start counting once
+    # deployed, so they serve referrers (which have no rollup) and /top
+    top_pages = page_views[:5]
+    top_referrers = [{"referrer": item["item"], "views": item["count"]} for item in await topk.top("referrers", start_date, end_date, 5)]
+    
+    # Unique visitors from the per-day HyperLogLog sketches (~1.6% error)
+    visitors = await unique_visitors(start_date, end_date, [item["page"] for item in top_pages])
+    
+    # Contacts by service
+    contacts_by_service = sorted(
+        ({"_id": service, "count": count} for service, count in contact_counters["service"].items() if count),
+        key=lambda item: item["count"],
+        reverse=True
+    )
+    
+    # Recent activity (last 10 events)
+    recent_activity = await find_many(
+        "analytics",
+        filter_dict={},
+        sort_dict={"timestamp": -1},
+        limit=10
+    )
+    
+    stats = AnalyticsStats(
+        total_page_views=total_page_views,
+        total_contacts=total_contacts,
+        unique_visitors=visitors.get(ALL_PAGES, 0),
+        top_pages=[
+            {"page": item["page"], "views": item["count"], "unique_visitors": visitors.get(item["page"], 0)}
+            for item in top_pages
+        ],
+        top_referrers=top_referrers,
+        contacts_by_service=[{"service": item["_id"], "count": item["count"]} for item in contacts_by_service],
+        recent_activity=recent_activity
+    )
+    return stats.dict()
+
+snapshots.register("analytics_dashboard", compute_dashboard)
+
 @router.get("/dashboard", response_model=AnalyticsStats)
-async def get_analytics_dashboard():
+async def get_analytics_dashboard(response: Response):
     """Get analytics dashboard data"""
     try:
-        # Get date range (last 30 days)
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=30)
-        
-        # Total page views
-        total_page_views = await count_documents(
-            "analytics",
-            {
-                "type": "page_view",
-                "timestamp": {"$gte": start_date}
-            }
-        )
+        # Served from the last snapshot; a stale one is refreshed in the background
+        stats, age = await snapshots.get("analytics_dashboard")
+        response.headers["Age"] = str(int(age))
+        return stats
         
-        # Total contacts
-        total_contacts = await count_documents("contacts")
-        
-        # Top pages
-        top_pages_pipeline = [
-            {
-                "$match": {
-                    "type": "page_view",
-                    "timestamp": {"$gte": start_date}
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$page",
-                    "views": {"$sum": 1}
-                }
-            },
-            {"$sort": {"views": -1}},
-            {"$limit": 5}
-        ]
+    except Exception as e:
+        logger.error(f"Error fetching analytics dashboard: {e}")
+        raise HTTPException(status_code=500, detail="Error fetching analytics data")
+
+@router.get("/unique-visitors")
+async def get_unique_visitors(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    page: Optional[List[str]] = Query(None)
+):
+    """Estimated unique visitors per page and site-wide ("*") for a window of days (admin only)"""
+    try:
+        end = end or datetime.utcnow()
+        start = start or end - timedelta(days=30)
+        visitors = await unique_visitors(start, end, page)
         
-        top_pages = await aggregate("analytics", top_pages_pipeline)
+        return {
+            "start": start,
+            "end": end,
+            "unique_visitors": visitors.pop(ALL_PAGES, 0),
+            "pages": sorted(
+                ({"page": name, "unique_visitors": count} for name, count in visitors.items()),
+                key=lambda item: item["unique_visitors"],
+                reverse=True
+            )
+        }
         
-        # Contacts by service
-        contacts_by_service_pipeline = [
-            {
-                "$group": {
-                    "_id": "$service",
-                    "count": {"$sum": 1}
-                }
-            },
-            {"$sort": {"count": -1}}
-        ]
+    except Exception as e:
+        logger.error(f"Error estimating unique visitors: {e}")
+        raise HTTPException(status_code=500, detail="Error estimating unique visitors")
+
+@router.get("/top")
+async def get_top_items(
+    dimension: str = Query("pages", pattern="^(pages|referrers)$"),
+    days: int = Query(1, ge=1, le=365),
+    k: int = Query(10, ge=1, le=100)
+):
+    """Live top-K pages or referrer hosts over the last N days, merged across workers (admin only)"""
+    try:
+        end = datetime.utcnow()
+        items = await topk.top(dimension, end - timedelta(days=days - 1), end, k)
+        # count is an upper bound; count - error is a guaranteed lower bound
+        return {"dimension": dimension, "days": days, "items": items}
         
-        contacts_by_service = await aggregate("contacts", contacts_by_service_pipeline)
+    except Exception as e:
+        logger.error(f"Error fetching top {dimension}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error fetching top {dimension}")
+
+ANALYTICS_EXPORT_FIELDS = ["id", "type", "page", "timestamp", "ip_address", "user_agent", "metadata"]
+
+@router.get("/export")
+async def export_analytics(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    type: Optional[str] = None,
+    page: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Stream raw analytics events as CSV or NDJSON (admin only)"""
+    filter_dict = {}
+    if type:
+        filter_dict["type"] = type
+    if page:
+        filter_dict["page"] = page
+    if start or end:
+        filter_dict["timestamp"] = {}
+        if start:
+            filter_dict["timestamp"]["$gte"] = start
+        if end:
+            filter_dict["timestamp"]["$lt"] = end
+    
+    documents = iter_many(
+        "analytics",
+        filter_dict,
+        sort_dict={"timestamp": 1},
+        batch_size=int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+    )
+    
+    logger.info(f"Exporting analytics events as {export_format} (filter: {filter_dict})")
+    return export_response(documents, ANALYTICS_EXPORT_FIELDS, export_format, gzip, "analytics")
+
+@router.get("/archive")
+async def export_archived_analytics(
+    export_format: str = Query("ndjson", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    type: Optional[str] = None,
+    page: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Stream archived analytics events from the Parquet archive (admin only)"""
+    documents = iter_archive(start=start, end=end, page=page, event_type=type)
+    return export_response(documents, ANALYTICS_EXPORT_FIELDS, export_format, gzip, "analytics-archive")
+
+@router.post("/archive")
+async def archive_analytics(older_than_days: int = Query(..., ge=1)):
+    """Move raw events older than the given number of days to the Parquet archive (admin only)"""
+    try:
+        # Same lease as the retention job, so the two never archive the same day at once
+        result = await analytics_retention.archive_now(older_than_days)
+        if result is None:
+            raise HTTPException(status_code=409, detail="An archive or downsampling run is in progress")
+        return {"success": True, **result}
         
-        # Recent activity (last 10 events)
-        recent_activity = await find_many(
-            "analytics",
-            filter_dict={},
-            sort_dict={"timestamp": -1},
-            limit=10
-        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error archiving analytics events: {e}")
+        raise HTTPException(status_code=500, detail="Error archiving analytics events")
+
+@router.post("/rollups/rebuild")
+async def rebuild_analytics_rollups(days: Optional[int] = None):
+    """Rebuild hour/day rollups from raw events (admin only)"""
+    try:
+        start_date = datetime.utcnow() - timedelta(days=days) if days else None
+        result = await rebuild_rollups(start=start_date)
         
-        return AnalyticsStats(
-            total_page_views=total_page_views,
-            total_contacts=total_contacts,
-            top_pages=[{"page": item["_id"], "views": item["views"]} for item in top_pages],
-            contacts_by_service=[{"service": item["_id"], "count": item["count"]} for item in contacts_by_service],
-            recent_activity=recent_activity
-        )
+        return {"success": True, **result}
         
+    except RebuildInProgress:
+        raise HTTPException(status_code=409, detail="A rollup rebuild is already in progress")
     except Exception as e:
-        logger.error(f"Error fetching analytics dashboard: {e}")
-        raise HTTPException(status_code=500, detail="Error fetching analytics data")
\ No newline at end of file
+        logger.error(f"Error rebuilding analytics rollups: {e}")
+        raise HTTPException(status_code=500, detail="Error rebuilding analytics rollups")
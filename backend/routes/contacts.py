@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException, Request, BackgroundTasks
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, BackgroundTasks
+from typing import List, Optional
 import logging
 from datetime import datetime
+import os
 
 from models import Contact, ContactCreate, ContactResponse, ContactListResponse
-from database import insert_one, find_many, find_one, update_one, count_documents
-from utils.email import send_contact_notification
+from database import insert_one, find_many, iter_many, find_one, find_one_and_update, count_documents
+from utils.email import queue_contact_emails
 from utils.analytics import track_event
+from utils.counters import record_contact_created, record_status_change, read_counters, contact_total, reconcile_counters
+from utils.pagination import encode_cursor, decode_cursor, keyset_filter
+from utils.export import export_response
 
 router = APIRouter(prefix="/api/contacts", tags=["contacts"])
 logger = logging.getLogger(__name__)
@@ -35,12 +39,18 @@ async def create_contact(
         contact_dict["_id"] = contact_dict.pop("id")  # MongoDB uses _id
         
         await insert_one("contacts", contact_dict)
+        try:
+            await record_contact_created(contact_dict)
+        except Exception as e:
+            # The contact is stored; reconciliation repairs the counters
+            logger.error(f"Error counting contact {contact.id}: {e}")
         
-        # Send email notification in background
-        background_tasks.add_task(
-            send_contact_notification,
-            contact.dict()
-        )
+        # Queue notification emails in the durable outbox; workers deliver them.
+        # The contact is already stored, so failing here must not invite a duplicate resubmission
+        try:
+            await queue_contact_emails(contact.dict())
+        except Exception as e:
+            logger.error(f"Error queueing emails for contact {contact.id}: {e}")
         
         # Track analytics event
         background_tasks.add_task(
@@ -70,83 +80,148 @@ async def create_contact(
 @router.get("/", response_model=ContactListResponse)
 async def get_contacts(
     status: str = None,
-    limit: int = 50,
-    offset: int = 0
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    count: str = Query("estimated", pattern="^(exact|estimated|none)$")
 ):
-    """Get all contacts (admin only - basic implementation)"""
+    """
+    Get all contacts (admin only - basic implementation)
+    Pass next_cursor from the previous page as cursor for constant-cost paging;
+    offset is still honoured when no cursor is given.
+    """
     try:
         # Build filter
         filter_dict = {}
         if status:
             filter_dict["status"] = status
         
-        # Get contacts with pagination
+        page_filter = dict(filter_dict)
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            page_filter.update(keyset_filter(cursor_created_at, cursor_id))
+        
+        # Fetch one extra document to know whether another page exists
         contacts = await find_many(
             "contacts",
-            filter_dict,
-            sort_dict={"created_at": -1},
-            limit=limit
+            page_filter,
+            sort_dict={"created_at": -1, "_id": -1},
+            limit=limit + 1,
+            skip=None if cursor else offset
         )
         
+        next_cursor = None
+        if len(contacts) > limit:
+            contacts = contacts[:limit]
+            last = contacts[-1]
+            next_cursor = encode_cursor(last["created_at"], last["_id"])
+        
         # Convert MongoDB _id to id
         for contact in contacts:
             contact["id"] = contact.pop("_id")
         
-        # Get total count
-        total = await count_documents("contacts", filter_dict)
+        # Total count is optional; the estimate reads the maintained contact counters
+        total = None
+        if count == "exact":
+            total = await count_documents("contacts", filter_dict)
+        elif count == "estimated":
+            total = await contact_total(status)
         
         return ContactListResponse(
             contacts=[Contact(**contact) for contact in contacts],
-            total=total
+            total=total,
+            next_cursor=next_cursor
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching contacts: {e}")
         raise HTTPException(status_code=500, detail="Error fetching contacts")
 
+CONTACT_EXPORT_FIELDS = [
+    "id", "name", "email", "phone", "company", "service", "message",
+    "status", "created_at", "updated_at", "ip_address", "user_agent"
+]
+
+@router.get("/export")
+async def export_contacts(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """Stream contacts as CSV or NDJSON (admin only)"""
+    filter_dict = {}
+    if status:
+        filter_dict["status"] = status
+    if start or end:
+        filter_dict["created_at"] = {}
+        if start:
+            filter_dict["created_at"]["$gte"] = start
+        if end:
+            filter_dict["created_at"]["$lt"] = end
+    
+    documents = iter_many(
+        "contacts",
+        filter_dict,
+        sort_dict={"created_at": 1, "_id": 1},
+        batch_size=int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+    )
+    
+    logger.info(f"Exporting contacts as {export_format} (filter: {filter_dict})")
+    return export_response(documents, CONTACT_EXPORT_FIELDS, export_format, gzip, "contacts")
+
+async def compute_contact_stats() -> dict:
+    """Compute contact statistics"""
+    # Every figure comes from the contact_counters documents, not the contacts collection
+    counters = await read_counters()
+    
+    # Submissions by service
+    by_service = sorted(
+        ({"_id": service, "count": count} for service, count in counters["service"].items() if count),
+        key=lambda item: item["count"],
+        reverse=True
+    )
+    
+    # Submissions by month (last 6 months)
+    by_month = []
+    for month in sorted(counters["month"], reverse=True)[:6]:
+        year, month_number = month.split("-")
+        by_month.append({"_id": {"year": int(year), "month": int(month_number)}, "count": counters["month"][month]})
+    
+    return {
+        "totalSubmissions": counters["total"].get(None, 0),
+        "byService": by_service,
+        "byMonth": by_month,
+        "byStatus": {status: count for status, count in counters["status"].items() if count}
+    }
+
 @router.get("/stats")
 async def get_contact_stats():
     """Get contact statistics"""
     try:
-        # Total submissions
-        total_submissions = await count_documents("contacts")
-        
-        # Submissions by service
-        service_pipeline = [
-            {"$group": {"_id": "$service", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        
-        from database import aggregate
-        by_service = await aggregate("contacts", service_pipeline)
-        
-        # Submissions by month (last 6 months)
-        month_pipeline = [
-            {
-                "$group": {
-                    "_id": {
-                        "year": {"$year": "$created_at"},
-                        "month": {"$month": "$created_at"}
-                    },
-                    "count": {"$sum": 1}
-                }
-            },
-            {"$sort": {"_id.year": -1, "_id.month": -1}},
-            {"$limit": 6}
-        ]
-        
-        by_month = await aggregate("contacts", month_pipeline)
-        
-        return {
-            "totalSubmissions": total_submissions,
-            "byService": by_service,
-            "byMonth": by_month
-        }
+        return await compute_contact_stats()
         
     except Exception as e:
         logger.error(f"Error fetching contact stats: {e}")
         raise HTTPException(status_code=500, detail="Error fetching statistics")
 
+@router.post("/stats/reconcile")
+async def reconcile_contact_stats():
+    """Rebuild the contact counters from the contacts collection (admin only)"""
+    try:
+        result = await reconcile_counters()
+        return {"success": True, **result}
+        
+    except Exception as e:
+        logger.error(f"Error reconciling contact counters: {e}")
+        raise HTTPException(status_code=500, detail="Error reconciling statistics")
+
 @router.patch("/{contact_id}/status")
 async def update_contact_status(contact_id: str, status: str):
     """Update contact status (admin only)"""
@@ -155,14 +230,24 @@ async def update_contact_status(contact_id: str, status: str):
         if status not in valid_statuses:
             raise HTTPException(status_code=400, detail="Invalid status")
         
-        result = await update_one(
+        # Read the previous status in the same atomic update to move its counter
+        previous = await find_one_and_update(
             "contacts",
-            {"_id": contact_id},
-            {"$set": {"status": status}}
+            {"_id": contact_id, "status": {"$ne": status}},
+            {"$set": {"status": status, "updated_at": datetime.utcnow()}},
+            return_before=True
         )
         
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Contact not found")
+        if previous is None:
+            # Either unknown or already in that status
+            if not await find_one("contacts", {"_id": contact_id}):
+                raise HTTPException(status_code=404, detail="Contact not found")
+        else:
+            try:
+                await record_status_change(previous.get("status", "new"), status)
+            except Exception as e:
+                # The status is saved; reconciliation repairs the counters
+                logger.error(f"Error counting status change for contact {contact_id}: {e}")
         
         return {"success": True, "message": "Status updated successfully"}
         
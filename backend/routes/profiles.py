@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from typing import Optional
+import logging
+
+from utils.profiling import ProfileSettings, ProfileStore, PROFILE_FORMATS, token_matches
+
+router = APIRouter(prefix="/api/profiles", tags=["profiles"])
+logger = logging.getLogger(__name__)
+
+def _store(token: Optional[str]) -> ProfileStore:
+    settings = ProfileSettings()
+    # Profiles expose code paths; when an admin token is configured it is required here too
+    if settings.admin_token and not token_matches(settings, token):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+    return ProfileStore(settings)
+
+@router.get("/")
+async def list_profiles(x_profile_token: Optional[str] = Header(None)):
+    """List stored request profiles, newest first (admin only)"""
+    profiles = _store(x_profile_token).listing()
+    return {"profiles": profiles, "total": len(profiles)}
+
+@router.get("/{route}/{name}")
+async def download_profile(route: str, name: str, x_profile_token: Optional[str] = Header(None)):
+    """Download one stored profile (admin only)"""
+    path = _store(x_profile_token).resolve(route, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if name.endswith(PROFILE_FORMATS["speedscope"]) else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=name)
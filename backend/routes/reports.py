@@ -0,0 +1,87 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+import logging
+
+from utils.reports import (
+    report_cache, cache_key,
+    timeseries_report, funnel_report, services_report, retention_report
+)
+
+router = APIRouter(prefix="/api/analytics/reports", tags=["reports"])
+logger = logging.getLogger(__name__)
+
+SOURCE_PATTERN = "^(mongo|archive|all)$"
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps are naive UTC; query strings may carry an offset ("Z", "+07:00")
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _date_range(start: Optional[datetime], end: Optional[datetime], default_days: int) -> Tuple[datetime, datetime]:
+    start, end = _naive_utc(start), _naive_utc(end)
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=default_days)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    # Align to whole hours so nearby requests share a cache entry
+    return start.replace(minute=0, second=0, microsecond=0), end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+async def _cached_report(name: str, compute, **params):
+    try:
+        return await report_cache.get(cache_key(name, **params), lambda: compute(**params))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing {name} report: {e}")
+        raise HTTPException(status_code=500, detail=f"Error computing {name} report")
+
+@router.get("/timeseries")
+async def page_view_timeseries(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    page: Optional[str] = None,
+    source: str = Query("mongo", pattern=SOURCE_PATTERN)
+):
+    """Page views and unique visitors per hour or day (admin only)"""
+    start, end = _date_range(start, end, 30)
+    return await _cached_report("timeseries", timeseries_report, start=start, end=end, granularity=granularity, page=page, source=source)
+
+@router.get("/funnel")
+async def conversion_funnel(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    steps: str = Query("page_view,contact_form", description="Comma-separated steps, each 'type' or 'type:page'"),
+    window_hours: int = Query(24, ge=1, le=24 * 90),
+    source: str = Query("mongo", pattern=SOURCE_PATTERN)
+):
+    """Ordered conversion funnel across event steps (admin only)"""
+    start, end = _date_range(start, end, 30)
+    step_list = [step.strip() for step in steps.split(",") if step.strip()]
+    if not 1 <= len(step_list) <= 10:
+        raise HTTPException(status_code=400, detail="A funnel needs between 1 and 10 steps")
+    return await _cached_report("funnel", funnel_report, start=start, end=end, steps=step_list, window_hours=window_hours, source=source)
+
+@router.get("/services")
+async def service_conversion(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    source: str = Query("mongo", pattern=SOURCE_PATTERN)
+):
+    """Submissions and conversion rate per service (admin only)"""
+    start, end = _date_range(start, end, 90)
+    return await _cached_report("services", services_report, start=start, end=end, source=source)
+
+@router.get("/retention")
+async def cohort_retention(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    period: str = Query("week", pattern="^(day|week)$"),
+    periods: int = Query(8, ge=1, le=52),
+    source: str = Query("mongo", pattern=SOURCE_PATTERN)
+):
+    """Returning-visitor retention per first-visit cohort (admin only)"""
+    start, end = _date_range(start, end, 90)
+    return await _cached_report("retention", retention_report, start=start, end=end, period=period, periods=periods, source=source)
@@ -1,5 +1,6 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 import os
 import logging
@@ -7,12 +8,25 @@ from pathlib import Path
 from contextlib import asynccontextmanager
 
 # Import database connection
-from database import connect_to_mongo, close_mongo_connection
+from database import connect_to_mongo, close_mongo_connection, get_singleflight_stats
+from utils.analytics import start_analytics_ingestion, stop_analytics_ingestion
+from utils.snapshots import start_snapshots, stop_snapshots
+from utils.content_sync import start_content_sync, stop_content_sync
+from utils.mailer import close_mail_pool
+from utils.outbox import start_outbox, stop_outbox, outbox
+from utils.retention import start_analytics_retention, stop_analytics_retention
+from utils.topk import start_topk, stop_topk
+from utils.counters import start_counter_reconciler, stop_counter_reconciler
+from utils.metrics import MetricsMiddleware, metrics
+from utils.mongo_monitor import command_monitor
+from utils.profiling import ProfilingMiddleware, profiling_enabled
 
 # Import routes
 from routes.contacts import router as contacts_router
 from routes.content import router as content_router
 from routes.analytics import router as analytics_router
+from routes.reports import router as reports_router
+from routes.profiles import router as profiles_router
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -29,9 +43,26 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up Mabratech API server...")
     await connect_to_mongo()
+    await start_analytics_ingestion()
+    await start_topk()
+    await start_analytics_retention()
+    await start_snapshots()
+    await start_content_sync()
+    await start_outbox()
+    await start_counter_reconciler()
     yield
     # Shutdown
     logger.info("Shutting down Mabratech API server...")
+    await stop_counter_reconciler()
+    await stop_outbox()
+    await stop_content_sync()
+    await stop_snapshots()
+    await stop_analytics_retention()
+    # Drain buffered analytics before the client goes away
+    await stop_analytics_ingestion()
+    # After the drain, so the final checkpoint includes the last batches
+    await stop_topk()
+    await close_mail_pool()
     await close_mongo_connection()
 
 # Create the main app
@@ -42,6 +73,10 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Opt-in request profiling; not installed at all unless configured
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -51,10 +86,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so recorded latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(contacts_router)
 app.include_router(content_router) 
 app.include_router(analytics_router)
+app.include_router(reports_router)
+app.include_router(profiles_router)
 
 # Health check endpoint
 @app.get("/api/health")
@@ -65,6 +105,35 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Database read coalescing counters
+@app.get("/api/health/database")
+async def database_health():
+    return {
+        "singleflight": get_singleflight_stats()
+    }
+
+# Email outbox counters
+@app.get("/api/health/outbox")
+async def outbox_health():
+    return {
+        "workers": outbox.stats,
+        "statuses": await outbox.status_counts()
+    }
+
+# MongoDB command timings and slow operation log (admin only)
+@app.get("/api/health/mongo")
+async def mongo_health(limit: int = Query(50, ge=1, le=500)):
+    return {
+        "slow_ms": command_monitor.slow_ms,
+        "commands": command_monitor.summary(),
+        "slow_operations": command_monitor.slow_operations(limit)
+    }
+
+# Prometheus scrape endpoint
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Root endpoint (legacy support)
 @app.get("/api/")
 async def root():
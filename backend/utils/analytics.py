@@ -1,37 +1,117 @@
 from datetime import datetime
+import asyncio
+import os
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
-from database import insert_one
 from models import AnalyticsEvent
+from database import db
+from utils.ingest import IngestBuffer
+from utils.rollups import apply_events as apply_rollups, bootstrap_rollups
+from utils.hll import apply_events as apply_unique_visitors
+from utils.topk import topk
 
 logger = logging.getLogger(__name__)
 
+# Shared buffer for analytics events, flushed in batches by a background task
+event_buffer = IngestBuffer("analytics")
+
+# Keep hour/day rollups in step with every batch that reaches the collection
+event_buffer.add_flush_listener(apply_rollups)
+# ...and the per-day unique visitor sketches
+event_buffer.add_flush_listener(apply_unique_visitors)
+# ...and this worker's live top-K pages and referrers
+event_buffer.add_flush_listener(topk.apply_events)
+
+_background_tasks = set()
+
+# When this worker's flush listener started counting; see bootstrap_rollups
+_listening_since: Optional[datetime] = None
+
+def listening_since() -> Optional[datetime]:
+    """Start of the window whose events this worker's listener adds to the rollups"""
+    return _listening_since
+
+async def start_analytics_ingestion():
+    """Start the batched analytics writer"""
+    # Events stamped from here on reach the rollups through the flush listener
+    global _listening_since
+    _listening_since = listening_since = datetime.utcnow()
+    await event_buffer.start(
+        max_batch=int(os.getenv("ANALYTICS_BATCH_SIZE", "500")),
+        flush_interval=float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "1.0")),
+        max_queue=int(os.getenv("ANALYTICS_QUEUE_SIZE", "10000")),
+        put_timeout=float(os.getenv("ANALYTICS_ENQUEUE_TIMEOUT", "0.05"))
+    )
+
+    task = asyncio.create_task(bootstrap_rollups(listening_since))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def stop_analytics_ingestion():
+    """Flush pending analytics events and stop the writer"""
+    # A bootstrap still waiting on another worker's lease has nothing left to do here
+    for task in list(_background_tasks):
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    await event_buffer.stop()
+
+def build_event_document(
+    event_type: str,
+    page: str,
+    ip_address: Optional[str] = None,
+    user_agent: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    timestamp: Optional[datetime] = None
+) -> dict:
+    """Build the MongoDB document for an analytics event, stamped now unless a timestamp is given"""
+    event = AnalyticsEvent(
+        type=event_type,
+        page=page,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        metadata=metadata or {}
+    )
+    if timestamp is not None:
+        event.timestamp = timestamp
+
+    # Convert to dict for MongoDB
+    event_dict = event.dict()
+    event_dict["_id"] = event_dict.pop("id")
+    if db.analytics_timeseries:
+        # Time-series metaField: events are bucketed per (type, page)
+        event_dict["meta"] = {"type": event_type, "page": page}
+    return event_dict
+
 async def track_event(
     event_type: str,
     page: str,
     ip_address: Optional[str] = None,
     user_agent: Optional[str] = None,
     metadata: Optional[Dict[str, Any]] = None
-):
+) -> bool:
     """Track an analytics event"""
     try:
-        event = AnalyticsEvent(
-            type=event_type,
-            page=page,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            metadata=metadata or {}
-        )
-        
-        # Convert to dict for MongoDB
-        event_dict = event.dict()
-        event_dict["_id"] = event_dict.pop("id")
-        
-        await insert_one("analytics", event_dict)
-        
-        logger.debug(f"Tracked {event_type} event for page {page}")
-        
+        event_dict = build_event_document(event_type, page, ip_address, user_agent, metadata)
+
+        accepted = await event_buffer.put(event_dict)
+
+        if accepted:
+            logger.debug(f"Queued {event_type} event for page {page}")
+        return accepted
+
     except Exception as e:
         logger.error(f"Error tracking analytics event: {e}")
-        # Don't raise exception for analytics failures
\ No newline at end of file
+        # Don't raise exception for analytics failures
+        return False
+
+async def track_events(events: List[dict]) -> int:
+    """Track a batch of pre-built analytics event documents"""
+    try:
+        accepted = await event_buffer.put_many(events)
+        logger.debug(f"Queued batch of {accepted} analytics events")
+        return accepted
+
+    except Exception as e:
+        logger.error(f"Error tracking analytics batch: {e}")
+        return 0
@@ -0,0 +1,265 @@
+"""
+Parquet archive of raw analytics events.
+Events older than the archive horizon are moved out of MongoDB, one day at a
+time, into zstd-compressed Parquet files partitioned by date (hive layout,
+date=YYYY-MM-DD/part-0.parquet). A day is written in page order as a whole, so
+each row group covers a narrow page range and its statistics let readers skip
+everything but the pages they ask for.
+Reads go through pyarrow.dataset, pruning partitions by date and row groups by
+page/timestamp, and stream record batches instead of loading partitions.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from database import iter_aggregate, delete_many, find_many
+from utils.rollups import mark_raw_removed
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("type", pa.string()),
+    ("page", pa.string()),
+    ("timestamp", pa.timestamp("ms")),
+    ("ip_address", pa.string()),
+    ("user_agent", pa.string()),
+    ("metadata", pa.string()),  # JSON encoded; metadata is free-form per event
+])
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+# Rows buffered per row group
+ROW_GROUP_SIZE = 50_000
+
+# The single file each day's partition holds
+PART_NAME = "part-0.parquet"
+
+
+def archive_dir() -> Path:
+    return Path(os.getenv("ANALYTICS_ARCHIVE_DIR", Path(__file__).resolve().parent.parent / "archive" / "analytics"))
+
+
+def _archive_row(event: dict) -> dict:
+    return {
+        "id": str(event["_id"]),
+        "type": event.get("type"),
+        "page": event.get("page"),
+        "timestamp": event.get("timestamp"),
+        "ip_address": event.get("ip_address"),
+        "user_agent": event.get("user_agent"),
+        "metadata": json.dumps(event.get("metadata") or {}, default=str, ensure_ascii=False)
+    }
+
+
+def _sort_key(row: dict) -> tuple:
+    # Matches the server's sort on (page, timestamp, _id); nulls sort first there too
+    return (
+        row["page"] is not None, row["page"] or "",
+        row["timestamp"] is not None, row["timestamp"] or datetime.min,
+        row["id"]
+    )
+
+
+async def _archived_rows(path: Path) -> AsyncIterator[dict]:
+    """Rows already in a day's file, in the order they were written"""
+    if not path.exists():
+        return
+    batches = await asyncio.to_thread(lambda: pq.ParquetFile(path).iter_batches(batch_size=10_000))
+    sentinel = object()
+    while True:
+        batch = await asyncio.to_thread(next, batches, sentinel)
+        if batch is sentinel:
+            return
+        for row in batch.to_pylist():
+            yield row
+
+
+async def _merge_rows(archived: AsyncIterator[dict], events: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Merge two streams sorted by _sort_key, keeping one row per id"""
+    sentinel = object()
+    left = await anext(archived, sentinel)
+    right = await anext(events, sentinel)
+    while left is not sentinel or right is not sentinel:
+        if right is sentinel or (left is not sentinel and _sort_key(left) < _sort_key(right)):
+            yield left
+            left = await anext(archived, sentinel)
+        else:
+            if left is not sentinel and left["id"] == right["id"]:
+                left = await anext(archived, sentinel)
+            yield right
+            right = await anext(events, sentinel)
+
+
+async def archive_day(day: datetime) -> int:
+    """
+    Write one day of raw events to its Parquet file, then delete them from MongoDB.
+    The day's file is rewritten and atomically replaced on every run, merged with
+    what an earlier run archived, so rerunning after a crash at any point neither
+    loses nor duplicates events.
+    """
+    start = day
+    end = day + timedelta(days=1)
+    time_filter = {"timestamp": {"$gte": start, "$lt": end}}
+
+    partition = archive_dir() / f"date={day:%Y-%m-%d}"
+    final_path = partition / PART_NAME
+    # Dot-prefixed so dataset discovery ignores it until it is complete
+    temp_path = partition / f".{PART_NAME}.tmp"
+
+    # Sorting the whole day (rather than each row group) keeps row group page ranges disjoint
+    pipeline = [{"$match": time_filter}, {"$sort": {"page": 1, "timestamp": 1, "_id": 1}}]
+    events = (
+        _archive_row(event)
+        async for event in iter_aggregate("analytics", pipeline, batch_size=5000, allow_disk_use=True)
+    )
+
+    if not await find_many("analytics", time_filter, limit=1):
+        return 0
+
+    writer = None
+    written = 0
+    rows = []
+    try:
+        async for row in _merge_rows(_archived_rows(final_path), events):
+            rows.append(row)
+            if len(rows) >= ROW_GROUP_SIZE:
+                if writer is None:
+                    partition.mkdir(parents=True, exist_ok=True)
+                    writer = pq.ParquetWriter(temp_path, ARCHIVE_SCHEMA, compression="zstd")
+                await asyncio.to_thread(writer.write_table, pa.Table.from_pylist(rows, schema=ARCHIVE_SCHEMA))
+                written += len(rows)
+                rows = []
+
+        if rows:
+            if writer is None:
+                partition.mkdir(parents=True, exist_ok=True)
+                writer = pq.ParquetWriter(temp_path, ARCHIVE_SCHEMA, compression="zstd")
+            await asyncio.to_thread(writer.write_table, pa.Table.from_pylist(rows, schema=ARCHIVE_SCHEMA))
+            written += len(rows)
+    except Exception:
+        if writer is not None:
+            writer.close()
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    if writer is None:
+        return 0
+
+    writer.close()
+    os.replace(temp_path, final_path)
+
+    # Only delete once the file is durably in place, and only after recording it so
+    # rollup rebuilds leave this day alone from now on
+    await mark_raw_removed(end)
+    removed = (await delete_many("analytics", time_filter)).deleted_count
+    logger.info(f"Archived {removed} analytics events for {day:%Y-%m-%d} to {final_path} ({written} rows in the file)")
+    return removed
+
+
+async def archive_events(older_than_days: int) -> dict:
+    """Archive every whole day of raw events older than the given number of days"""
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    oldest = await find_many("analytics", {"timestamp": {"$lt": cutoff}}, sort_dict={"timestamp": 1}, limit=1)
+    if not oldest:
+        return {"days": 0, "events": 0}
+
+    day = oldest[0]["timestamp"].replace(hour=0, minute=0, second=0, microsecond=0)
+    days = 0
+    events = 0
+    while day < cutoff:
+        archived = await archive_day(day)
+        if archived:
+            days += 1
+            events += archived
+        day += timedelta(days=1)
+
+    return {"days": days, "events": events}
+
+
+def _archive_filter(start: Optional[datetime], end: Optional[datetime], page: Optional[str], event_type: Optional[str]):
+    expression = None
+
+    def both(condition):
+        return condition if expression is None else expression & condition
+
+    # Partition pruning on the date directory, row group pruning on the columns
+    if start:
+        expression = both(ds.field("date") >= f"{start:%Y-%m-%d}")
+        expression = both(ds.field("timestamp") >= pa.scalar(start, pa.timestamp("ms")))
+    if end:
+        expression = both(ds.field("date") <= f"{end:%Y-%m-%d}")
+        expression = both(ds.field("timestamp") < pa.scalar(end, pa.timestamp("ms")))
+    if page:
+        expression = both(ds.field("page") == page)
+    if event_type:
+        expression = both(ds.field("type") == event_type)
+    return expression
+
+
+def _dataset() -> Optional[ds.Dataset]:
+    root = archive_dir()
+    if not root.exists():
+        return None
+    schema = ARCHIVE_SCHEMA.append(pa.field("date", pa.string()))
+    return ds.dataset(root, format="parquet", partitioning=PARTITIONING, schema=schema)
+
+
+def _archive_batches(start, end, page, event_type, columns):
+    dataset = _dataset()
+    if dataset is None:
+        return iter(())
+    return dataset.to_batches(
+        columns=columns or ARCHIVE_SCHEMA.names,
+        filter=_archive_filter(start, end, page, event_type),
+        batch_size=10_000
+    )
+
+
+async def iter_archive(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    page: Optional[str] = None,
+    event_type: Optional[str] = None,
+    columns: Optional[List[str]] = None
+) -> AsyncIterator[dict]:
+    """Stream archived events matching a date range, page and type, in partition order"""
+    batches = await asyncio.to_thread(_archive_batches, start, end, page, event_type, columns)
+    sentinel = object()
+
+    while True:
+        batch = await asyncio.to_thread(next, batches, sentinel)
+        if batch is sentinel:
+            return
+        for row in batch.to_pylist():
+            if "metadata" in row and row["metadata"] is not None:
+                row["metadata"] = json.loads(row["metadata"])
+            yield row
+
+
+async def read_archive(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    page: Optional[str] = None,
+    event_type: Optional[str] = None,
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Load archived events matching the filters into a DataFrame"""
+    def load():
+        dataset = _dataset()
+        if dataset is None:
+            return pd.DataFrame(columns=columns or ARCHIVE_SCHEMA.names)
+        table = dataset.to_table(columns=columns or ARCHIVE_SCHEMA.names, filter=_archive_filter(start, end, page, event_type))
+        return table.to_pandas()
+
+    return await asyncio.to_thread(load)
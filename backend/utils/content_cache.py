@@ -0,0 +1,110 @@
+"""
+Versioned cache for public content lists (services, products, projects).
+Each collection has a version number; bumping it invalidates the cached
+response. Cached entries hold the response pre-encoded to JSON bytes (with
+compressed variants) and a strong ETag, so clients can revalidate with
+If-None-Match and get a 304 without the database being touched.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from utils.responses import EncodedBody, PreEncodedJSONResponse
+
+logger = logging.getLogger(__name__)
+
+ContentLoader = Callable[[], Awaitable[Any]]
+
+
+class CacheEntry:
+    def __init__(self, body: EncodedBody, expires_at: float):
+        self.body = body
+        self.expires_at = expires_at
+
+
+def etag_matches(if_none_match: Optional[str], etags: List[str]) -> bool:
+    """Check an If-None-Match header against a set of ETags (weak comparison, per RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in etags:
+            return True
+    return False
+
+
+class ContentCache:
+    """In-process cache of serialized content responses keyed by collection and version"""
+
+    def __init__(self):
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "not_modified": 0}
+        self._versions: Dict[str, int] = {}
+        self._entries: Dict[Tuple[str, int], CacheEntry] = {}
+        self._loading: Dict[Tuple[str, int], asyncio.Task] = {}
+
+    def version(self, collection: str) -> int:
+        return self._versions.get(collection, 0)
+
+    def bump(self, collection: str) -> int:
+        """Invalidate a collection's cached response by moving it to a new version"""
+        version = self.version(collection) + 1
+        self._versions[collection] = version
+        for key in [key for key in self._entries if key[0] == collection]:
+            del self._entries[key]
+        logger.info(f"Content cache for '{collection}' invalidated (version {version})")
+        return version
+
+    async def get(self, collection: str, loader: ContentLoader) -> CacheEntry:
+        """Return the cached entry for a collection, loading it once on a miss"""
+        key = (collection, self.version(collection))
+        entry = self._entries.get(key)
+        if entry and entry.expires_at > time.monotonic():
+            self.stats["hits"] += 1
+            return entry
+
+        self.stats["misses"] += 1
+
+        # Concurrent misses for the same version share a single load
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader))
+            self._loading[key] = task
+            task.add_done_callback(lambda t: self._loading.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Tuple[str, int], loader: ContentLoader) -> CacheEntry:
+        payload = await loader()
+        ttl = float(os.getenv("CONTENT_CACHE_TTL", "300"))
+        # Serialize (and compress) once; every hit serves these bytes directly
+        entry = CacheEntry(EncodedBody(payload), time.monotonic() + ttl)
+
+        # Only publish if the collection was not invalidated while loading
+        if self.version(key[0]) == key[1]:
+            self._entries[key] = entry
+        return entry
+
+    def respond(self, request: Request, entry: CacheEntry) -> Response:
+        """Build a 200 or 304 response for a cached entry"""
+        accept_encoding = request.headers.get("accept-encoding")
+        headers = {"Cache-Control": f"public, max-age={os.getenv('CONTENT_CACHE_MAX_AGE', '60')}"}
+
+        if etag_matches(request.headers.get("if-none-match"), entry.body.etags()):
+            self.stats["not_modified"] += 1
+            headers["ETag"] = entry.body.variant_etag(entry.body.encoding_for(accept_encoding))
+            if entry.body.variants:
+                headers["Vary"] = "Accept-Encoding"
+            return Response(status_code=304, headers=headers)
+
+        return PreEncodedJSONResponse(entry.body, accept_encoding, headers=headers)
+
+
+content_cache = ContentCache()
@@ -0,0 +1,148 @@
+"""
+Cross-worker invalidation of the content cache.
+Each worker watches every content collection through its own MongoDB change
+stream (so the server only ships changes to those collections) and bumps its
+local cache version on every change. Where change streams are not
+available (e.g. a standalone mongod in development) workers instead poll a
+fingerprint of each collection (document count and latest updated_at), so any
+insert, delete or edit that stamps updated_at, as the models do, is picked up.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database import aggregate, watch
+from utils.content_cache import content_cache
+
+logger = logging.getLogger(__name__)
+
+CONTENT_COLLECTIONS = ("services", "products", "projects")
+
+# Only the resume token is needed, not the changed documents
+CHANGE_PIPELINE = [{"$project": {"_id": 1}}]
+
+FINGERPRINT_PIPELINE = [{"$group": {"_id": None, "count": {"$sum": 1}, "updated_at": {"$max": "$updated_at"}}}]
+
+async def content_fingerprint(collection: str) -> Tuple:
+    """Cheap change indicator for a content collection: (document count, latest updated_at)"""
+    result = await aggregate(collection, FINGERPRINT_PIPELINE)
+    if not result:
+        return (0, None)
+    return (result[0]["count"], result[0].get("updated_at"))
+
+
+class ContentWatcher:
+    """Keeps the local content cache coherent with changes made by any worker"""
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self.poll_interval = 5.0
+        self._task: Optional[asyncio.Task] = None
+        self._resume_tokens: Dict[str, object] = {}
+        self._fingerprints: Dict[str, Tuple] = {}
+
+    async def start(self, mode: str = "auto", poll_interval: float = 5.0):
+        """Start watching; mode is auto, changestream, poll or off"""
+        if mode == "off" or self._task:
+            return
+        self.poll_interval = max(0.5, poll_interval)
+        self._task = asyncio.create_task(self._run(mode))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, mode: str):
+        if mode in ("auto", "changestream"):
+            try:
+                await self._watch_changes()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if mode == "changestream":
+                    logger.error(f"Content change stream unavailable: {e}")
+                    return
+                logger.info(f"Change streams unavailable ({e}), polling content fingerprints instead")
+
+        await self._poll_fingerprints()
+
+    async def _watch_changes(self):
+        tasks = [asyncio.create_task(self._watch_collection(collection)) for collection in CONTENT_COLLECTIONS]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _watch_collection(self, collection: str):
+        retry_delay = 1.0
+        first_attempt = True
+
+        while True:
+            try:
+                resume_token = self._resume_tokens.get(collection)
+                async with watch(collection, CHANGE_PIPELINE, resume_after=resume_token) as stream:
+                    if first_attempt:
+                        logger.info(f"Watching {collection} via change stream")
+                    elif resume_token is None:
+                        # Changes may have been missed while disconnected
+                        content_cache.bump(collection)
+                    self.mode = "changestream"
+                    first_attempt = False
+                    retry_delay = 1.0
+
+                    async for _ in stream:
+                        self._resume_tokens[collection] = stream.resume_token
+                        content_cache.bump(collection)
+
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure:
+                if first_attempt:
+                    raise
+                # The resume token may have fallen off the oplog; start fresh
+                self._resume_tokens.pop(collection, None)
+            except PyMongoError as e:
+                logger.warning(f"{collection} change stream interrupted: {e}; reconnecting in {retry_delay:.0f}s")
+
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 60.0)
+
+    async def _poll_fingerprints(self):
+        self.mode = "poll"
+        while True:
+            try:
+                for collection in CONTENT_COLLECTIONS:
+                    fingerprint = await content_fingerprint(collection)
+                    previous = self._fingerprints.get(collection)
+                    if previous is not None and fingerprint != previous:
+                        content_cache.bump(collection)
+                    self._fingerprints[collection] = fingerprint
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error polling content fingerprints: {e}")
+
+            await asyncio.sleep(self.poll_interval)
+
+
+content_watcher = ContentWatcher()
+
+async def start_content_sync():
+    """Start keeping the content cache coherent across workers"""
+    await content_watcher.start(
+        mode=os.getenv("CONTENT_SYNC_MODE", "auto").lower(),
+        poll_interval=float(os.getenv("CONTENT_SYNC_POLL_INTERVAL", "5"))
+    )
+
+async def stop_content_sync():
+    """Stop the content watcher"""
+    await content_watcher.stop()
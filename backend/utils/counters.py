@@ -0,0 +1,193 @@
+"""
+Pre-computed contact statistics.
+The contact_counters collection holds one small document per counter (total,
+service|<name>, month|<YYYY-MM>, status|<status>) that is $inc'd whenever a
+contact is created or its status changes, so statistics are read from a
+handful of documents instead of aggregating the contacts collection. A
+reconciliation job periodically recomputes every counter from scratch to
+repair any drift (e.g. a crash between the contact write and the increment).
+Corrections are compare-and-set against the value read before counting, which
+narrows the race with concurrent $incs without closing it; drift a run leaves
+behind is repaired by the next one. One worker per interval runs the job.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import logging
+import os
+from typing import Dict, Optional
+
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import aggregate, bulk_write, count_documents, find_many, find_one, update_one
+
+logger = logging.getLogger(__name__)
+
+COUNTER_COLLECTION = "contact_counters"
+TOTAL = "total"
+
+# Schedule of the periodic reconciliation, shared by every worker
+SCHEDULE_COLLECTION = "contact_counters_schedule"
+SCHEDULE_ID = "reconcile"
+
+
+def _month(created_at: datetime) -> str:
+    return created_at.strftime("%Y-%m")
+
+
+def _counter(_id: str, amount: int) -> UpdateOne:
+    kind, _, key = _id.partition("|")
+    return UpdateOne(
+        {"_id": _id},
+        {"$inc": {"count": amount}, "$setOnInsert": {"kind": kind, "key": key or None}},
+        upsert=True
+    )
+
+
+async def record_contact_created(contact: dict):
+    """Count a newly stored contact"""
+    await bulk_write(COUNTER_COLLECTION, [
+        _counter(TOTAL, 1),
+        _counter(f"service|{contact.get('service')}", 1),
+        _counter(f"month|{_month(contact['created_at'])}", 1),
+        _counter(f"status|{contact.get('status', 'new')}", 1)
+    ])
+
+
+async def record_status_change(old_status: str, new_status: str):
+    """Move a contact from one status counter to another"""
+    if old_status == new_status:
+        return
+    await bulk_write(COUNTER_COLLECTION, [
+        _counter(f"status|{old_status}", -1),
+        _counter(f"status|{new_status}", 1)
+    ])
+
+
+async def read_counters() -> Dict[str, Dict[str, int]]:
+    """All counters grouped by kind: {"total": {None: n}, "service": {...}, "month": {...}, "status": {...}}"""
+    grouped: Dict[str, Dict[str, int]] = {"total": {}, "service": {}, "month": {}, "status": {}}
+    for document in await find_many(COUNTER_COLLECTION, {}):
+        grouped.setdefault(document["kind"], {})[document.get("key")] = document["count"]
+    return grouped
+
+
+async def contact_total(status: Optional[str] = None) -> int:
+    """Number of contacts, optionally with a given status"""
+    document = await find_one(COUNTER_COLLECTION, {"_id": f"status|{status}" if status else TOTAL})
+    return document["count"] if document else 0
+
+
+async def _stored_counts() -> Dict[str, int]:
+    return {document["_id"]: document["count"] for document in await find_many(COUNTER_COLLECTION, {})}
+
+
+async def reconcile_counters() -> dict:
+    """
+    Recompute every counter from the contacts collection and correct the stored set.
+    Each correction only applies if the counter still holds the value read before
+    counting; a counter that moved meanwhile is left for the next run.
+    """
+    before = await _stored_counts()
+    counts = {TOTAL: await count_documents("contacts")}
+
+    pipelines = {
+        "service": [{"$group": {"_id": "$service", "count": {"$sum": 1}}}],
+        "month": [{"$group": {"_id": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}}, "count": {"$sum": 1}}}],
+        "status": [{"$group": {"_id": {"$ifNull": ["$status", "new"]}, "count": {"$sum": 1}}}]
+    }
+    for kind, pipeline in pipelines.items():
+        for item in await aggregate("contacts", pipeline):
+            counts[f"{kind}|{item['_id']}"] = item["count"]
+    stored = await _stored_counts()
+
+    operations = []
+    skipped = removed = 0
+    for _id in set(counts) | set(stored):
+        if before.get(_id) != stored.get(_id):
+            # Incremented while the contacts were being counted
+            skipped += 1
+            continue
+        count = counts.get(_id)
+        if count == stored.get(_id):
+            continue
+        kind, _, key = _id.partition("|")
+        if _id not in stored:
+            # An increment racing this upsert wins; the counter is then corrected next run
+            operations.append(UpdateOne({"_id": _id}, {"$setOnInsert": {"kind": kind, "key": key or None, "count": count}}, upsert=True))
+        elif count is None:
+            operations.append(DeleteOne({"_id": _id, "count": stored[_id]}))
+            removed += 1
+        else:
+            operations.append(UpdateOne({"_id": _id, "count": stored[_id]}, {"$set": {"count": count}}))
+    if operations:
+        await bulk_write(COUNTER_COLLECTION, operations)
+
+    logger.info(f"Reconciled contact counters: {len(counts)} counters, {len(operations)} corrected, {skipped} skipped")
+    return {"counters": len(counts), "corrected": len(operations), "removed": removed, "skipped": skipped}
+
+
+class CounterReconciler:
+    """Rebuilds contact counters at startup when missing and then periodically"""
+
+    def __init__(self):
+        self.interval = 3600.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, interval: float = 3600.0):
+        if self._task:
+            return
+        self.interval = interval
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _claim_run(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await update_one(
+                SCHEDULE_COLLECTION,
+                {"_id": SCHEDULE_ID, "next_run_at": {"$not": {"$gt": now}}},
+                {"$set": {"next_run_at": now + timedelta(seconds=self.interval)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another worker already ran it this interval
+            return False
+        return True
+
+    async def _run(self):
+        try:
+            if not await find_one(COUNTER_COLLECTION, {"_id": TOTAL}) and await find_one("contacts", {}):
+                logger.info("No contact counters found, building them from contacts")
+                await reconcile_counters()
+        except Exception as e:
+            logger.error(f"Error bootstrapping contact counters: {e}")
+
+        if self.interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if await self._claim_run():
+                    await reconcile_counters()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reconciling contact counters: {e}")
+
+
+counter_reconciler = CounterReconciler()
+
+async def start_counter_reconciler():
+    """Bootstrap contact counters and start periodic reconciliation (0 disables it)"""
+    await counter_reconciler.start(interval=float(os.getenv("CONTACT_COUNTERS_RECONCILE_INTERVAL", "3600")))
+
+async def stop_counter_reconciler():
+    """Stop the contact counter reconciliation job"""
+    await counter_reconciler.stop()
@@ -0,0 +1,154 @@
+"""
+Admin notification digests.
+In digest mode the per-submission admin email is replaced by one email per
+window listing every submission received in it, with a per-service summary.
+Each submission is stored in email_digest_items and its window's digest is
+enqueued in the outbox under a per-window key, so the first submission of a
+window schedules the digest and later ones are no-ops. Customer auto-replies are
+not affected and still go out immediately.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+import logging
+import os
+from typing import Any, Dict, List
+
+from database import insert_one, find_many, update_many, count_documents
+from utils.mailer import mail_pool, SMTPSettings
+from utils.outbox import outbox, DeliverySkipped
+
+logger = logging.getLogger(__name__)
+
+DIGEST_COLLECTION = "email_digest_items"
+DIGEST_MODES = ("off", "always", "auto")
+
+# Seconds after a window closes before its digest is sent, for submissions still in flight
+DIGEST_GRACE = 5
+
+# Longest message excerpt included per submission
+EXCERPT_LENGTH = 300
+
+
+class DigestSettings:
+    def __init__(self):
+        mode = os.getenv("ADMIN_DIGEST_MODE", "off").lower()
+        self.mode = mode if mode in DIGEST_MODES else "off"
+        self.window = max(60, int(os.getenv("ADMIN_DIGEST_WINDOW", "900")))
+        self.threshold = max(1, int(os.getenv("ADMIN_DIGEST_THRESHOLD", "5")))
+
+
+def window_start(moment: datetime, window: int) -> datetime:
+    """Start of the (naive UTC) digest window containing a moment"""
+    epoch = int((moment - datetime(1970, 1, 1)).total_seconds())
+    return datetime(1970, 1, 1) + timedelta(seconds=epoch - epoch % window)
+
+
+async def should_digest(settings: DigestSettings) -> bool:
+    """Whether the admin notification for a new submission goes into a digest"""
+    if settings.mode == "always":
+        return True
+    if settings.mode == "off":
+        return False
+
+    # auto: only batch once submissions in the last window cross the threshold
+    since = datetime.utcnow() - timedelta(seconds=settings.window)
+    recent = await count_documents("contacts", {"created_at": {"$gte": since}})
+    return recent > settings.threshold
+
+
+async def queue_digest_item(contact_data: Dict[str, Any], settings: DigestSettings):
+    """Add a submission to the current window's digest"""
+    window = window_start(datetime.utcnow(), settings.window)
+    await insert_one(DIGEST_COLLECTION, {
+        "_id": contact_data["id"],
+        "window": window,
+        "digested": False,
+        "contact": {
+            field: contact_data.get(field)
+            for field in ("name", "email", "phone", "company", "service", "message", "created_at")
+        }
+    })
+
+    window_end = window + timedelta(seconds=settings.window)
+    await outbox.enqueue([{
+        "key": f"digest:{window.strftime('%Y%m%d%H%M%S')}",
+        "kind": "admin_digest",
+        "payload": {"window": window, "window_end": window_end},
+        "not_before": window_end + timedelta(seconds=DIGEST_GRACE)
+    }])
+
+
+def build_admin_digest(items: List[Dict[str, Any]], window: datetime, window_end: datetime, smtp_user: str, admin_email: str) -> MIMEMultipart:
+    """Build one admin email summarising a window's submissions"""
+    contacts = [item["contact"] for item in items]
+    services = Counter(contact.get("service") or "N/A" for contact in contacts)
+
+    msg = MIMEMultipart()
+    msg['From'] = smtp_user
+    msg['To'] = admin_email
+    msg['Subject'] = f"{len(contacts)} New Contact Form Submissions - {window:%Y-%m-%d %H:%M} to {window_end:%H:%M} UTC"
+
+    summary = "\n".join(f"- {service}: {count}" for service, count in services.most_common())
+    entries = []
+    for number, contact in enumerate(contacts, start=1):
+        message = contact.get('message') or 'N/A'
+        if len(message) > EXCERPT_LENGTH:
+            message = message[:EXCERPT_LENGTH].rstrip() + "..."
+        entries.append(f"""{number}. {contact.get('name', 'N/A')} <{contact.get('email', 'N/A')}>
+   Phone: {contact.get('phone') or 'N/A'}
+   Company: {contact.get('company') or 'N/A'}
+   Service Interest: {contact.get('service', 'N/A')}
+   Time: {contact.get('created_at', 'N/A')}
+   Message: {message}""")
+
+    body = f"""
+{len(contacts)} contact form submissions were received from the Mabratech website between {window:%Y-%m-%d %H:%M} and {window_end:%H:%M} UTC.
+
+Submissions by service:
+{summary}
+
+Submissions:
+
+{chr(10).join(entries)}
+
+Full details are available in the admin panel.
+
+Best regards,
+Mabratech Website System
+    """
+
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+async def deliver_admin_digest(payload: Dict[str, Any]):
+    """Outbox handler: send a window's digest and mark its submissions as digested"""
+    settings = SMTPSettings()
+    if not settings.configured:
+        raise DeliverySkipped("SMTP credentials not configured")
+
+    # Stragglers from earlier windows whose digest already went out are included too
+    items = await find_many(
+        DIGEST_COLLECTION,
+        {"digested": False, "window": {"$lte": payload["window"]}},
+        sort_dict={"contact.created_at": 1}
+    )
+    if not items:
+        return
+
+    admin_email = os.getenv("ADMIN_EMAIL", "info@mabratech.co.id")
+    message = build_admin_digest(items, payload["window"], payload["window_end"], settings.user, admin_email)
+    await mail_pool.send(settings.user, [(admin_email, message)])
+
+    await update_many(
+        DIGEST_COLLECTION,
+        {"_id": {"$in": [item["_id"] for item in items]}},
+        {"$set": {"digested": True, "digested_at": datetime.utcnow()}}
+    )
+    logger.info(f"Admin digest with {len(items)} submissions sent for window starting {payload['window']}")
+
+
+outbox.register_handler("admin_digest", deliver_admin_digest)
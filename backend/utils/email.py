@@ -1,4 +1,3 @@
-import smtplib
 import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -7,30 +6,22 @@ from email import encoders
 import logging
 from typing import Dict, Any
 
+from utils.mailer import mail_pool, SMTPSettings
+from utils.outbox import outbox, DeliverySkipped
+from utils.digest import DigestSettings, should_digest, queue_digest_item
+
 logger = logging.getLogger(__name__)
 
-async def send_contact_notification(contact_data: Dict[str, Any]):
-    """Send email notification when contact form is submitted"""
-    try:
-        # Get SMTP configuration from environment
-        smtp_host = os.getenv("SMTP_HOST", "localhost")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        smtp_user = os.getenv("SMTP_USER", "")
-        smtp_pass = os.getenv("SMTP_PASS", "")
-        admin_email = os.getenv("ADMIN_EMAIL", "info@mabratech.co.id")
-        
-        if not smtp_user or not smtp_pass:
-            logger.warning("SMTP credentials not configured, skipping email notification")
-            return
-        
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = smtp_user
-        msg['To'] = admin_email
-        msg['Subject'] = f"New Contact Form Submission - {contact_data.get('service', 'General Inquiry')}"
-        
-        # Create email body
-        body = f"""
+def build_contact_notification(contact_data: Dict[str, Any], smtp_user: str, admin_email: str) -> MIMEMultipart:
+    """Build the admin notification for a contact form submission"""
+    # Create message
+    msg = MIMEMultipart()
+    msg['From'] = smtp_user
+    msg['To'] = admin_email
+    msg['Subject'] = f"New Contact Form Submission - {contact_data.get('service', 'General Inquiry')}"
+    
+    # Create email body
+    body = f"""
 New contact form submission received from the Mabratech website:
 
 Name: {contact_data.get('name', 'N/A')}
@@ -51,41 +42,21 @@ Please respond to this inquiry at your earliest convenience.
 
 Best regards,
 Mabratech Website System
-        """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Connect to server and send email
-        server = smtplib.SMTP(smtp_host, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_pass)
-        text = msg.as_string()
-        server.sendmail(smtp_user, admin_email, text)
-        server.quit()
-        
-        logger.info(f"Contact notification email sent for submission from {contact_data.get('email')}")
-        
-        # Send auto-reply to customer
-        await send_auto_reply(contact_data, smtp_host, smtp_port, smtp_user, smtp_pass)
-        
-    except Exception as e:
-        logger.error(f"Error sending contact notification email: {e}")
-
-async def send_auto_reply(contact_data: Dict[str, Any], smtp_host: str, smtp_port: int, smtp_user: str, smtp_pass: str):
-    """Send auto-reply to customer"""
-    try:
-        customer_email = contact_data.get('email')
-        if not customer_email:
-            return
-            
-        # Create auto-reply message
-        msg = MIMEMultipart()
-        msg['From'] = smtp_user
-        msg['To'] = customer_email
-        msg['Subject'] = "Terima kasih atas minat Anda - PT Mabra Technology Solutions"
-        
-        # Create auto-reply body
-        body = f"""
+    """
+    
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def build_auto_reply(contact_data: Dict[str, Any], smtp_user: str, customer_email: str) -> MIMEMultipart:
+    """Build the auto-reply sent to the customer"""
+    # Create auto-reply message
+    msg = MIMEMultipart()
+    msg['From'] = smtp_user
+    msg['To'] = customer_email
+    msg['Subject'] = "Terima kasih atas minat Anda - PT Mabra Technology Solutions"
+    
+    # Create auto-reply body
+    body = f"""
 Halo {contact_data.get('name', '')},
 
 Terima kasih telah menghubungi PT Mabra Technology Solutions!
@@ -112,19 +83,61 @@ Email: info@mabratech.co.id
 Website: www.mabratech.co.id
 
 "Penyedia solusi teknologi informasi yang inovatif, handal, dan terpercaya"
-        """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Send auto-reply
-        server = smtplib.SMTP(smtp_host, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_pass)
-        text = msg.as_string()
-        server.sendmail(smtp_user, customer_email, text)
-        server.quit()
-        
-        logger.info(f"Auto-reply sent to {customer_email}")
-        
-    except Exception as e:
-        logger.error(f"Error sending auto-reply email: {e}")
\ No newline at end of file
+    """
+    
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def contact_emails_key(contact_id: str) -> str:
+    return f"contact:{contact_id}:emails"
+
+async def deliver_contact_emails(payload: Dict[str, Any]):
+    """
+    Outbox handler: send a submission's admin notification and auto-reply over one pooled session.
+    Each email is recorded once sent, so a retry after a partial failure only sends the rest.
+    """
+    settings = SMTPSettings()
+    if not settings.configured:
+        raise DeliverySkipped("SMTP credentials not configured")
+    
+    contact_data = payload["contact"]
+    completed = set(payload.get("completed", []))
+    steps = []
+    messages = []
+    if payload.get("notify_admin", True) and "notification" not in completed:
+        admin_email = os.getenv("ADMIN_EMAIL", "info@mabratech.co.id")
+        steps.append("notification")
+        messages.append((admin_email, build_contact_notification(contact_data, settings.user, admin_email)))
+    customer_email = contact_data.get('email')
+    if customer_email and "auto_reply" not in completed:
+        steps.append("auto_reply")
+        messages.append((customer_email, build_auto_reply(contact_data, settings.user, customer_email)))
+    if not messages:
+        if completed:
+            return
+        raise DeliverySkipped("Nothing to send for this contact")
+    
+    async def on_sent(index: int):
+        await outbox.record_progress(contact_emails_key(contact_data["id"]), steps[index])
+        if steps[index] == "notification":
+            logger.info(f"Contact notification email sent for submission from {contact_data.get('email')}")
+        else:
+            logger.info(f"Auto-reply sent to {customer_email}")
+    
+    await mail_pool.send(settings.user, messages, on_sent=on_sent)
+
+outbox.register_handler("contact_emails", deliver_contact_emails)
+
+async def queue_contact_emails(contact_data: Dict[str, Any]):
+    """Write a submission's emails to the outbox as one message, delivered over one session"""
+    digest = DigestSettings()
+    notify_admin = not await should_digest(digest)
+    if not notify_admin:
+        # Admin hears about it in the window's digest instead
+        await queue_digest_item(contact_data, digest)
+    
+    await outbox.enqueue([{
+        "key": contact_emails_key(contact_data['id']),
+        "kind": "contact_emails",
+        "payload": {"contact": contact_data, "notify_admin": notify_admin}
+    }])
@@ -0,0 +1,123 @@
+"""
+Streaming CSV/NDJSON exports.
+Documents are read from an async cursor and encoded chunk by chunk, optionally
+through an incremental gzip compressor, so server memory stays proportional to
+one cursor batch regardless of export size.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, List
+
+from fastapi.responses import StreamingResponse
+
+# Flush encoded rows to the client once this many bytes are buffered
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+# Leading characters that make spreadsheet applications evaluate a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _export_document(document: dict) -> dict:
+    document = dict(document)
+    if "_id" in document:
+        document["id"] = document.pop("_id")
+    return document
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default, ensure_ascii=False)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # User-submitted text (names, messages) must not run as a formula when opened
+        return "'" + value
+    return value
+
+
+async def csv_chunks(documents: AsyncIterator[dict], fields: List[str]) -> AsyncIterator[bytes]:
+    """Encode documents as CSV with a header row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+
+    async for document in documents:
+        document = _export_document(document)
+        writer.writerow([_csv_value(document.get(field)) for field in fields])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def ndjson_chunks(documents: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Encode documents as newline-delimited JSON"""
+    lines = []
+    size = 0
+
+    async for document in documents:
+        line = json.dumps(_export_document(document), default=_json_default, ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(lines).encode("utf-8")
+            lines = []
+            size = 0
+
+    if lines:
+        yield "".join(lines).encode("utf-8")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a byte stream incrementally into a gzip file"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_response(
+    documents: AsyncIterator[dict],
+    fields: List[str],
+    export_format: str,
+    compress: bool,
+    basename: str
+) -> StreamingResponse:
+    """Build a StreamingResponse download for an export"""
+    if export_format == "csv":
+        chunks = csv_chunks(documents, fields)
+        media_type = "text/csv; charset=utf-8"
+    else:
+        chunks = ndjson_chunks(documents)
+        media_type = "application/x-ndjson"
+
+    filename = f"{basename}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{export_format}"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,199 @@
+"""
+Unique visitor estimates with HyperLogLog sketches.
+Every flushed batch of page views updates one sketch per (day, page) plus a
+site-wide sketch per day. A sketch is a fixed array of 2^HLL_PRECISION one-byte
+registers (4 KiB, ~1.6% standard error), so memory and storage do not grow with
+traffic. Sketches merge by taking the register-wise maximum, which lets any
+worker fold its batch into the stored sketch and lets readers combine days into
+arbitrary windows. Stored sketches are updated with a compare-and-swap on a
+version field so concurrent workers never lose each other's registers; a batch
+reads all of its sketches with one query and writes them with one bulk write.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import Binary
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import bulk_write, find_many
+
+logger = logging.getLogger(__name__)
+
+HLL_COLLECTION = "analytics_hll"
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+# Page key of the site-wide sketch
+ALL_PAGES = "*"
+
+# Attempts at folding a batch into the stored sketches before giving up on the rest
+CAS_RETRIES = 5
+
+
+def _alpha(m: int) -> float:
+    if m == 16:
+        return 0.673
+    if m == 32:
+        return 0.697
+    if m == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / m)
+
+
+def visitor_key(event: dict) -> str:
+    """Visitor identity for an event: its (ip_address, user_agent) pair"""
+    return f"{event.get('ip_address') or ''}|{event.get('user_agent') or ''}"
+
+
+class HyperLogLog:
+    """HyperLogLog sketch over 64-bit hashes with numpy registers"""
+
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Optional[np.ndarray] = None):
+        self.registers = registers if registers is not None else np.zeros(HLL_REGISTERS, dtype=np.uint8)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def add_many(self, values: Iterable[str]):
+        """Add values to the sketch"""
+        indexes = []
+        ranks = []
+        width = 64 - HLL_PRECISION
+        for value in values:
+            hashed = self._hash(value)
+            indexes.append(hashed >> width)
+            # Rank is the position of the first set bit in the remaining bits
+            rest = hashed & ((1 << width) - 1)
+            ranks.append(width - rest.bit_length() + 1)
+        if indexes:
+            np.maximum.at(self.registers, np.array(indexes, dtype=np.intp), np.array(ranks, dtype=np.uint8))
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Fold another sketch into this one"""
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self) -> int:
+        """Estimated number of distinct values added"""
+        m = HLL_REGISTERS
+        estimate = _alpha(m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(np.frombuffer(data, dtype=np.uint8).copy())
+
+
+def sketch_id(day: datetime, page: str) -> str:
+    return f"{day.date().isoformat()}|{page}"
+
+
+async def _fold(sketches: Dict[Tuple[datetime, str], HyperLogLog]) -> int:
+    """
+    Merge sketches into the stored ones for their (day, page) with compare-and-swap.
+    Returns how many were still unconfirmed after CAS_RETRIES conflicting rounds.
+    """
+    pending = {sketch_id(day, page): (day, page, sketch) for (day, page), sketch in sketches.items()}
+    for _ in range(CAS_RETRIES):
+        stored = {
+            document["_id"]: document
+            for document in await find_many(HLL_COLLECTION, {"_id": {"$in": list(pending)}})
+        }
+
+        operations = []
+        for _id, (day, page, sketch) in list(pending.items()):
+            document = stored.get(_id)
+            if document is None:
+                operations.append(InsertOne({
+                    "_id": _id,
+                    "day": day,
+                    "page": page,
+                    "precision": HLL_PRECISION,
+                    "registers": Binary(sketch.to_bytes()),
+                    "version": 1
+                }))
+                continue
+
+            current = np.frombuffer(document["registers"], dtype=np.uint8)
+            merged = HyperLogLog.from_bytes(document["registers"]).merge(sketch)
+            if np.array_equal(merged.registers, current):
+                # Nothing new, or an earlier round's write already landed
+                del pending[_id]
+                continue
+            operations.append(UpdateOne(
+                {"_id": _id, "version": document["version"]},
+                {"$set": {"registers": Binary(merged.to_bytes())}, "$inc": {"version": 1}}
+            ))
+
+        if not operations:
+            return 0
+        try:
+            result = await bulk_write(HLL_COLLECTION, operations, ordered=False)
+            if result.inserted_count + result.modified_count == len(operations):
+                return 0
+        except BulkWriteError as e:
+            # Duplicate inserts lost a race to another worker; anything else is a real failure
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        # Some writes conflicted; the next round re-reads and retries only those
+
+    logger.warning(f"Gave up merging {len(pending)} unique visitor sketches after {CAS_RETRIES} conflicting rounds")
+    return len(pending)
+
+
+async def apply_events(events: List[dict]):
+    """Fold a batch of freshly written page views into the per-day sketches"""
+    visitors: Dict[Tuple[datetime, str], List[str]] = defaultdict(list)
+    for event in events:
+        timestamp = event.get("timestamp")
+        if event.get("type") != "page_view" or not timestamp:
+            continue
+        day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+        key = visitor_key(event)
+        visitors[(day, event.get("page"))].append(key)
+        visitors[(day, ALL_PAGES)].append(key)
+
+    sketches = {}
+    for day_page, keys in visitors.items():
+        sketches[day_page] = HyperLogLog()
+        sketches[day_page].add_many(keys)
+    if sketches:
+        await _fold(sketches)
+
+
+async def unique_visitors(start: datetime, end: datetime, pages: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Estimated unique visitors per page over the days overlapping [start, end].
+    Includes the site-wide count under "*"; pass pages to limit which are merged.
+    """
+    first_day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    filter_dict = {"day": {"$gte": first_day, "$lte": end}}
+    if pages is not None:
+        filter_dict["page"] = {"$in": list(pages) + [ALL_PAGES]}
+
+    merged: Dict[str, HyperLogLog] = {}
+    for document in await find_many(HLL_COLLECTION, filter_dict):
+        sketch = HyperLogLog.from_bytes(document["registers"])
+        page = document["page"]
+        if page in merged:
+            merged[page].merge(sketch)
+        else:
+            merged[page] = sketch
+
+    return {page: sketch.estimate() for page, sketch in merged.items()}
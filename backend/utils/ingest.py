@@ -0,0 +1,189 @@
+"""
+In-process ingestion buffer.
+Documents are queued in memory and written to MongoDB in batches with a single
+unordered insert_many, so request handlers never wait on a database round-trip.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from database import insert_many
+
+logger = logging.getLogger(__name__)
+
+FlushListener = Callable[[List[dict]], Awaitable[None]]
+
+# Sentinel pushed through the queue on shutdown so everything queued before it is drained
+_STOP = object()
+
+
+class IngestBuffer:
+    """Bounded queue that flushes documents to a collection on size or age"""
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        self.max_batch = 500
+        self.flush_interval = 1.0
+        self.max_queue = 10000
+        self.put_timeout = 0.05
+        self.stats: Dict[str, int] = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "dropped": 0,
+            "batches": 0,
+        }
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[FlushListener] = []
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def add_flush_listener(self, listener: FlushListener):
+        """Register a coroutine called with every batch after it has been written"""
+        self._listeners.append(listener)
+
+    async def start(
+        self,
+        max_batch: int = 500,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        put_timeout: float = 0.05
+    ):
+        """Start the background flush task"""
+        if self.running:
+            return
+
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = max(0.01, flush_interval)
+        self.max_queue = max(self.max_batch, max_queue)
+        self.put_timeout = max(0.0, put_timeout)
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Ingestion buffer for '{self.collection_name}' started "
+            f"(batch={self.max_batch}, interval={self.flush_interval}s, queue={self.max_queue})"
+        )
+
+    async def stop(self):
+        """Drain everything queued so far and stop the flush task"""
+        if not self.running:
+            return
+
+        # Not running from here on: puts racing the drain write through instead of
+        # landing behind the sentinel, where nothing would ever read them
+        task, self._task = self._task, None
+        await self._queue.put(_STOP)
+        await task
+        logger.info(f"Ingestion buffer for '{self.collection_name}' drained and stopped")
+
+    async def put(self, document: dict) -> bool:
+        """
+        Queue a document for writing.
+        When the queue is full the caller waits up to put_timeout for space,
+        after which the document is dropped and False is returned.
+        """
+        if not self.running:
+            # No flush task (e.g. outside the app lifespan): write through directly
+            await self._flush([document])
+            return True
+
+        try:
+            self._queue.put_nowait(document)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(document), timeout=self.put_timeout)
+            except asyncio.TimeoutError:
+                self.stats["dropped"] += 1
+                logger.warning(f"Ingestion queue for '{self.collection_name}' is full, dropping document")
+                return False
+
+        self.stats["enqueued"] += 1
+        return True
+
+    async def put_many(self, documents: List[dict]) -> int:
+        """Queue several documents, returning how many were accepted (stops at the first timeout)"""
+        if not self.running:
+            await self._flush(list(documents))
+            return len(documents)
+
+        accepted = 0
+        for document in documents:
+            if not await self.put(document):
+                # The queue stayed full for a whole put_timeout; waiting again per
+                # document would stall the request, so drop the rest of the batch
+                dropped = len(documents) - accepted - 1
+                if dropped:
+                    self.stats["dropped"] += dropped
+                    logger.warning(f"Ingestion queue for '{self.collection_name}' is full, dropping {dropped} more documents")
+                break
+            accepted += 1
+        return accepted
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+
+        while True:
+            first = await queue.get()
+            if first is _STOP:
+                return
+
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+
+            while len(batch) < self.max_batch:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        break
+
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[dict]):
+        written = batch
+        try:
+            await insert_many(self.collection_name, batch, ordered=False)
+        except BulkWriteError as e:
+            # Unordered inserts keep going past individual failures (e.g. duplicate ids)
+            failed_indexes = {error["index"] for error in e.details.get("writeErrors", [])}
+            written = [doc for i, doc in enumerate(batch) if i not in failed_indexes]
+            self.stats["failed"] += len(failed_indexes)
+            logger.error(f"Partial failure writing batch to '{self.collection_name}': {len(failed_indexes)} documents rejected")
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            logger.error(f"Error writing batch of {len(batch)} documents to '{self.collection_name}': {e}")
+            return
+
+        self.stats["written"] += len(written)
+        self.stats["batches"] += 1
+
+        for listener in self._listeners:
+            try:
+                await listener(written)
+            except Exception as e:
+                logger.error(f"Error in flush listener for '{self.collection_name}': {e}")
@@ -0,0 +1,171 @@
+"""
+Pooled SMTP transport.
+Keeps a small pool of authenticated SMTP sessions that are reused across sends,
+health-checked with NOOP after sitting idle and re-established when the server
+drops them. smtplib is blocking, so every SMTP call runs on a dedicated thread
+pool and the event loop never waits on the mail server.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import smtplib
+import time
+from email.message import Message
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Errors about a single message; the session itself is still usable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class SMTPSettings:
+    def __init__(self):
+        self.host = os.getenv("SMTP_HOST", "localhost")
+        self.port = int(os.getenv("SMTP_PORT", "587"))
+        self.user = os.getenv("SMTP_USER", "")
+        self.password = os.getenv("SMTP_PASS", "")
+        self.timeout = float(os.getenv("SMTP_TIMEOUT", "10"))
+        self.pool_size = max(1, int(os.getenv("SMTP_POOL_SIZE", "2")))
+        self.healthcheck_after = float(os.getenv("SMTP_HEALTHCHECK_AFTER", "30"))
+        self.max_idle = float(os.getenv("SMTP_MAX_IDLE", "240"))
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.user and self.password)
+
+
+class _PooledConnection:
+    __slots__ = ("smtp", "last_used")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """Bounded pool of reusable, authenticated SMTP sessions"""
+
+    def __init__(self):
+        self.settings: Optional[SMTPSettings] = None
+        self.stats = {"connects": 0, "reconnects": 0, "sent": 0, "failed": 0}
+        self._idle: List[_PooledConnection] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _ensure_started(self):
+        if self._semaphore is None:
+            self.settings = SMTPSettings()
+            self._semaphore = asyncio.Semaphore(self.settings.pool_size)
+            self._executor = ThreadPoolExecutor(max_workers=self.settings.pool_size, thread_name_prefix="smtp")
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> smtplib.SMTP:
+        settings = self.settings
+        if settings.port == 465:
+            smtp = smtplib.SMTP_SSL(settings.host, settings.port, timeout=settings.timeout)
+        else:
+            smtp = smtplib.SMTP(settings.host, settings.port, timeout=settings.timeout)
+            smtp.starttls()
+        smtp.login(settings.user, settings.password)
+        return smtp
+
+    @staticmethod
+    def _close(smtp: smtplib.SMTP):
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    @staticmethod
+    def _is_alive(smtp: smtplib.SMTP) -> bool:
+        try:
+            return smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    async def _new_connection(self) -> _PooledConnection:
+        smtp = await self._call(self._connect)
+        self.stats["connects"] += 1
+        return _PooledConnection(smtp)
+
+    async def _acquire(self) -> _PooledConnection:
+        while self._idle:
+            connection = self._idle.pop()
+            idle_for = time.monotonic() - connection.last_used
+
+            if idle_for > self.settings.max_idle:
+                # Most servers drop idle sessions well before this; don't bother probing
+                await self._call(self._close, connection.smtp)
+                continue
+            if idle_for > self.settings.healthcheck_after and not await self._call(self._is_alive, connection.smtp):
+                await self._call(self._close, connection.smtp)
+                continue
+            return connection
+
+        return await self._new_connection()
+
+    def _release(self, connection: _PooledConnection):
+        connection.last_used = time.monotonic()
+        self._idle.append(connection)
+
+    async def send(
+        self,
+        sender: str,
+        messages: List[Tuple[str, Message]],
+        on_sent: Optional[Callable[[int], Awaitable[None]]] = None
+    ):
+        """Send (recipient, message) pairs over a single pooled session, calling on_sent(index) after each"""
+        self._ensure_started()
+
+        async with self._semaphore:
+            connection = await self._acquire()
+            try:
+                for index, (recipient, message) in enumerate(messages):
+                    try:
+                        await self._call(connection.smtp.sendmail, sender, [recipient], message.as_string())
+                    except MESSAGE_ERRORS:
+                        raise
+                    except OSError:
+                        # The session went away mid-use (SMTPServerDisconnected, socket errors):
+                        # reconnect once and retry this message
+                        await self._call(self._close, connection.smtp)
+                        self.stats["reconnects"] += 1
+                        connection = await self._new_connection()
+                        await self._call(connection.smtp.sendmail, sender, [recipient], message.as_string())
+                    self.stats["sent"] += 1
+                    if on_sent:
+                        await on_sent(index)
+            except MESSAGE_ERRORS:
+                self.stats["failed"] += 1
+                self._release(connection)
+                raise
+            except Exception:
+                self.stats["failed"] += 1
+                await self._call(self._close, connection.smtp)
+                raise
+            else:
+                self._release(connection)
+
+    async def close(self):
+        """Close every idle session and the worker threads"""
+        if self._executor is None:
+            return
+        while self._idle:
+            connection = self._idle.pop()
+            await self._call(self._close, connection.smtp)
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        self._semaphore = None
+
+
+mail_pool = SMTPPool()
+
+async def close_mail_pool():
+    """Close pooled SMTP sessions on shutdown"""
+    await mail_pool.close()
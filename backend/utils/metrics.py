@@ -0,0 +1,233 @@
+"""
+Request metrics in Prometheus text format.
+A pure ASGI middleware records latency and response size histograms and
+status code counters per (method, route template), plus an in-flight gauge.
+Recording runs on the event loop thread only, so it is plain counter and
+bisect arithmetic with no locks. Collectors registered on the registry add
+point-in-time values (queue depths, cache hit ratios, ...) at scrape time.
+"""
+
+from bisect import bisect_left
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from database import get_singleflight_stats
+from utils.analytics import event_buffer
+from utils.content_cache import content_cache
+from utils.mailer import mail_pool
+from utils.mongo_monitor import command_monitor
+from utils.outbox import outbox
+from utils.reports import report_cache
+from utils.snapshots import snapshots
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Label for requests that matched no route, so unknown paths cannot explode cardinality
+UNMATCHED = "unmatched"
+
+# (name, type, help, [(labels, value)]); histogram families carry histogram objects as values
+Sample = Tuple[Dict[str, str], float]
+MetricFamily = Tuple[str, str, str, List[Sample]]
+Collector = Callable[[], Iterable[MetricFamily]]
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "size", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+
+
+_templates: Dict[Callable, str] = {}
+
+
+def route_template(scope) -> str:
+    """Path template of the route that handled a request (call after the app ran), or UNMATCHED"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return UNMATCHED
+    template = _templates.get(endpoint)
+    if template is None:
+        # Routing stores the endpoint in the scope; map it back to its path template once
+        for route in scope["app"].routes:
+            if getattr(route, "endpoint", None) is not None:
+                _templates[route.endpoint] = route.path
+        template = _templates.get(endpoint, UNMATCHED)
+    return template
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def histogram_samples(name: str, labels: Dict[str, str], histogram) -> List[str]:
+    """Bucket, sum and count lines of anything with bounds, per-bucket counts (+Inf last) and sum"""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(tuple(histogram.bounds) + (float("inf"),), histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(float(bound))})} {cumulative}")
+    lines.append(f"{name}_sum{_labels(labels)} {_number(float(histogram.sum))}")
+    lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+    return lines
+
+
+class MetricsRegistry:
+    """Per-route request metrics plus scrape-time collectors"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self._collectors: List[Collector] = []
+
+    def register_collector(self, collector: Collector):
+        """Add a callable returning metric families to include in every scrape"""
+        self._collectors.append(collector)
+
+    def observe(self, scope, status: int, size: int, duration: float):
+        key = (scope["method"], route_template(scope))
+        route = self.routes.get(key)
+        if route is None:
+            route = self.routes[key] = RouteMetrics()
+        route.latency.observe(duration)
+        route.size.observe(size)
+        route.statuses[status] = route.statuses.get(status, 0) + 1
+
+    def _histogram_lines(self, name: str, help_text: str, attribute: str) -> List[str]:
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (method, path), route in sorted(self.routes.items()):
+            lines += histogram_samples(name, {"method": method, "route": path}, getattr(route, attribute))
+        return lines
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = self._histogram_lines("http_request_duration_seconds", "Request latency by route template", "latency")
+        lines += self._histogram_lines("http_response_size_bytes", "Response body size by route template", "size")
+
+        lines += ["# HELP http_responses_total Responses by route template and status code", "# TYPE http_responses_total counter"]
+        for (method, path), route in sorted(self.routes.items()):
+            for status, count in sorted(route.statuses.items()):
+                lines.append(f"http_responses_total{_labels({'method': method, 'route': path, 'status': str(status)})} {count}")
+
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being served",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}"
+        ]
+
+        for collector in self._collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+                for labels, value in samples:
+                    if metric_type == "histogram":
+                        lines += histogram_samples(name, labels, value)
+                    else:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request metrics"""
+
+    def __init__(self, app, registry: "MetricsRegistry" = None):
+        self.app = app
+        self.registry = registry or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.in_flight -= 1
+            registry.observe(scope, status, size, time.perf_counter() - started)
+
+
+def _ratio(hits: int, misses: int) -> float:
+    total = hits + misses
+    return hits / total if total else 0.0
+
+
+def app_collector() -> Iterable[MetricFamily]:
+    """Queue depths, background job counters and cache hit ratios of this worker"""
+    yield ("analytics_ingest_queue_depth", "gauge", "Analytics events waiting to be written", [({}, event_buffer.qsize())])
+    yield ("analytics_ingest_events_total", "counter", "Analytics events by ingestion outcome",
+           [({"outcome": outcome}, count) for outcome, count in event_buffer.stats.items()])
+    yield ("email_outbox_messages_total", "counter", "Outbox messages handled by this worker by outcome",
+           [({"outcome": outcome}, count) for outcome, count in outbox.stats.items()])
+    yield ("smtp_pool_events_total", "counter", "SMTP pool connection and send counters",
+           [({"event": event}, count) for event, count in mail_pool.stats.items()])
+
+    caches = {
+        "content": (content_cache.stats["hits"], content_cache.stats["misses"]),
+        "snapshots": (snapshots.stats["hits"] + snapshots.stats["stale_hits"], snapshots.stats["misses"]),
+        "reports": (report_cache.stats["hits"], report_cache.stats["misses"]),
+    }
+    singleflight = get_singleflight_stats()
+    yield ("cache_hit_ratio", "gauge", "Hit ratio since start per cache",
+           [({"cache": name}, _ratio(hits, misses)) for name, (hits, misses) in caches.items()])
+    yield ("cache_requests_total", "counter", "Cache lookups per cache and result",
+           [({"cache": name, "result": "hit"}, hits) for name, (hits, _) in caches.items()]
+           + [({"cache": name, "result": "miss"}, misses) for name, (_, misses) in caches.items()])
+    yield ("mongo_singleflight_reads_total", "counter", "Reads executed or coalesced onto an identical in-flight read",
+           [({"result": "executed"}, singleflight["executed"]), ({"result": "coalesced"}, singleflight["coalesced"])])
+    yield ("mongo_singleflight_in_flight", "gauge", "Distinct reads currently in flight", [({}, singleflight["in_flight"])])
+
+
+def mongo_collector() -> Iterable[MetricFamily]:
+    """MongoDB command latency and failures per collection and command"""
+    timings = sorted(command_monitor.timings().items())
+    yield ("mongodb_command_duration_seconds", "histogram", "MongoDB command latency by collection and command",
+           [({"collection": collection, "command": command}, timing) for (collection, command), timing in timings])
+    yield ("mongodb_command_failures_total", "counter", "Failed MongoDB commands by collection and command",
+           [({"collection": collection, "command": command}, timing.failures) for (collection, command), timing in timings])
+
+
+metrics = MetricsRegistry()
+metrics.register_collector(app_collector)
+metrics.register_collector(mongo_collector)
@@ -0,0 +1,201 @@
+"""
+MongoDB command monitoring.
+A pymongo CommandListener attached to the Motor client times every command
+per (collection, command) and keeps the most recent slow operations, each with
+the shape of its filter or pipeline (values replaced by placeholders, so no
+contact data ends up in the log). Motor runs pymongo on executor threads, so
+listener callbacks arrive off the event loop and all state sits behind a lock.
+"""
+
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Finer than the HTTP buckets: most queries here are index lookups well under 10ms
+COMMAND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Connection and session housekeeping, not application queries
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo", "getLastError"}
+
+# Where each command keeps the part of the request that decides its cost
+SHAPE_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "aggregate": "pipeline",
+    "findAndModify": "query"
+}
+# Write commands carry a list of statements; the filter lives in each one
+STATEMENT_FIELDS = {"update": ("updates", "q"), "delete": ("deletes", "q")}
+
+PLACEHOLDER = "?"
+MAX_SHAPE_LENGTH = 1000
+
+
+def query_shape(value: Any) -> Any:
+    """A filter or pipeline with every literal replaced by a placeholder; operators and field names stay"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in/$nin lists collapse to one placeholder, stage lists keep their stages
+        shapes = [query_shape(item) for item in value]
+        if all(shape == PLACEHOLDER for shape in shapes):
+            return [PLACEHOLDER] if shapes else []
+        return shapes
+    return PLACEHOLDER
+
+
+def command_shape(command_name: str, command: dict) -> Optional[str]:
+    """JSON shape of the filter or pipeline of a command, if it has one"""
+    if command_name in SHAPE_FIELDS:
+        shape = query_shape(command.get(SHAPE_FIELDS[command_name], {}))
+    elif command_name in STATEMENT_FIELDS:
+        statements, field = STATEMENT_FIELDS[command_name]
+        shape = [query_shape(statement.get(field, {})) for statement in command.get(statements, [])[:1]]
+        shape = shape[0] if shape else None
+    else:
+        return None
+    text = json.dumps(shape, sort_keys=True)
+    return text if len(text) <= MAX_SHAPE_LENGTH else text[:MAX_SHAPE_LENGTH] + "..."
+
+
+def command_collection(command_name: str, command: dict) -> str:
+    """Collection a command targets ("(database)" for database-level commands)"""
+    if command_name == "getMore":
+        return command.get("collection", "(database)")
+    target = command.get(command_name)
+    return target if isinstance(target, str) else "(database)"
+
+
+class CommandTiming:
+    """Latency histogram and failure count of one (collection, command)"""
+
+    __slots__ = ("counts", "sum", "failures", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(COMMAND_BUCKETS) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.failures = 0
+        self.max = 0.0
+
+    @property
+    def bounds(self) -> Tuple[float, ...]:
+        return COMMAND_BUCKETS
+
+    def observe(self, seconds: float, failed: bool):
+        self.counts[bisect_left(COMMAND_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        if failed:
+            self.failures += 1
+
+    def copy(self) -> "CommandTiming":
+        timing = CommandTiming()
+        timing.counts = list(self.counts)
+        timing.sum, timing.failures, timing.max = self.sum, self.failures, self.max
+        return timing
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Times MongoDB commands and logs slow ones"""
+
+    def __init__(self):
+        self.slow_ms = 100.0
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str, Optional[str]]] = {}
+        self._timings: Dict[Tuple[str, str], CommandTiming] = {}
+        self._slow: deque = deque(maxlen=200)
+
+    def configure(self, slow_ms: float = 100.0, slow_log_size: int = 200):
+        with self._lock:
+            self.slow_ms = slow_ms
+            if slow_log_size != self._slow.maxlen:
+                self._slow = deque(self._slow, maxlen=max(1, slow_log_size))
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        # The command document is only available here; keep what the finish callbacks need
+        collection = command_collection(event.command_name, event.command)
+        shape = command_shape(event.command_name, event.command)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, event.command_name, shape)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, None)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        failure = event.failure if isinstance(event.failure, dict) else {"errmsg": str(event.failure)}
+        self._finish(event, failure.get("errmsg") or failure.get("codeName") or "failed")
+
+    def _finish(self, event, error: Optional[str]):
+        seconds = event.duration_micros / 1e6
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+            if pending is None:
+                return
+            collection, command_name, shape = pending
+            timing = self._timings.get((collection, command_name))
+            if timing is None:
+                timing = self._timings[(collection, command_name)] = CommandTiming()
+            timing.observe(seconds, error is not None)
+
+            if seconds * 1000 >= self.slow_ms:
+                self._slow.append({
+                    "at": datetime.utcnow(),
+                    "collection": collection,
+                    "command": command_name,
+                    "duration_ms": round(seconds * 1000, 2),
+                    "shape": shape,
+                    "error": error
+                })
+
+    def timings(self) -> Dict[Tuple[str, str], CommandTiming]:
+        """Copy of the per-(collection, command) timings"""
+        with self._lock:
+            return {key: timing.copy() for key, timing in self._timings.items()}
+
+    def slow_operations(self, limit: int = 50) -> List[dict]:
+        """Most recent slow operations, newest first"""
+        with self._lock:
+            recent = list(self._slow)[-limit:]
+        return recent[::-1]
+
+    def summary(self) -> List[dict]:
+        """Per-(collection, command) count, failures, mean and max latency in milliseconds"""
+        results = []
+        for (collection, command_name), timing in sorted(self.timings().items()):
+            count = sum(timing.counts)
+            results.append({
+                "collection": collection,
+                "command": command_name,
+                "count": count,
+                "failures": timing.failures,
+                "mean_ms": round(timing.sum / count * 1000, 3) if count else 0.0,
+                "max_ms": round(timing.max * 1000, 3)
+            })
+        return results
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._slow.clear()
+
+
+command_monitor = CommandMonitor()
+
+def configure_command_monitor():
+    """Apply MONGO_SLOW_MS and MONGO_SLOW_LOG_SIZE"""
+    command_monitor.configure(
+        slow_ms=float(os.getenv("MONGO_SLOW_MS", "100")),
+        slow_log_size=int(os.getenv("MONGO_SLOW_LOG_SIZE", "200"))
+    )
@@ -0,0 +1,264 @@
+"""
+Durable email outbox.
+Messages are written to the email_outbox collection and delivered by a bounded
+pool of workers that claim due messages with a lease. Failed deliveries are
+retried with exponential backoff and jitter; after max_attempts a message is
+dead-lettered. Idempotency keys are the document _id, so enqueueing the same
+message twice is a no-op. Pending messages survive restarts, and a message
+whose worker died is picked up again once its lease expires.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import logging
+import os
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from database import insert_many, find_one_and_update, update_one, aggregate
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "email_outbox"
+OUTBOX_STATUSES = ("pending", "sending", "sent", "skipped", "dead")
+
+OutboxHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class DeliverySkipped(Exception):
+    """Raised by a handler when a message cannot be sent and should not be retried"""
+
+
+class EmailOutbox:
+    """Persistent queue of outgoing emails with a local worker pool"""
+
+    def __init__(self):
+        self.workers = 2
+        self.max_attempts = 8
+        self.base_delay = 30.0
+        self.max_delay = 3600.0
+        self.poll_interval = 5.0
+        self.lease = 120.0
+        self.stats: Dict[str, int] = {
+            "enqueued": 0,
+            "duplicates": 0,
+            "sent": 0,
+            "skipped": 0,
+            "retried": 0,
+            "dead": 0,
+        }
+        self._handlers: Dict[str, OutboxHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._active = 0
+
+    def register_handler(self, kind: str, handler: OutboxHandler):
+        """Register the coroutine that delivers messages of a given kind"""
+        self._handlers[kind] = handler
+
+    async def enqueue(self, messages: List[Dict[str, Any]]) -> int:
+        """
+        Persist messages given as {"key", "kind", "payload"} dicts.
+        Returns how many were new; keys that already exist are ignored.
+        """
+        now = datetime.utcnow()
+        documents = [
+            {
+                "_id": message["key"],
+                "kind": message["kind"],
+                "payload": message["payload"],
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": message.get("not_before", now),
+                "locked_until": None,
+                "last_error": None,
+                "created_at": now,
+                "updated_at": now
+            }
+            for message in messages
+        ]
+
+        try:
+            result = await insert_many(OUTBOX_COLLECTION, documents, ordered=False)
+            inserted = len(result.inserted_ids)
+        except BulkWriteError as e:
+            duplicates = [error for error in e.details.get("writeErrors", []) if error.get("code") == 11000]
+            if len(duplicates) != len(e.details.get("writeErrors", [])):
+                raise
+            inserted = e.details.get("nInserted", 0)
+
+        self.stats["enqueued"] += inserted
+        self.stats["duplicates"] += len(documents) - inserted
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return inserted
+
+    async def record_progress(self, key: str, step: str):
+        """
+        Mark one step of a multi-part message as done, so a retry can skip it.
+        Handlers find completed steps in payload["completed"].
+        """
+        await update_one(OUTBOX_COLLECTION, {"_id": key}, {"$addToSet": {"payload.completed": step}})
+
+    async def start(
+        self,
+        workers: int = 2,
+        max_attempts: int = 8,
+        base_delay: float = 30.0,
+        max_delay: float = 3600.0,
+        poll_interval: float = 5.0,
+        lease: float = 120.0
+    ):
+        """Start the delivery workers"""
+        if self._tasks:
+            return
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease = lease
+
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Email outbox started with {self.workers} workers")
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop the workers, giving in-progress deliveries a moment to finish"""
+        if not self._tasks:
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._active and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await find_one_and_update(
+            OUTBOX_COLLECTION,
+            {
+                "$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    # A worker died or stalled holding this message
+                    {"status": "sending", "locked_until": {"$lt": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": "sending",
+                    "locked_until": now + timedelta(seconds=self.lease),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort_dict={"next_attempt_at": 1}
+        )
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.5)
+
+    async def _deliver(self, message: dict):
+        # Matching on attempts makes a stale worker's update a no-op once the message was reclaimed
+        claim = {"_id": message["_id"], "attempts": message["attempts"]}
+        handler = self._handlers.get(message["kind"])
+        try:
+            if handler is None:
+                raise DeliverySkipped(f"No handler for outbox message kind '{message['kind']}'")
+            await handler(message["payload"])
+
+        except DeliverySkipped as e:
+            self.stats["skipped"] += 1
+            logger.warning(f"Outbox message {message['_id']} skipped: {e}")
+            await update_one(OUTBOX_COLLECTION, claim, {"$set": {"status": "skipped", "last_error": str(e), "locked_until": None}})
+
+        except Exception as e:
+            attempts = message["attempts"]
+            if attempts >= self.max_attempts:
+                self.stats["dead"] += 1
+                logger.error(f"Outbox message {message['_id']} dead-lettered after {attempts} attempts: {e}")
+                await update_one(OUTBOX_COLLECTION, claim, {"$set": {"status": "dead", "last_error": str(e), "locked_until": None}})
+            else:
+                delay = self._backoff(attempts)
+                self.stats["retried"] += 1
+                logger.warning(f"Outbox message {message['_id']} failed (attempt {attempts}), retrying in {delay:.0f}s: {e}")
+                await update_one(
+                    OUTBOX_COLLECTION,
+                    claim,
+                    {"$set": {
+                        "status": "pending",
+                        "last_error": str(e),
+                        "locked_until": None,
+                        "next_attempt_at": datetime.utcnow() + timedelta(seconds=delay)
+                    }}
+                )
+
+        else:
+            self.stats["sent"] += 1
+            await update_one(
+                OUTBOX_COLLECTION,
+                claim,
+                {"$set": {"status": "sent", "sent_at": datetime.utcnow(), "locked_until": None, "last_error": None}}
+            )
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                message = await self._claim()
+                if message is None:
+                    # Nothing due: sleep until a local enqueue or the next poll
+                    # asyncio.wait, unlike wait_for, never swallows a cancellation racing the wakeup
+                    self._wakeup.clear()
+                    waiter = asyncio.ensure_future(self._wakeup.wait())
+                    try:
+                        await asyncio.wait([waiter], timeout=self.poll_interval)
+                    finally:
+                        waiter.cancel()
+                    continue
+
+                self._active += 1
+                try:
+                    await self._deliver(message)
+                finally:
+                    self._active -= 1
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker {index} error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def status_counts(self) -> Dict[str, int]:
+        """Number of outbox messages in each status"""
+        results = await aggregate(OUTBOX_COLLECTION, [{"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+        counts = {status: 0 for status in OUTBOX_STATUSES}
+        counts.update({item["_id"]: item["count"] for item in results})
+        return counts
+
+
+outbox = EmailOutbox()
+
+async def start_outbox():
+    """Start delivering queued emails"""
+    await outbox.start(
+        workers=int(os.getenv("OUTBOX_WORKERS", "2")),
+        max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+        base_delay=float(os.getenv("OUTBOX_BASE_DELAY", "30")),
+        max_delay=float(os.getenv("OUTBOX_MAX_DELAY", "3600")),
+        poll_interval=float(os.getenv("OUTBOX_POLL_INTERVAL", "5")),
+        lease=float(os.getenv("OUTBOX_LEASE", "120"))
+    )
+
+async def stop_outbox():
+    """Stop the outbox workers"""
+    await outbox.stop()
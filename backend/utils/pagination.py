@@ -0,0 +1,33 @@
+"""
+Opaque cursors for keyset pagination.
+A cursor encodes the sort key of the last document on a page, so the next page
+is an index range scan that costs the same no matter how deep it is.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Tuple
+
+def encode_cursor(created_at: datetime, document_id: Any) -> str:
+    """Encode the (created_at, _id) position of a document"""
+    raw = json.dumps({"t": created_at.isoformat(), "i": document_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(data["t"]), data["i"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_filter(created_at: datetime, document_id: Any) -> dict:
+    """Documents strictly after the cursor in (created_at desc, _id desc) order"""
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": document_id}}
+        ]
+    }
@@ -0,0 +1,209 @@
+"""
+Opt-in request profiling.
+When PROFILE_SAMPLE_RATE is above zero or PROFILE_ADMIN_TOKEN is set (and the
+pyinstrument package is installed), a middleware profiles a random fraction of
+requests plus every request whose X-Profile-Token header matches the token.
+Each profile is written under PROFILE_DIR/<route>/ as a speedscope JSON file or
+as collapsed stacks (for flamegraph.pl / speedscope import). With profiling
+disabled the middleware is not installed at all, so requests pay nothing.
+"""
+
+import asyncio
+from datetime import datetime
+import hmac
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from utils.metrics import route_template
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pyinstrument is optional; profiling stays off without it
+    Profiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_FORMATS = {"speedscope": ".speedscope.json", "collapsed": ".collapsed.txt"}
+
+# Route directories and profile files are generated from these characters only
+SAFE_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+class ProfileSettings:
+    def __init__(self):
+        self.sample_rate = min(1.0, max(0.0, float(os.getenv("PROFILE_SAMPLE_RATE", "0"))))
+        self.admin_token = os.getenv("PROFILE_ADMIN_TOKEN", "")
+        self.directory = Path(os.getenv("PROFILE_DIR", str(Path(__file__).resolve().parent.parent / "profiles")))
+        self.format = os.getenv("PROFILE_FORMAT", "speedscope")
+        self.interval = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+        self.max_files = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+        if self.format not in PROFILE_FORMATS:
+            logger.warning(f"Unknown PROFILE_FORMAT {self.format!r}, using speedscope")
+            self.format = "speedscope"
+
+    @property
+    def enabled(self) -> bool:
+        return Profiler is not None and (self.sample_rate > 0 or bool(self.admin_token))
+
+
+def profiling_enabled() -> bool:
+    """Whether the profiling middleware should be installed"""
+    settings = ProfileSettings()
+    if Profiler is None and (settings.sample_rate > 0 or settings.admin_token):
+        logger.warning("Request profiling is configured but pyinstrument is not installed; profiling is off")
+    return settings.enabled
+
+
+def token_matches(settings: ProfileSettings, supplied: Optional[str]) -> bool:
+    # compare_digest only takes ASCII strs, so non-ASCII input would raise instead of failing to match
+    if not (settings.admin_token and supplied):
+        return False
+    return hmac.compare_digest(settings.admin_token.encode("utf-8"), supplied.encode("utf-8"))
+
+
+def route_directory_name(template: str) -> str:
+    """Filesystem-safe directory name for a route template"""
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", template.strip("/")).strip("_.")
+    return name or "root"
+
+
+def collapsed_stacks(session) -> str:
+    """A profile session as collapsed stacks: one "frame;frame;frame microseconds" line per stack"""
+    lines = []
+
+    def walk(frame, stack: List[str]):
+        label = f"{frame.function} ({frame.file_path_short}:{frame.line_no})" if frame.file_path_short else frame.function
+        stack = stack + [label.replace(";", ":")]
+        self_time = frame.time - sum(child.time for child in frame.children)
+        if self_time > 0:
+            lines.append(f"{';'.join(stack)} {int(round(self_time * 1e6))}")
+        for child in frame.children:
+            walk(child, stack)
+
+    root = session.root_frame()
+    if root is not None:
+        walk(root, [])
+    return "\n".join(lines) + "\n"
+
+
+def render_profile(session, profile_format: str) -> str:
+    if profile_format == "collapsed":
+        return collapsed_stacks(session)
+    return SpeedscopeRenderer().render(session)
+
+
+class ProfileStore:
+    """Profile files under PROFILE_DIR/<route>/, capped at PROFILE_MAX_FILES"""
+
+    def __init__(self, settings: ProfileSettings):
+        self.settings = settings
+
+    def write(self, template: str, name: str, content: str):
+        directory = self.settings.directory / route_directory_name(template)
+        directory.mkdir(parents=True, exist_ok=True)
+        temporary = directory / f".{name}.tmp"
+        temporary.write_text(content, encoding="utf-8")
+        temporary.replace(directory / name)
+        self._prune()
+
+    def _prune(self):
+        files = sorted(self.list_files(), key=lambda path: path.stat().st_mtime)
+        for path in files[:max(0, len(files) - self.settings.max_files)]:
+            path.unlink(missing_ok=True)
+
+    def list_files(self) -> List[Path]:
+        if not self.settings.directory.is_dir():
+            return []
+        return [
+            path for path in self.settings.directory.glob("*/*")
+            if path.is_file() and not path.name.startswith(".") and path.name.endswith(tuple(PROFILE_FORMATS.values()))
+        ]
+
+    def listing(self) -> List[dict]:
+        """Stored profiles, newest first"""
+        profiles = []
+        for path in self.list_files():
+            stat = path.stat()
+            profiles.append({
+                "route": path.parent.name,
+                "file": path.name,
+                "size": stat.st_size,
+                "created_at": datetime.utcfromtimestamp(stat.st_mtime)
+            })
+        return sorted(profiles, key=lambda profile: profile["created_at"], reverse=True)
+
+    def resolve(self, route: str, name: str) -> Optional[Path]:
+        """Path of a stored profile, or None if the names are unsafe or it does not exist"""
+        if not SAFE_NAME.match(route) or not SAFE_NAME.match(name) or name.startswith("."):
+            return None
+        root = self.settings.directory.resolve()
+        path = (root / route / name).resolve()
+        if path.parent.parent != root or not path.is_file():
+            return None
+        return path
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling sampled or admin-requested requests"""
+
+    def __init__(self, app, settings: Optional[ProfileSettings] = None):
+        self.app = app
+        self.settings = settings or ProfileSettings()
+        self.store = ProfileStore(self.settings)
+        self._active = False
+
+    def _wanted(self, scope) -> bool:
+        if scope["type"] != "http":
+            return False
+        if self.settings.admin_token:
+            for key, value in scope.get("headers", []):
+                if key == PROFILE_HEADER.encode() and token_matches(self.settings, value.decode("latin-1")):
+                    return True
+        return self.settings.sample_rate > 0 and random.random() < self.settings.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        # One profile at a time: the sampler follows the event loop thread, so
+        # overlapping profiles would each see the other request's frames
+        if self._active or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        profiler = None
+        self._active = True
+        try:
+            # Inside the try so a profiler that fails to start still releases the slot
+            profiler = Profiler(interval=self.settings.interval, async_mode="enabled")
+            started = time.perf_counter()
+            profiler.start()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            session = profiler.stop() if profiler is not None and profiler.is_running else None
+            self._active = False
+            if session is not None:
+                await self._save(scope, profile_id, started, session)
+
+    async def _save(self, scope, profile_id: str, started: float, session):
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        template = route_template(scope)
+        name = f"{profile_id}-{scope['method']}-{elapsed_ms}ms{PROFILE_FORMATS[self.settings.format]}"
+        try:
+            content = await asyncio.to_thread(render_profile, session, self.settings.format)
+            await asyncio.to_thread(self.store.write, template, name, content)
+        except Exception as e:
+            logger.error(f"Error writing profile for {template}: {e}")
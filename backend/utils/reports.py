@@ -0,0 +1,262 @@
+"""
+Offline analytics reports.
+Events and contacts are loaded in bulk, from MongoDB and/or the Parquet archive,
+into pandas columns, and every report is computed with vectorized operations on
+a worker thread so the event loop is never blocked by the number crunching.
+Results are cached per report and parameters for REPORTS_CACHE_TTL seconds.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from database import iter_many
+from utils.archive import read_archive
+
+logger = logging.getLogger(__name__)
+
+EVENT_COLUMNS = ["type", "page", "timestamp", "ip_address", "user_agent"]
+CONTACT_COLUMNS = ["service", "status", "created_at"]
+SOURCES = ("mongo", "archive", "all")
+
+# Contact statuses counted as a conversion in the per-service report
+CONVERTED_STATUSES = ("qualified", "closed")
+
+
+async def load_events(start: datetime, end: datetime, source: str = "mongo", event_types: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load raw analytics events in [start, end) into a DataFrame"""
+    frames = []
+
+    if source in ("mongo", "all"):
+        filter_dict = {"timestamp": {"$gte": start, "$lt": end}}
+        if event_types:
+            filter_dict["type"] = {"$in": event_types}
+        projection = {field: 1 for field in EVENT_COLUMNS}
+        projection["_id"] = 0
+
+        columns = {field: [] for field in EVENT_COLUMNS}
+        async for event in iter_many("analytics", filter_dict, projection=projection, batch_size=5000):
+            for field in EVENT_COLUMNS:
+                columns[field].append(event.get(field))
+        frames.append(pd.DataFrame(columns))
+
+    if source in ("archive", "all"):
+        archived = await read_archive(start=start, end=end, columns=EVENT_COLUMNS)
+        if event_types:
+            archived = archived[archived["type"].isin(event_types)]
+        frames.append(archived)
+
+    events = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=EVENT_COLUMNS)
+    events["timestamp"] = pd.to_datetime(events["timestamp"])
+    return events
+
+
+async def load_contacts(start: datetime, end: datetime) -> pd.DataFrame:
+    """Load contact submissions in [start, end) into a DataFrame"""
+    columns = {field: [] for field in CONTACT_COLUMNS}
+    projection = {field: 1 for field in CONTACT_COLUMNS}
+    async for contact in iter_many("contacts", {"created_at": {"$gte": start, "$lt": end}}, projection=projection, batch_size=5000):
+        for field in CONTACT_COLUMNS:
+            columns[field].append(contact.get(field))
+    contacts = pd.DataFrame(columns)
+    contacts["created_at"] = pd.to_datetime(contacts["created_at"])
+    return contacts
+
+
+def visitor_ids(events: pd.DataFrame) -> np.ndarray:
+    """Integer visitor id per event; a visitor is an (ip_address, user_agent) pair"""
+    keys = events["ip_address"].fillna("").astype(str) + "|" + events["user_agent"].fillna("").astype(str)
+    codes, _ = pd.factorize(keys)
+    return codes
+
+
+def page_view_series(events: pd.DataFrame, granularity: str = "day", page: Optional[str] = None) -> List[dict]:
+    """Page views and unique visitors per hour or day bucket"""
+    views = events[events["type"] == "page_view"]
+    if page:
+        views = views[views["page"] == page]
+    if views.empty:
+        return []
+
+    frame = pd.DataFrame({
+        "bucket": views["timestamp"].dt.floor("h" if granularity == "hour" else "D"),
+        "visitor": visitor_ids(views)
+    })
+    grouped = frame.groupby("bucket").agg(views=("visitor", "size"), visitors=("visitor", "nunique"))
+    return [
+        {"bucket": bucket.to_pydatetime(), "views": int(row.views), "visitors": int(row.visitors)}
+        for bucket, row in grouped.iterrows()
+    ]
+
+
+def _step_mask(events: pd.DataFrame, step: str) -> pd.Series:
+    # A step is "type" or "type:page"
+    event_type, _, page = step.partition(":")
+    mask = events["type"] == event_type
+    if page:
+        mask &= events["page"] == page
+    return mask
+
+
+def conversion_funnel(events: pd.DataFrame, steps: List[str], window: timedelta) -> List[dict]:
+    """
+    Ordered funnel: a visitor reaches a step when they perform it after reaching the
+    previous one, within `window` of entering the funnel.
+    """
+    events = events.assign(visitor=visitor_ids(events))
+    results = []
+    reached: Optional[pd.Series] = None  # visitor -> time the previous step was reached
+    entered: Optional[pd.Series] = None
+
+    for step in steps:
+        hits = events.loc[_step_mask(events, step), ["visitor", "timestamp"]]
+        if reached is not None:
+            hits = hits[hits["visitor"].isin(reached.index)]
+            previous = reached.reindex(hits["visitor"]).to_numpy()
+            start = entered.reindex(hits["visitor"]).to_numpy()
+            times = hits["timestamp"].to_numpy()
+            hits = hits[(times >= previous) & (times <= start + np.timedelta64(window))]
+
+        reached = hits.groupby("visitor")["timestamp"].min()
+        if entered is None:
+            entered = reached
+        results.append({"step": step, "visitors": int(reached.size)})
+
+    first = results[0]["visitors"] if results else 0
+    for index, result in enumerate(results):
+        previous = results[index - 1]["visitors"] if index else first
+        result["conversion_from_start"] = round(result["visitors"] / first, 4) if first else 0.0
+        result["conversion_from_previous"] = round(result["visitors"] / previous, 4) if previous else 0.0
+    return results
+
+
+def service_conversion(contacts: pd.DataFrame, events: pd.DataFrame) -> List[dict]:
+    """Submissions, status breakdown and conversion rate per service"""
+    if contacts.empty:
+        return []
+
+    services = contacts["service"].fillna("Unknown")
+    by_status = pd.crosstab(services, contacts["status"].fillna("new"))
+    totals = by_status.sum(axis=1)
+    converted = by_status.reindex(columns=list(CONVERTED_STATUSES), fill_value=0).sum(axis=1)
+
+    views = events[events["type"] == "page_view"]
+    visitors = int(np.unique(visitor_ids(views)).size) if not views.empty else 0
+
+    results = []
+    for service in totals.sort_values(ascending=False).index:
+        total = int(totals[service])
+        results.append({
+            "service": service,
+            "submissions": total,
+            "statuses": {status: int(count) for status, count in by_status.loc[service].items() if count},
+            "converted": int(converted[service]),
+            "conversion_rate": round(int(converted[service]) / total, 4),
+            "share_of_submissions": round(total / int(totals.sum()), 4),
+            "submissions_per_visitor": round(total / visitors, 6) if visitors else None
+        })
+    return results
+
+
+def cohort_retention(events: pd.DataFrame, period: str = "week", periods: int = 8) -> List[dict]:
+    """Share of each first-visit cohort that came back in each following period"""
+    views = events[events["type"] == "page_view"]
+    if views.empty:
+        return []
+
+    length = np.timedelta64(7 if period == "week" else 1, "D")
+    origin = np.datetime64("1970-01-05")  # a Monday, so weekly periods start on Mondays
+    index = ((views["timestamp"].to_numpy() - origin) // length).astype(np.int64)
+
+    frame = pd.DataFrame({"visitor": visitor_ids(views), "period": index})
+    frame["cohort"] = frame.groupby("visitor")["period"].transform("min")
+    frame["offset"] = frame["period"] - frame["cohort"]
+    frame = frame[frame["offset"] < periods].drop_duplicates(["visitor", "offset"])
+
+    active = frame.pivot_table(index="cohort", columns="offset", values="visitor", aggfunc="count", fill_value=0)
+    active = active.reindex(columns=range(periods), fill_value=0)
+    sizes = active[0].to_numpy()
+    rates = active.to_numpy() / sizes[:, None]
+
+    results = []
+    for row, cohort in enumerate(active.index):
+        cohort_start = (origin + cohort * length).astype("datetime64[ms]").astype(datetime)
+        # Offsets that are still in the future are unknown rather than zero
+        available = int((np.datetime64(datetime.utcnow()) - origin) // length) - cohort + 1
+        results.append({
+            "cohort": cohort_start,
+            "visitors": int(sizes[row]),
+            "retention": [round(float(rate), 4) for rate in rates[row][:max(1, min(periods, available))]]
+        })
+    return results
+
+
+class ReportCache:
+    """TTL cache of report results; concurrent requests for the same report share one computation"""
+
+    def __init__(self):
+        self.stats = {"hits": 0, "misses": 0}
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+
+    async def get(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self.stats["hits"] += 1
+            return entry[1]
+
+        self.stats["misses"] += 1
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._loading[key] = task
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+
+        value = await asyncio.shield(task)
+        ttl = float(os.getenv("REPORTS_CACHE_TTL", "300"))
+        self._entries[key] = (time.monotonic() + ttl, value)
+        # Expired entries are dropped lazily so the cache cannot grow without bound
+        now = time.monotonic()
+        for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            self._entries.pop(stale, None)
+        return value
+
+
+report_cache = ReportCache()
+
+
+def cache_key(report: str, **params) -> str:
+    return report + ":" + json.dumps(params, sort_keys=True, default=str)
+
+
+async def timeseries_report(start: datetime, end: datetime, granularity: str, page: Optional[str], source: str) -> dict:
+    events = await load_events(start, end, source, ["page_view"])
+    series = await asyncio.to_thread(page_view_series, events, granularity, page)
+    return {"granularity": granularity, "page": page, "series": series}
+
+
+async def funnel_report(start: datetime, end: datetime, steps: List[str], window_hours: int, source: str) -> dict:
+    event_types = sorted({step.partition(":")[0] for step in steps})
+    events = await load_events(start, end, source, event_types)
+    funnel = await asyncio.to_thread(conversion_funnel, events, steps, timedelta(hours=window_hours))
+    return {"steps": funnel, "window_hours": window_hours}
+
+
+async def services_report(start: datetime, end: datetime, source: str) -> dict:
+    contacts = await load_contacts(start, end)
+    events = await load_events(start, end, source, ["page_view"])
+    services = await asyncio.to_thread(service_conversion, contacts, events)
+    return {"converted_statuses": list(CONVERTED_STATUSES), "services": services}
+
+
+async def retention_report(start: datetime, end: datetime, period: str, periods: int, source: str) -> dict:
+    events = await load_events(start, end, source, ["page_view"])
+    cohorts = await asyncio.to_thread(cohort_retention, events, period, periods)
+    return {"period": period, "cohorts": cohorts}
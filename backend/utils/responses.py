@@ -0,0 +1,100 @@
+"""
+Pre-encoded JSON responses.
+A payload is serialized to JSON bytes once (plus gzip and, when the brotli
+package is installed, br variants) and the bytes are served as-is, skipping
+response_model validation and per-request encoding.
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    codings = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        codings[coding] = quality
+    return codings
+
+
+class EncodedBody:
+    """JSON payload serialized once, with compressed variants"""
+
+    def __init__(self, payload: Any, compress: bool = True):
+        self.raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = '"' + hashlib.sha256(self.raw).hexdigest()[:32] + '"'
+        self.variants: Dict[str, bytes] = {}
+
+        if compress and len(self.raw) >= COMPRESS_MIN_SIZE:
+            # mtime=0 keeps the gzip bytes (and so the ETag) deterministic
+            self.variants["gzip"] = gzip.compress(self.raw, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(self.raw, quality=11)
+
+    def variant_etag(self, encoding: Optional[str]) -> str:
+        """Strong ETags must differ per content-coding, so compressed variants get a suffix"""
+        if not encoding:
+            return self.etag
+        return self.etag[:-1] + "-" + encoding + '"'
+
+    def etags(self):
+        return [self.etag] + [self.variant_etag(encoding) for encoding in self.variants]
+
+    def encoding_for(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Pick the best available content-coding the client accepts"""
+        if self.variants:
+            accepted = parse_accept_encoding(accept_encoding)
+            for encoding in ("br", "gzip"):
+                quality = accepted.get(encoding, accepted.get("*", 0.0))
+                if encoding in self.variants and quality > 0:
+                    return encoding
+        return None
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """Return the body bytes and content-coding to send"""
+        encoding = self.encoding_for(accept_encoding)
+        return (self.variants[encoding] if encoding else self.raw), encoding
+
+
+class PreEncodedJSONResponse(Response):
+    """Serve an EncodedBody without re-encoding it"""
+
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        body: EncodedBody,
+        accept_encoding: Optional[str] = None,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        content, encoding = body.select(accept_encoding)
+        super().__init__(content=content, status_code=status_code, headers=headers)
+        self.headers["ETag"] = body.variant_etag(encoding)
+        if body.variants:
+            self.headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            self.headers["Content-Encoding"] = encoding
@@ -0,0 +1,171 @@
+"""
+Tiered retention for analytics.
+Raw events expire after ANALYTICS_RAW_RETENTION_DAYS through a TTL (see
+database.apply_analytics_ttl). Before a day starts to expire its rollups are
+rebuilt once from the complete raw data, so hourly and daily aggregates stay
+exact after the raw events are gone. Hourly rollups are in turn pruned after
+ANALYTICS_HOURLY_RETENTION_DAYS; daily rollups are kept indefinitely.
+With ANALYTICS_ARCHIVE_AFTER_DAYS set, raw events are moved to the Parquet
+archive instead (keep the TTL longer than that, or it wins the race).
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import logging
+import os
+from typing import Optional
+import uuid
+
+from pymongo.errors import DuplicateKeyError
+
+from database import delete_many, find_one, update_one
+from utils.rollups import ROLLUP_COLLECTION, STATE_COLLECTION, RebuildInProgress, bucket_start, oldest_intact_day, rebuild_rollups
+from utils.archive import archive_events
+
+logger = logging.getLogger(__name__)
+
+# Progress of the downsampling job, shared by every worker
+STATE_ID = "downsampling"
+LEASE_ID = "lease"
+
+
+class AnalyticsRetention:
+    """Background job that finalizes rollups for expiring days and prunes old hourly buckets"""
+
+    def __init__(self):
+        self.interval = 3600.0
+        self.hourly_retention_days = 90
+        self.archive_after_days = 0
+        self.stats = {"runs": 0, "days_finalized": 0, "days_archived": 0, "hourly_pruned": 0, "errors": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, interval: float = 3600.0, hourly_retention_days: int = 90, archive_after_days: int = 0):
+        """Start the periodic downsampling job"""
+        if self._task:
+            return
+        self.interval = max(60.0, interval)
+        self.hourly_retention_days = hourly_retention_days
+        self.archive_after_days = archive_after_days
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                # One worker per interval; concurrent archivers would write the same day twice
+                holder = await self._acquire_lease(scheduled=True)
+                if holder:
+                    try:
+                        await self.run_once()
+                    finally:
+                        await self._release_lease(holder)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Error downsampling analytics: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _acquire_lease(self, scheduled: bool) -> Optional[str]:
+        """
+        Take the lease shared by scheduled runs and on-demand archiving, returning a
+        holder token, or None when another run holds it. Scheduled runs also claim
+        the next slot, so only one worker runs per interval.
+        """
+        now = datetime.utcnow()
+        holder = uuid.uuid4().hex
+        filter_dict = {"_id": LEASE_ID, "locked_until": {"$not": {"$gt": now}}}
+        # Held until released; the expiry only frees the lease of a worker that died mid-run
+        fields = {"locked_until": now + timedelta(seconds=self.interval), "holder": holder}
+        if scheduled:
+            filter_dict["next_run_at"] = {"$not": {"$gt": now}}
+            fields["next_run_at"] = now + timedelta(seconds=self.interval)
+        try:
+            await update_one(STATE_COLLECTION, filter_dict, {"$set": fields}, upsert=True)
+        except DuplicateKeyError:
+            # The lease document exists and another worker holds it, or the next run is not due
+            return None
+        return holder
+
+    async def _release_lease(self, holder: str):
+        await update_one(STATE_COLLECTION, {"_id": LEASE_ID, "holder": holder}, {"$set": {"locked_until": datetime.utcnow()}})
+
+    async def archive_now(self, older_than_days: int) -> Optional[dict]:
+        """Archive raw events older than the given days under the job's lease; None when a run holds it"""
+        holder = await self._acquire_lease(scheduled=False)
+        if not holder:
+            return None
+        try:
+            archived = await archive_events(older_than_days)
+        finally:
+            await self._release_lease(holder)
+        self.stats["days_archived"] += archived["days"]
+        return archived
+
+    async def run_once(self) -> dict:
+        """Finalize rollups for the next day to expire, archive old raw events and prune hourly rollups"""
+        self.stats["runs"] += 1
+        finalized = await self._finalize_expiring_day()
+
+        archived = {"days": 0, "events": 0}
+        if self.archive_after_days > 0:
+            archived = await archive_events(self.archive_after_days)
+            self.stats["days_archived"] += archived["days"]
+
+        pruned = 0
+        if self.hourly_retention_days > 0:
+            cutoff = bucket_start(datetime.utcnow() - timedelta(days=self.hourly_retention_days), "day")
+            result = await delete_many(ROLLUP_COLLECTION, {"granularity": "hour", "bucket": {"$lt": cutoff}})
+            pruned = result.deleted_count
+            self.stats["hourly_pruned"] += pruned
+
+        if finalized or pruned or archived["days"]:
+            logger.info(
+                f"Analytics downsampling: finalized {finalized or 'no day'}, archived {archived['events']} events "
+                f"from {archived['days']} days, pruned {pruned} hourly rollups"
+            )
+        return {"finalized": finalized, "archived": archived, "hourly_pruned": pruned}
+
+    async def _finalize_expiring_day(self) -> Optional[datetime]:
+        day = await oldest_intact_day()
+        if day is None or day >= bucket_start(datetime.utcnow(), "day"):
+            # No retention, or the day is still being written to
+            return None
+
+        state = await find_one(STATE_COLLECTION, {"_id": STATE_ID})
+        if state and state.get("finalized_until") and state["finalized_until"] > day:
+            return None
+
+        try:
+            await rebuild_rollups(start=day, end=day)
+        except RebuildInProgress:
+            # The running rebuild may predate this day's expiry; finalize it on the next run
+            return None
+        await update_one(
+            STATE_COLLECTION,
+            {"_id": STATE_ID},
+            {"$set": {"finalized_until": day + timedelta(days=1), "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        self.stats["days_finalized"] += 1
+        return day
+
+
+analytics_retention = AnalyticsRetention()
+
+async def start_analytics_retention():
+    """Start the analytics downsampling job"""
+    await analytics_retention.start(
+        interval=float(os.getenv("ANALYTICS_RETENTION_INTERVAL", "3600")),
+        hourly_retention_days=int(os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", "90")),
+        archive_after_days=int(os.getenv("ANALYTICS_ARCHIVE_AFTER_DAYS", "0"))
+    )
+
+async def stop_analytics_retention():
+    """Stop the analytics downsampling job"""
+    await analytics_retention.stop()
@@ -0,0 +1,314 @@
+"""
+Pre-aggregated analytics counters.
+Every ingested event increments an hourly and a daily bucket for its (type, page)
+pair, so dashboard queries read a handful of counter documents instead of
+scanning raw events. Rebuilds and the one-off bootstrap hold a lease shared by
+every worker, so only one of them rewrites buckets at a time.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+from typing import List, Optional
+import uuid
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import aggregate, iter_aggregate, bulk_write, delete_many, find_one, update_one
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "analytics_rollups"
+GRANULARITIES = ("hour", "day")
+
+# Shared with the retention job; RAW_EVENTS_ID holds the archived high-water mark
+STATE_COLLECTION = "analytics_retention"
+RAW_EVENTS_ID = "raw_events"
+# Lease held by whichever worker is rebuilding, and the bootstrap's fence and done marker
+REBUILD_LEASE_ID = "rollup_rebuild"
+BOOTSTRAP_ID = "rollup_bootstrap"
+
+
+class RebuildInProgress(Exception):
+    """Raised when another worker holds the rollup rebuild lease"""
+
+# A bucket that ended at least this long ago is closed: its events have all been
+# flushed and counted by the listener, so a rebuild cannot race an increment
+SETTLE_TIME = timedelta(minutes=5)
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Truncate a timestamp to the start of its hour or day bucket"""
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def rollup_id(granularity: str, bucket: datetime, event_type: str, page: str) -> str:
+    return f"{granularity}|{bucket.isoformat()}|{event_type}|{page}"
+
+def _upsert(granularity: str, bucket: datetime, event_type: str, page: str, count: int, generation: Optional[str] = None) -> UpdateOne:
+    # A rebuild replaces the count and tags the bucket with its generation; ingestion increments it
+    update = {"$set": {"count": count, "generation": generation}} if generation else {"$inc": {"count": count}}
+    update["$setOnInsert"] = {
+        "granularity": granularity,
+        "bucket": bucket,
+        "type": event_type,
+        "page": page
+    }
+    return UpdateOne({"_id": rollup_id(granularity, bucket, event_type, page)}, update, upsert=True)
+
+async def mark_raw_removed(until: datetime):
+    """Record that raw events before `until` are being removed (archived) from MongoDB"""
+    await update_one(STATE_COLLECTION, {"_id": RAW_EVENTS_ID}, {"$max": {"removed_until": until}}, upsert=True)
+
+async def oldest_intact_day() -> Optional[datetime]:
+    """
+    First day whose raw events are all still stored, or None when nothing is removed.
+    Raw events expire after ANALYTICS_RAW_RETENTION_DAYS and are archived after
+    ANALYTICS_ARCHIVE_AFTER_DAYS, so the day the earlier cutoff falls in is
+    already partly gone. Archive runs, scheduled or on demand, also record how far
+    they have removed events.
+    """
+    horizons = [
+        int(os.getenv("ANALYTICS_RAW_RETENTION_DAYS", "0")),
+        int(os.getenv("ANALYTICS_ARCHIVE_AFTER_DAYS", "0"))
+    ]
+    horizons = [days for days in horizons if days > 0]
+    candidates = [bucket_start(datetime.utcnow() - timedelta(days=min(horizons)), "day") + timedelta(days=1)] if horizons else []
+
+    state = await find_one(STATE_COLLECTION, {"_id": RAW_EVENTS_ID})
+    if state and state.get("removed_until"):
+        candidates.append(state["removed_until"])
+    return max(candidates) if candidates else None
+
+async def apply_events(events: List[dict]):
+    """Increment rollup counters for a batch of freshly written events"""
+    counts = Counter()
+    for event in events:
+        timestamp = event.get("timestamp")
+        if not timestamp:
+            continue
+        for granularity in GRANULARITIES:
+            counts[(granularity, bucket_start(timestamp, granularity), event.get("type"), event.get("page"))] += 1
+
+    if not counts:
+        return
+
+    operations = [
+        _upsert(granularity, bucket, event_type, page, count)
+        for (granularity, bucket, event_type, page), count in counts.items()
+    ]
+    await bulk_write(ROLLUP_COLLECTION, operations, ordered=False)
+
+def closed_before(granularity: str, now: Optional[datetime] = None) -> datetime:
+    """Start of the first hour or day bucket that may still receive increments from the flush listener"""
+    return bucket_start((now or datetime.utcnow()) - SETTLE_TIME, granularity)
+
+def _hourly_pipeline(start: Optional[datetime], end: datetime) -> list:
+    match = {"$lt": end}
+    if start:
+        match["$gte"] = start
+    return [
+        {"$match": {"timestamp": match}},
+        {
+            "$group": {
+                "_id": {
+                    "type": "$type",
+                    "page": "$page",
+                    "bucket": {
+                        "$dateFromParts": {
+                            "year": {"$year": "$timestamp"},
+                            "month": {"$month": "$timestamp"},
+                            "day": {"$dayOfMonth": "$timestamp"},
+                            "hour": {"$hour": "$timestamp"}
+                        }
+                    }
+                },
+                "count": {"$sum": 1}
+            }
+        }
+    ]
+
+async def _acquire_rebuild_lease() -> Optional[str]:
+    now = datetime.utcnow()
+    holder = uuid.uuid4().hex
+    # Held until released; the expiry only frees the lease of a worker that died mid-rebuild
+    lease = float(os.getenv("ANALYTICS_REBUILD_LEASE", "3600"))
+    try:
+        await update_one(
+            STATE_COLLECTION,
+            {"_id": REBUILD_LEASE_ID, "locked_until": {"$not": {"$gt": now}}},
+            {"$set": {"locked_until": now + timedelta(seconds=lease), "holder": holder}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return None
+    return holder
+
+async def _release_rebuild_lease(holder: str):
+    await update_one(STATE_COLLECTION, {"_id": REBUILD_LEASE_ID, "holder": holder}, {"$set": {"locked_until": datetime.utcnow()}})
+
+async def rebuild_rollups(start: Optional[datetime] = None, end: Optional[datetime] = None) -> dict:
+    """
+    Recompute rollups from raw analytics events.
+    The range is widened to whole days; existing rollups in it are replaced.
+    Only closed buckets are rebuilt: the flush listener is still incrementing the
+    current hour and day, and overwriting those would lose or double count events.
+    Days whose raw events have started to expire are never rebuilt, since their
+    rollups are the only complete record left.
+    Hourly groups are streamed from the server and written in chunks, so memory
+    is bounded by the number of daily buckets rather than by history size.
+    Raises RebuildInProgress while another worker is rebuilding.
+    """
+    holder = await _acquire_rebuild_lease()
+    if not holder:
+        raise RebuildInProgress("Another worker is rebuilding the rollups")
+    try:
+        now = datetime.utcnow()
+        return await _rebuild(start, end, closed_before("hour", now), closed_before("day", now))
+    finally:
+        await _release_rebuild_lease(holder)
+
+async def _rebuild(start: Optional[datetime], end: Optional[datetime], hour_limit: datetime, day_limit: datetime) -> dict:
+    earliest = await oldest_intact_day()
+    if earliest and (start is None or start < earliest):
+        start = earliest
+    if start:
+        start = bucket_start(start, "day")
+    end = bucket_start(end, "day") + timedelta(days=1) if end else None
+
+    hour_end = min(end, hour_limit) if end else hour_limit
+    day_end = min(end, day_limit) if end else day_limit
+    if start and start >= hour_end:
+        return {"hourly": 0, "daily": 0}
+
+    # Buckets are overwritten in place, so readers see old or new counts but never
+    # an empty range; ones the rebuild did not produce are removed once it has succeeded
+    generation = uuid.uuid4().hex
+    daily = Counter()
+    operations = []
+    hourly_count = 0
+
+    async for item in iter_aggregate("analytics", _hourly_pipeline(start, hour_end), batch_size=1000, allow_disk_use=True):
+        key = item["_id"]
+        day = bucket_start(key["bucket"], "day")
+        if day < day_end:
+            daily[(day, key["type"], key["page"])] += item["count"]
+        operations.append(_upsert("hour", key["bucket"], key["type"], key["page"], item["count"], generation))
+        hourly_count += 1
+
+        if len(operations) >= 1000:
+            await bulk_write(ROLLUP_COLLECTION, operations, ordered=False)
+            operations = []
+
+    operations.extend(
+        _upsert("day", bucket, event_type, page, count, generation)
+        for (bucket, event_type, page), count in daily.items()
+    )
+
+    for i in range(0, len(operations), 1000):
+        await bulk_write(ROLLUP_COLLECTION, operations[i:i + 1000], ordered=False)
+
+    def stale(granularity: str, limit: datetime) -> dict:
+        bucket_range = {"$gte": start, "$lt": limit} if start else {"$lt": limit}
+        return {"granularity": granularity, "bucket": bucket_range, "generation": {"$ne": generation}}
+
+    await delete_many(ROLLUP_COLLECTION, stale("hour", hour_end))
+    if not start or start < day_end:
+        await delete_many(ROLLUP_COLLECTION, stale("day", day_end))
+
+    logger.info(f"Rebuilt analytics rollups: {hourly_count} hourly and {len(daily)} daily buckets")
+    return {"hourly": hourly_count, "daily": len(daily)}
+
+async def _add_open_buckets(hour_limit: datetime, day_limit: datetime, until: datetime):
+    """Increment the still-open buckets by the raw events stored before `until`"""
+    if until <= day_limit:
+        return
+    counts = Counter()
+    async for item in iter_aggregate("analytics", _hourly_pipeline(day_limit, until), batch_size=1000):
+        key = item["_id"]
+        if key["bucket"] >= hour_limit:
+            counts[("hour", key["bucket"], key["type"], key["page"])] += item["count"]
+        counts[("day", bucket_start(key["bucket"], "day"), key["type"], key["page"])] += item["count"]
+
+    operations = [
+        _upsert(granularity, bucket, event_type, page, count)
+        for (granularity, bucket, event_type, page), count in counts.items()
+    ]
+    for i in range(0, len(operations), 1000):
+        await bulk_write(ROLLUP_COLLECTION, operations[i:i + 1000], ordered=False)
+
+async def bootstrap_rollups(listening_since: datetime, retry_interval: float = 30.0):
+    """
+    Build rollups once for a deployment that has raw events but no rollups yet.
+    Every worker records when its flush listener started; events flushed after the
+    earliest of those were counted by some listener. One worker, holding the
+    rebuild lease, rebuilds the closed buckets and tops up the open ones with the
+    events stored before that fence, so nothing is counted twice. The others wait
+    until it is done, and take over if it dies.
+    """
+    try:
+        await update_one(STATE_COLLECTION, {"_id": BOOTSTRAP_ID}, {"$min": {"listening_since": listening_since}}, upsert=True)
+        while True:
+            state = await find_one(STATE_COLLECTION, {"_id": BOOTSTRAP_ID})
+            if state.get("done_at"):
+                return
+            holder = await _acquire_rebuild_lease()
+            if holder:
+                break
+            await asyncio.sleep(retry_interval)
+
+        try:
+            state = await find_one(STATE_COLLECTION, {"_id": BOOTSTRAP_ID})
+            if state.get("done_at"):
+                return
+            fence = state["listening_since"]
+            # Rollups older than the fence that no earlier bootstrap attempt wrote mean a
+            # listener was counting before it: there is nothing to build
+            existing = not state.get("started_at") and await find_one(
+                ROLLUP_COLLECTION, {"granularity": "hour", "bucket": {"$lt": bucket_start(fence, "hour")}}
+            )
+            await update_one(STATE_COLLECTION, {"_id": BOOTSTRAP_ID}, {"$set": {"started_at": datetime.utcnow()}})
+            if not existing and await find_one("analytics", {"timestamp": {"$lt": fence}}):
+                logger.info("No analytics rollups found, building them from raw events")
+                now = datetime.utcnow()
+                hour_limit, day_limit = closed_before("hour", now), closed_before("day", now)
+                await _rebuild(None, None, hour_limit, day_limit)
+                await _add_open_buckets(hour_limit, day_limit, fence)
+            await update_one(STATE_COLLECTION, {"_id": BOOTSTRAP_ID}, {"$set": {"done_at": datetime.utcnow()}})
+        finally:
+            await _release_rebuild_lease(holder)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Error bootstrapping analytics rollups: {e}")
+
+async def page_counts(start: datetime, end: datetime, event_type: str = "page_view", limit: Optional[int] = None) -> List[dict]:
+    """
+    Event counts per page for a time window, highest first.
+    The partial first day is read from hourly buckets, full days from daily ones.
+    """
+    first_full_day = bucket_start(start, "day")
+    if first_full_day < start:
+        first_full_day += timedelta(days=1)
+
+    pipeline = [
+        {
+            "$match": {
+                "type": event_type,
+                "$or": [
+                    {"granularity": "hour", "bucket": {"$gte": bucket_start(start, "hour"), "$lt": first_full_day}},
+                    {"granularity": "day", "bucket": {"$gte": first_full_day, "$lte": end}}
+                ]
+            }
+        },
+        {"$group": {"_id": "$page", "count": {"$sum": "$count"}}},
+        {"$sort": {"count": -1}}
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+
+    results = await aggregate(ROLLUP_COLLECTION, pipeline)
+    return [{"page": item["_id"], "count": item["count"]} for item in results]
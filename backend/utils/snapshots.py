@@ -0,0 +1,169 @@
+"""
+Materialized snapshots for expensive read-only responses.
+Requests are answered from the last computed snapshot; a background task keeps
+snapshots fresh and a stale read kicks off a refresh without waiting for it.
+Snapshots can also be persisted in MongoDB so every worker shares the same copy.
+"""
+
+import asyncio
+from datetime import datetime
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from database import find_one, update_one
+
+logger = logging.getLogger(__name__)
+
+SnapshotCompute = Callable[[], Awaitable[Any]]
+
+
+class Snapshot:
+    def __init__(self, data: Any, computed_at: datetime):
+        self.data = data
+        self.computed_at = computed_at
+
+    @property
+    def age(self) -> float:
+        return max(0.0, (datetime.utcnow() - self.computed_at).total_seconds())
+
+
+class SnapshotStore:
+    """Registry of named snapshots with stale-while-revalidate reads"""
+
+    def __init__(self, collection_name: str = "snapshots"):
+        self.collection_name = collection_name
+        self.max_age = 30.0
+        self.refresh_interval = 30.0
+        self.shared = False
+        self.stats: Dict[str, int] = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+        self._computes: Dict[str, SnapshotCompute] = {}
+        self._entries: Dict[str, Snapshot] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, compute: SnapshotCompute):
+        """Register the coroutine that recomputes a snapshot"""
+        self._computes[name] = compute
+
+    async def start(self, max_age: float = 30.0, refresh_interval: float = 30.0, shared: bool = False):
+        """Start the background refresh loop"""
+        self.max_age = max_age
+        self.refresh_interval = max(1.0, refresh_interval)
+        self.shared = shared
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Snapshot refresher started (interval={self.refresh_interval}s, shared={self.shared})")
+
+    async def stop(self):
+        """Stop the background refresh loop"""
+        tasks = [t for t in [self._task, *self._refreshing.values()] if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._refreshing.clear()
+
+    async def get(self, name: str) -> Tuple[Any, float]:
+        """Return (data, age in seconds), computing the snapshot only if none exists yet"""
+        entry = self._entries.get(name)
+
+        if entry is None or entry.age > self.max_age:
+            shared_entry = await self._load_shared(name)
+            if shared_entry and (entry is None or shared_entry.computed_at > entry.computed_at):
+                self._entries[name] = entry = shared_entry
+
+        if entry is None:
+            self.stats["misses"] += 1
+            await asyncio.shield(self._refresh_task(name))
+            entry = self._entries[name]
+        elif entry.age > self.max_age:
+            self.stats["stale_hits"] += 1
+            self._refresh_task(name)
+        else:
+            self.stats["hits"] += 1
+
+        return entry.data, entry.age
+
+    def _refresh_task(self, name: str) -> asyncio.Task:
+        """Start a refresh for the snapshot unless one is already running"""
+        task = self._refreshing.get(name)
+        if task is None or task.done():
+            task = asyncio.create_task(self.refresh(name))
+            task.add_done_callback(lambda t: self._log_refresh_error(name, t))
+            self._refreshing[name] = task
+        return task
+
+    @staticmethod
+    def _log_refresh_error(name: str, task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"Error refreshing snapshot '{name}': {task.exception()}")
+
+    async def refresh(self, name: str):
+        """Recompute a snapshot and publish it"""
+        try:
+            data = await self._computes[name]()
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+        snapshot = Snapshot(data, datetime.utcnow())
+        self._entries[name] = snapshot
+        self.stats["refreshes"] += 1
+
+        if self.shared:
+            try:
+                await update_one(
+                    self.collection_name,
+                    {"_id": name},
+                    {"$set": {"data": data, "computed_at": snapshot.computed_at}},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Error persisting snapshot '{name}': {e}")
+
+    async def _load_shared(self, name: str) -> Optional[Snapshot]:
+        if not self.shared:
+            return None
+        try:
+            document = await find_one(self.collection_name, {"_id": name})
+        except Exception as e:
+            logger.error(f"Error loading snapshot '{name}': {e}")
+            return None
+        if not document:
+            return None
+        return Snapshot(document["data"], document["computed_at"])
+
+    async def _run(self):
+        while True:
+            for name in list(self._computes):
+                try:
+                    # Another worker may already have published a fresh copy
+                    shared_entry = await self._load_shared(name)
+                    if shared_entry and shared_entry.age < self.refresh_interval:
+                        self._entries[name] = shared_entry
+                        continue
+
+                    await self._refresh_task(name)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    # Already logged by the refresh task; keep serving the previous snapshot
+                    continue
+
+            await asyncio.sleep(self.refresh_interval)
+
+
+snapshots = SnapshotStore()
+
+async def start_snapshots():
+    """Start refreshing registered snapshots in the background"""
+    await snapshots.start(
+        max_age=float(os.getenv("SNAPSHOT_MAX_AGE", "30")),
+        refresh_interval=float(os.getenv("SNAPSHOT_REFRESH_INTERVAL", "30")),
+        shared=os.getenv("SNAPSHOT_SHARED", "false").lower() == "true"
+    )
+
+async def stop_snapshots():
+    """Stop the snapshot refresher"""
+    await snapshots.stop()
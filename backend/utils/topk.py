@@ -0,0 +1,268 @@
+"""
+Live top-K pages and referrers.
+Each worker keeps a Space-Saving summary per day for page views by page and by
+referrer host, fed from the ingestion flush path. A summary tracks at most
+TOPK_CAPACITY items, and any item whose true count exceeds total/capacity is
+guaranteed to be in it. Summaries are checkpointed to analytics_topk under the
+worker's id every TOPK_CHECKPOINT_INTERVAL seconds; checkpoints of days older
+than TOPK_RETENTION_DAYS are pruned. Readers merge the other
+workers' checkpoints with this worker's live summary and cache the result
+briefly, so a top-K query costs a dictionary lookup almost every time.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import logging
+import os
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from pymongo import ReplaceOne
+
+from database import bulk_write, find_many, delete_many
+
+logger = logging.getLogger(__name__)
+
+TOPK_COLLECTION = "analytics_topk"
+DIRECT = "(direct)"
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters summary with a fixed number of counters"""
+
+    __slots__ = ("capacity", "counters", "total")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counters: Dict[str, List[int]] = {}  # item -> [count, overestimation]
+        self.total = 0
+
+    def add(self, item: str, count: int = 1):
+        self.total += count
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+            return
+        # Replace the smallest counter; the newcomer inherits its count as possible error
+        victim = min(self.counters, key=lambda key: self.counters[key][0])
+        floor = self.counters.pop(victim)[0]
+        self.counters[item] = [floor + count, floor]
+
+    def merge(self, items: List[dict], total: int):
+        """
+        Fold in another summary's items (as stored in a checkpoint).
+        A full summary may have evicted any item it lacks, with a count up to its
+        smallest counter, so that minimum is added to both count and error for
+        items missing on either side; merged counts stay upper bounds.
+        """
+        own_floor = self._floor(len(self.counters), (counter[0] for counter in self.counters.values()))
+        other_floor = self._floor(len(items), (item["count"] for item in items))
+        self.total += total
+
+        incoming = {item["item"] for item in items}
+        for item, counter in self.counters.items():
+            if item not in incoming:
+                counter[0] += other_floor
+                counter[1] += other_floor
+        for item in items:
+            counter = self.counters.get(item["item"])
+            if counter is None:
+                counter = self.counters[item["item"]] = [own_floor, own_floor]
+            counter[0] += item["count"]
+            counter[1] += item["error"]
+
+    def _floor(self, size: int, counts) -> int:
+        # Only a full summary can have dropped items
+        return min(counts, default=0) if size >= self.capacity else 0
+
+    def top(self, k: int) -> List[dict]:
+        ranked = sorted(self.counters.items(), key=lambda pair: pair[1][0], reverse=True)[:k]
+        return [{"item": item, "count": count, "error": error} for item, (count, error) in ranked]
+
+    def items(self) -> List[dict]:
+        return self.top(len(self.counters))
+
+
+def referrer_host(referrer: Optional[str]) -> str:
+    """Normalize a referrer URL to its host"""
+    if not referrer:
+        return DIRECT
+    host = urlparse(referrer).netloc.lower()
+    return host[4:] if host.startswith("www.") else host or DIRECT
+
+
+class TopKTracker:
+    """Per-day Space-Saving summaries for this worker, checkpointed and merged across workers"""
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.capacity = 200
+        self.checkpoint_interval = 30.0
+        self.cache_ttl = 10.0
+        self.retention_days = 365
+        self._pruned_before: Optional[datetime] = None
+        self._summaries: Dict[Tuple[datetime, str], SpaceSaving] = {}
+        self._dirty = set()
+        self._cache: Dict[Tuple, Tuple[float, List[dict]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _summary(self, day: datetime, dimension: str) -> SpaceSaving:
+        summary = self._summaries.get((day, dimension))
+        if summary is None:
+            summary = self._summaries[(day, dimension)] = SpaceSaving(self.capacity)
+        return summary
+
+    async def apply_events(self, events: List[dict]):
+        """Count a batch of freshly written page views"""
+        for event in events:
+            timestamp = event.get("timestamp")
+            if event.get("type") != "page_view" or not timestamp:
+                continue
+            day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+            self._summary(day, "pages").add(event.get("page"))
+            self._summary(day, "referrers").add(referrer_host((event.get("metadata") or {}).get("referrer")))
+            self._dirty.add((day, "pages"))
+            self._dirty.add((day, "referrers"))
+
+    async def start(
+        self,
+        capacity: int = 200,
+        checkpoint_interval: float = 30.0,
+        cache_ttl: float = 10.0,
+        worker_id: Optional[str] = None,
+        retention_days: int = 365
+    ):
+        """Start periodic checkpointing"""
+        if self._task:
+            return
+        self.capacity = capacity
+        self.checkpoint_interval = max(1.0, checkpoint_interval)
+        self.cache_ttl = cache_ttl
+        self.retention_days = retention_days
+        if worker_id:
+            self.worker_id = worker_id
+        # Even the default host-pid id repeats across container restarts (pid 1)
+        await self._restore()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop checkpointing, writing a final checkpoint first"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                logger.error(f"Error writing final top-K checkpoint: {e}")
+
+    async def _restore(self):
+        # A worker whose id was used before picks its checkpoints back up instead of overwriting them
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        for document in await find_many(TOPK_COLLECTION, {"worker": self.worker_id, "day": today}):
+            summary = self._summary(document["day"], document["dimension"])
+            summary.merge(document["items"], document["total"])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.checkpoint()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error checkpointing top-K summaries: {e}")
+
+    async def checkpoint(self):
+        """Persist changed summaries and forget days that can no longer change"""
+        dirty, self._dirty = self._dirty, set()
+        operations = [
+            ReplaceOne(
+                {"_id": f"{day.date().isoformat()}|{dimension}|{self.worker_id}"},
+                {
+                    "day": day,
+                    "dimension": dimension,
+                    "worker": self.worker_id,
+                    "total": self._summaries[(day, dimension)].total,
+                    "items": self._summaries[(day, dimension)].items(),
+                    "updated_at": datetime.utcnow()
+                },
+                upsert=True
+            )
+            for day, dimension in dirty
+        ]
+        if operations:
+            try:
+                await bulk_write(TOPK_COLLECTION, operations, ordered=False)
+            except Exception:
+                self._dirty |= dirty
+                raise
+
+        # Events are stamped at ingestion, so only today's summaries still change;
+        # yesterday's is kept a day longer for batches flushed across midnight
+        keep_from = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        for key in [key for key in self._summaries if key[0] < keep_from and key not in self._dirty]:
+            del self._summaries[key]
+
+        await self._prune()
+
+    async def _prune(self):
+        # Every restart without a stable WORKER_ID checkpoints under a new id, so old
+        # days collect documents from workers long gone; drop days past the window once a day
+        if self.retention_days <= 0:
+            return
+        cutoff = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=self.retention_days)
+        if self._pruned_before == cutoff:
+            return
+        result = await delete_many(TOPK_COLLECTION, {"day": {"$lt": cutoff}})
+        self._pruned_before = cutoff
+        if result.deleted_count:
+            logger.info(f"Pruned {result.deleted_count} top-K checkpoints before {cutoff:%Y-%m-%d}")
+
+    async def top(self, dimension: str, start: datetime, end: datetime, k: int = 10) -> List[dict]:
+        """Top-K items for the days overlapping [start, end] across all workers"""
+        first_day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        cache_key = (dimension, first_day, end.replace(minute=0, second=0, microsecond=0), k)
+        cached = self._cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        merged = SpaceSaving(self.capacity)
+        documents = await find_many(TOPK_COLLECTION, {"dimension": dimension, "day": {"$gte": first_day, "$lte": end}})
+        for document in documents:
+            # This worker's recent days come from memory, which is fresher than its checkpoint
+            if document["worker"] == self.worker_id and (document["day"], dimension) in self._summaries:
+                continue
+            merged.merge(document["items"], document["total"])
+        for (day, summary_dimension), summary in self._summaries.items():
+            if summary_dimension == dimension and first_day <= day <= end:
+                merged.merge(summary.items(), summary.total)
+
+        result = merged.top(k)
+        self._cache[cache_key] = (time.monotonic() + self.cache_ttl, result)
+        if len(self._cache) > 64:
+            now = time.monotonic()
+            self._cache = {key: value for key, value in self._cache.items() if value[0] > now}
+        return result
+
+
+topk = TopKTracker()
+
+async def start_topk():
+    """Start checkpointing live top-K summaries"""
+    await topk.start(
+        capacity=int(os.getenv("TOPK_CAPACITY", "200")),
+        checkpoint_interval=float(os.getenv("TOPK_CHECKPOINT_INTERVAL", "30")),
+        cache_ttl=float(os.getenv("TOPK_CACHE_TTL", "10")),
+        worker_id=os.getenv("WORKER_ID"),
+        retention_days=int(os.getenv("TOPK_RETENTION_DAYS", "365"))
+    )
+
+async def stop_topk():
+    """Write a final top-K checkpoint and stop"""
+    await topk.stop()
@@ -120,19 +120,61 @@ export const useContactForm = () => {
 };
 
 // Analytics tracking
-export const trackEvent = async (eventType, page, metadata = {}) => {
+// Events are queued and sent in batches to /analytics/events. The queue is
+// flushed when it fills up, after a short delay, and when the page is hidden.
+const ANALYTICS_BATCH_SIZE = 20;
+const ANALYTICS_FLUSH_DELAY = 5000;
+
+let analyticsQueue = [];
+let analyticsTimer = null;
+
+const flushAnalytics = async ({ beacon = false } = {}) => {
+  if (analyticsTimer) {
+    clearTimeout(analyticsTimer);
+    analyticsTimer = null;
+  }
+  if (analyticsQueue.length === 0) return;
+
+  const events = analyticsQueue;
+  analyticsQueue = [];
+
+  // text/plain keeps sendBeacon a simple CORS request (no preflight)
+  if (beacon && navigator.sendBeacon) {
+    const body = new Blob([JSON.stringify(events)], { type: 'text/plain' });
+    if (navigator.sendBeacon(`${API}/analytics/events`, body)) return;
+  }
+
   try {
-    await api.post('/analytics/page-view', {
-      type: eventType,
-      page: page,
-      metadata: metadata
-    });
+    await api.post('/analytics/events', events);
   } catch (err) {
     // Don't throw error for analytics failures
     console.warn('Analytics tracking failed:', err);
   }
 };
 
+if (typeof document !== 'undefined') {
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushAnalytics({ beacon: true });
+  });
+  window.addEventListener('pagehide', () => flushAnalytics({ beacon: true }));
+}
+
+export const trackEvent = async (eventType, page, metadata = {}) => {
+  analyticsQueue.push({
+    type: eventType,
+    page: page,
+    metadata: metadata,
+    // Events wait in the queue for up to ANALYTICS_FLUSH_DELAY; the server keeps this time
+    timestamp: new Date().toISOString()
+  });
+
+  if (analyticsQueue.length >= ANALYTICS_BATCH_SIZE) {
+    await flushAnalytics();
+  } else if (!analyticsTimer) {
+    analyticsTimer = setTimeout(() => flushAnalytics(), ANALYTICS_FLUSH_DELAY);
+  }
+};
+
 // Track page views
 export const usePageTracking = () => {
   useEffect(() => {
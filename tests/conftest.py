@@ -0,0 +1,31 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+
+# A test dependency (backend/requirements.txt): fail at collection rather than skip everything
+import mongomock_motor  # noqa: E402
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def mongo():
+    """A fresh in-memory database behind the database helpers"""
+    previous = (database.db.client, database.db.database)
+    database.db.client = mongomock_motor.AsyncMongoMockClient()
+    database.db.database = database.db.client[os.environ["DB_NAME"]]
+    yield database.db.database
+    database.db.client, database.db.database = previous
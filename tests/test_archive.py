@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import pyarrow.parquet as pq
+import pytest
+
+from utils import archive
+from utils.archive import PART_NAME, archive_day, archive_events, iter_archive, read_archive
+from utils.rollups import RAW_EVENTS_ID, STATE_COLLECTION
+
+pytestmark = pytest.mark.anyio
+
+DAY = datetime(2026, 9, 1)
+
+
+@pytest.fixture(autouse=True)
+def archive_root(tmp_path, monkeypatch):
+    monkeypatch.setenv("ANALYTICS_ARCHIVE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def events(count, day=DAY, pages=("/c", "/a", "/b")):
+    return [
+        {
+            "_id": f"{day:%m%d}-{index:04d}", "type": "page_view", "page": pages[index % len(pages)],
+            "timestamp": day + timedelta(minutes=index), "metadata": {"n": index}
+        }
+        for index in range(count)
+    ]
+
+
+async def test_archive_moves_a_day_out_of_mongo(mongo, archive_root):
+    await mongo.analytics.insert_many(events(30) + events(2, DAY + timedelta(days=1)))
+
+    assert await archive_day(DAY) == 30
+
+    assert await mongo.analytics.count_documents({}) == 2
+    assert (await mongo[STATE_COLLECTION].find_one({"_id": RAW_EVENTS_ID}))["removed_until"] == DAY + timedelta(days=1)
+    assert [path.name for path in (archive_root / "date=2026-09-01").iterdir()] == [PART_NAME]
+
+    rows = [row async for row in iter_archive(page="/a")]
+    assert len(rows) == 10
+    assert rows[0]["metadata"] == {"n": 1}
+
+
+async def test_row_groups_cover_disjoint_page_ranges(mongo, archive_root, monkeypatch):
+    monkeypatch.setattr(archive, "ROW_GROUP_SIZE", 10)
+    await mongo.analytics.insert_many(events(30))
+
+    await archive_day(DAY)
+
+    metadata = pq.ParquetFile(archive_root / "date=2026-09-01" / PART_NAME).metadata
+    page_column = archive.ARCHIVE_SCHEMA.names.index("page")
+    ranges = [
+        (metadata.row_group(index).column(page_column).statistics.min, metadata.row_group(index).column(page_column).statistics.max)
+        for index in range(metadata.num_row_groups)
+    ]
+    assert ranges == [("/a", "/a"), ("/b", "/b"), ("/c", "/c")]
+
+
+async def test_rerun_after_a_crash_before_delete_does_not_duplicate(mongo, monkeypatch):
+    await mongo.analytics.insert_many(events(12))
+    delete_many = archive.delete_many
+
+    async def crash(*args):
+        raise RuntimeError("killed")
+
+    monkeypatch.setattr(archive, "delete_many", crash)
+    with pytest.raises(RuntimeError):
+        await archive_day(DAY)
+    monkeypatch.setattr(archive, "delete_many", delete_many)
+    await archive_day(DAY)
+
+    frame = await read_archive()
+    assert len(frame) == 12
+    assert frame["id"].is_unique
+
+
+async def test_rerun_after_a_partial_delete_keeps_archived_events(mongo):
+    await mongo.analytics.insert_many(events(12))
+    await archive_day(DAY)
+    # As if a crash left part of the day in MongoDB
+    await mongo.analytics.insert_many(events(12)[:5])
+
+    await archive_day(DAY)
+
+    frame = await read_archive(start=DAY, end=DAY + timedelta(days=1))
+    assert sorted(frame["id"]) == sorted(event["_id"] for event in events(12))
+    assert await mongo.analytics.count_documents({}) == 0
+
+
+async def test_archive_events_only_takes_whole_old_days(mongo):
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    await mongo.analytics.insert_many(events(3, today - timedelta(days=5)) + events(2, today - timedelta(days=1)))
+
+    assert await archive_events(older_than_days=3) == {"days": 1, "events": 3}
+    assert await mongo.analytics.count_documents({}) == 2
+
+
+async def test_read_archive_is_empty_without_an_archive(mongo, archive_root, monkeypatch):
+    monkeypatch.setenv("ANALYTICS_ARCHIVE_DIR", str(archive_root / "missing"))
+
+    assert (await read_archive()).empty
+    assert [row async for row in iter_archive()] == []
@@ -0,0 +1,75 @@
+from pathlib import Path
+import sys
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import ASGITransport, AsyncClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "benchmarks"))
+
+from common import LatencyRecorder, percentile  # noqa: E402
+from load import compare, run_scenario  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+
+def test_percentile_is_nearest_rank():
+    ordered = [float(value) for value in range(1, 101)]
+
+    assert percentile(ordered, 50) == 50.0
+    assert percentile(ordered, 95) == 95.0
+    assert percentile(ordered, 100) == 100.0
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+@pytest.fixture
+async def client():
+    app = FastAPI()
+
+    @app.get("/ok")
+    async def ok():
+        return {}
+
+    @app.get("/fail")
+    async def fail():
+        raise HTTPException(status_code=503)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_recorder_counts_server_errors(client):
+    recorder = LatencyRecorder()
+    for path in ("/ok", "/ok", "/fail", "/missing"):
+        await recorder.request(client, path, "GET", path)
+
+    summary = recorder.summary(elapsed=2.0)
+
+    assert summary["total"]["requests"] == 4
+    assert summary["total"]["errors"] == 1
+    assert summary["total"]["throughput"] == 2.0
+    assert summary["endpoints"]["/fail"]["statuses"] == {"503": 1}
+    assert summary["endpoints"]["/missing"]["errors"] == 0
+
+
+async def test_run_scenario_sends_warmup_and_measured_requests(client):
+    steps = [(3, "ok", lambda rng, i: ("GET", "/ok", {})), (1, "fail", lambda rng, i: ("GET", "/fail", {}))]
+
+    summary = await run_scenario(client, steps, requests=40, concurrency=4, warmup=5, seed=1)
+
+    assert summary["total"]["requests"] == 40
+    assert set(summary["endpoints"]) == {"ok", "fail"}
+    assert summary["total"]["errors"] == summary["endpoints"]["fail"]["requests"]
+
+
+def result(p95, throughput):
+    stats = {"p95_ms": p95, "throughput": throughput}
+    return {"total": stats, "endpoints": {"GET /": stats}}
+
+
+def test_compare_flags_latency_and_throughput_regressions():
+    baseline = {"meta": {"started_at": "then"}, "scenarios": {"a": result(10.0, 100.0), "b": result(10.0, 100.0)}}
+    current = {"scenarios": {"a": result(10.5, 98.0), "b": result(14.0, 100.0), "new": result(1.0, 1.0)}}
+
+    assert compare(current, baseline, threshold=10) == ["b / GET /", "b / all"]
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from routes.content import router as content_router
+from utils.content_cache import ContentCache, content_cache, etag_matches
+
+pytestmark = pytest.mark.anyio
+
+
+def counting_loader(payload):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {**payload, "load": len(calls)}
+
+    return load, calls
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = ContentCache()
+    load, calls = counting_loader({"items": []})
+
+    entries = await asyncio.gather(*(cache.get("services", load) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert len({entry.body.etag for entry in entries}) == 1
+    await cache.get("services", load)
+    assert cache.stats["hits"] == 1
+
+
+async def test_bump_invalidates_the_cached_entry():
+    cache = ContentCache()
+    load, calls = counting_loader({"items": []})
+    first = await cache.get("services", load)
+
+    cache.bump("services")
+    second = await cache.get("services", load)
+
+    assert len(calls) == 2
+    assert first.body.etag != second.body.etag
+
+
+async def test_load_racing_an_invalidation_is_not_published():
+    cache = ContentCache()
+    load, calls = counting_loader({"items": []})
+
+    loading = asyncio.create_task(cache.get("services", load))
+    await asyncio.sleep(0)
+    cache.bump("services")
+    await loading
+    await cache.get("services", load)
+
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc-gzip"', True),
+    ('"other"', False),
+    ("*", True),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, ['"abc"', '"abc-gzip"']) is matches
+
+
+@pytest.fixture
+async def client(mongo):
+    for collection in ("services", "products", "projects"):
+        content_cache.bump(collection)
+    app = FastAPI()
+    app.include_router(content_router)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_revalidation_returns_304_without_a_body(client):
+    response = await client.get("/api/services")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.json()["total"] == len(response.json()["services"])
+
+    revalidated = await client.get("/api/services", headers={"if-none-match": etag})
+
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["etag"] == etag
+
+
+async def test_content_change_changes_the_etag(client, mongo):
+    etag = (await client.get("/api/products")).headers["etag"]
+
+    await mongo.products.insert_one({
+        "_id": "p1", "icon": "Box", "title": "New product", "subtitle": "Sub",
+        "description": "Described", "features": [], "color": "from-a to-b", "is_active": True, "order": 1
+    })
+    content_cache.bump("products")
+    response = await client.get("/api/products", headers={"if-none-match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
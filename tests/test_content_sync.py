@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from utils import content_sync
+from utils.content_cache import content_cache
+from utils.content_sync import CONTENT_COLLECTIONS, ContentWatcher, content_fingerprint
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeStream:
+    def __init__(self, changes):
+        self.changes = changes
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.changes:
+            await asyncio.Event().wait()
+        self.resume_token = {"_data": len(self.changes)}
+        return self.changes.pop(0)
+
+
+async def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+async def test_each_content_collection_gets_its_own_stream(monkeypatch):
+    opened = []
+
+    def fake_watch(collection, pipeline=None, **kwargs):
+        opened.append(collection)
+        return FakeStream([{"_id": 1}] if collection == "products" else [])
+
+    monkeypatch.setattr(content_sync, "watch", fake_watch)
+    versions = {collection: content_cache.version(collection) for collection in CONTENT_COLLECTIONS}
+
+    watcher = ContentWatcher()
+    await watcher.start(mode="changestream")
+    await wait_for(lambda: content_cache.version("products") != versions["products"])
+    await watcher.stop()
+
+    assert sorted(opened) == sorted(CONTENT_COLLECTIONS)
+    assert watcher.mode == "changestream"
+    assert content_cache.version("services") == versions["services"]
+    assert content_cache.version("projects") == versions["projects"]
+
+
+async def test_falls_back_to_polling_without_change_streams(monkeypatch, mongo):
+    def fake_watch(collection, pipeline=None, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets")
+
+    monkeypatch.setattr(content_sync, "watch", fake_watch)
+    watcher = ContentWatcher()
+    await watcher.start(mode="auto", poll_interval=0.5)
+    await wait_for(lambda: len(watcher._fingerprints) == len(CONTENT_COLLECTIONS))
+
+    version = content_cache.version("services")
+    await mongo.services.insert_one({"_id": "s1", "updated_at": datetime(2024, 1, 1)})
+    await wait_for(lambda: content_cache.version("services") != version)
+    await watcher.stop()
+
+    assert watcher.mode == "poll"
+
+
+async def test_fingerprint_tracks_count_and_latest_update(mongo):
+    assert await content_fingerprint("projects") == (0, None)
+
+    await mongo.projects.insert_many([
+        {"_id": "a", "updated_at": datetime(2024, 1, 1)},
+        {"_id": "b", "updated_at": datetime(2024, 3, 1)},
+    ])
+
+    assert await content_fingerprint("projects") == (2, datetime(2024, 3, 1))
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from routes import contacts
+from routes.contacts import router as contacts_router
+from utils import counters
+from utils.counters import (
+    COUNTER_COLLECTION, contact_total, read_counters, reconcile_counters, record_contact_created, record_status_change
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def contact(index, service="Web", status="new", month=9):
+    return {"_id": f"c{index}", "service": service, "status": status, "created_at": datetime(2026, month, 1 + index)}
+
+
+async def test_create_and_status_change_move_counters(mongo):
+    await record_contact_created(contact(1))
+    await record_contact_created(contact(2, service="Apps", month=10))
+    await record_status_change("new", "closed")
+    await record_status_change("closed", "closed")
+
+    assert await read_counters() == {
+        "total": {None: 2},
+        "service": {"Web": 1, "Apps": 1},
+        "month": {"2026-09": 1, "2026-10": 1},
+        "status": {"new": 1, "closed": 1},
+    }
+    assert await contact_total() == 2
+    assert await contact_total("closed") == 1
+    assert await contact_total("qualified") == 0
+
+
+async def test_reconcile_repairs_drift_and_removes_stale_counters(mongo):
+    await mongo.contacts.insert_many([contact(1), contact(2, status="closed")])
+    await record_contact_created(contact(1))
+    await record_contact_created(contact(3, service="Gone"))
+
+    result = await reconcile_counters()
+
+    assert result["removed"] == 1
+    assert await read_counters() == {
+        "total": {None: 2},
+        "service": {"Web": 2},
+        "month": {"2026-09": 2},
+        "status": {"new": 1, "closed": 1},
+    }
+    assert (await reconcile_counters())["corrected"] == 0
+
+
+async def test_reconcile_skips_counters_that_move_while_counting(mongo, monkeypatch):
+    await mongo.contacts.insert_many([contact(1), contact(2)])
+    await record_contact_created(contact(1))
+    count_documents = counters.count_documents
+
+    async def racing_count(*args):
+        # A new submission is counted while the contacts are being counted
+        await record_contact_created(contact(3))
+        return await count_documents(*args)
+
+    monkeypatch.setattr(counters, "count_documents", racing_count)
+    result = await reconcile_counters()
+
+    assert result["skipped"] >= 1
+    assert await contact_total() == 2
+
+
+@pytest.fixture
+async def client(mongo):
+    app = FastAPI()
+    app.include_router(contacts_router)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_status_update_succeeds_when_counting_fails(mongo, client, monkeypatch):
+    await mongo.contacts.insert_one(contact(1))
+
+    async def failing_change(*args):
+        raise RuntimeError("counters unavailable")
+
+    monkeypatch.setattr(contacts, "record_status_change", failing_change)
+    response = await client.patch("/api/contacts/c1/status", params={"status": "closed"})
+
+    assert response.status_code == 200
+    assert (await mongo.contacts.find_one({"_id": "c1"}))["status"] == "closed"
+
+
+async def test_status_update_moves_the_status_counters(mongo, client):
+    await mongo.contacts.insert_one(contact(1))
+    await record_contact_created(contact(1))
+
+    await client.patch("/api/contacts/c1/status", params={"status": "qualified"})
+    repeated = await client.patch("/api/contacts/c1/status", params={"status": "qualified"})
+    missing = await client.patch("/api/contacts/nope/status", params={"status": "qualified"})
+
+    assert repeated.status_code == 200
+    assert missing.status_code == 404
+    assert (await read_counters())["status"] == {"new": 0, "qualified": 1}
+    assert await mongo[COUNTER_COLLECTION].count_documents({}) == 5
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import digest
+from utils.digest import (
+    DIGEST_COLLECTION, EXCERPT_LENGTH, DigestSettings, build_admin_digest, deliver_admin_digest, queue_digest_item,
+    should_digest, window_start
+)
+from utils.outbox import OUTBOX_COLLECTION
+
+pytestmark = pytest.mark.anyio
+
+
+class FakePool:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, sender, messages, on_sent=None):
+        self.sent.extend(messages)
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    monkeypatch.setenv("ADMIN_DIGEST_MODE", "auto")
+    monkeypatch.setenv("ADMIN_DIGEST_WINDOW", "600")
+    monkeypatch.setenv("ADMIN_DIGEST_THRESHOLD", "2")
+    monkeypatch.setenv("SMTP_USER", "site@example.com")
+    monkeypatch.setenv("SMTP_PASS", "secret")
+    return DigestSettings()
+
+
+def contact(index, service="Web Development"):
+    return {
+        "id": f"c{index}", "name": f"Name {index}", "email": f"c{index}@example.com", "service": service,
+        "message": "Hello", "created_at": datetime.utcnow() + timedelta(seconds=index)
+    }
+
+
+def test_window_start_aligns_to_the_window():
+    assert window_start(datetime(2026, 10, 1, 12, 14, 59), 600) == datetime(2026, 10, 1, 12, 10)
+    assert window_start(datetime(2026, 10, 1, 12, 10), 600) == datetime(2026, 10, 1, 12, 10)
+
+
+def test_unknown_mode_falls_back_to_off(monkeypatch):
+    monkeypatch.setenv("ADMIN_DIGEST_MODE", "sometimes")
+    monkeypatch.setenv("ADMIN_DIGEST_WINDOW", "5")
+
+    settings = DigestSettings()
+
+    assert settings.mode == "off"
+    assert settings.window == 60
+
+
+async def test_auto_mode_digests_once_over_the_threshold(mongo, settings):
+    await mongo.contacts.insert_many([{"_id": str(index), "created_at": datetime.utcnow()} for index in range(2)])
+    assert await should_digest(settings) is False
+
+    await mongo.contacts.insert_one({"_id": "2", "created_at": datetime.utcnow()})
+    assert await should_digest(settings) is True
+
+
+async def test_one_digest_is_queued_per_window(mongo, settings):
+    for index in range(3):
+        await queue_digest_item(contact(index), settings)
+
+    messages = await mongo[OUTBOX_COLLECTION].find({"kind": "admin_digest"}).to_list(None)
+    assert len(messages) == 1
+    assert messages[0]["next_attempt_at"] == messages[0]["payload"]["window_end"] + timedelta(seconds=digest.DIGEST_GRACE)
+    assert await mongo[DIGEST_COLLECTION].count_documents({"digested": False}) == 3
+
+
+async def test_digest_includes_stragglers_and_marks_items_digested(mongo, settings, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(digest, "mail_pool", pool)
+    window = window_start(datetime.utcnow(), settings.window)
+    await mongo[DIGEST_COLLECTION].insert_many([
+        {"_id": "old", "window": window - timedelta(seconds=600), "digested": False, "contact": contact(0)},
+        {"_id": "now", "window": window, "digested": False, "contact": contact(1)},
+        {"_id": "next", "window": window + timedelta(seconds=600), "digested": False, "contact": contact(2)},
+    ])
+
+    await deliver_admin_digest({"window": window, "window_end": window + timedelta(seconds=600)})
+
+    (recipient, message), = pool.sent
+    assert message["Subject"].startswith("2 New Contact Form Submissions")
+    assert await mongo[DIGEST_COLLECTION].distinct("_id", {"digested": False}) == ["next"]
+
+    await deliver_admin_digest({"window": window, "window_end": window + timedelta(seconds=600)})
+    assert len(pool.sent) == 1
+
+
+def test_digest_summarises_services_and_truncates_messages():
+    long_message = "x" * (EXCERPT_LENGTH + 50)
+    items = [
+        {"contact": {**contact(0), "message": long_message}},
+        {"contact": contact(1)},
+        {"contact": contact(2, "Mobile Apps")},
+    ]
+
+    message = build_admin_digest(items, datetime(2026, 10, 1, 12), datetime(2026, 10, 1, 12, 10), "site@example.com", "admin@example.com")
+    body = message.get_payload()[0].get_payload()
+
+    assert "- Web Development: 2\n- Mobile Apps: 1" in body
+    assert "x" * EXCERPT_LENGTH + "..." in body
+    assert long_message not in body
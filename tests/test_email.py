@@ -0,0 +1,80 @@
+import smtplib
+
+import pytest
+
+from utils import email
+from utils.email import contact_emails_key, deliver_contact_emails
+from utils.outbox import OUTBOX_COLLECTION, outbox
+
+pytestmark = pytest.mark.anyio
+
+CONTACT = {"id": "c1", "name": "Ana", "email": "ana@example.com", "service": "Web Development"}
+
+
+class FakePool:
+    def __init__(self, fail_on=None):
+        self.sent = []
+        self.fail_on = fail_on
+
+    async def send(self, sender, messages, on_sent=None):
+        for index, (recipient, message) in enumerate(messages):
+            if recipient == self.fail_on:
+                raise smtplib.SMTPServerDisconnected("connection lost")
+            self.sent.append(recipient)
+            if on_sent:
+                await on_sent(index)
+
+
+@pytest.fixture(autouse=True)
+def smtp_settings(monkeypatch):
+    monkeypatch.setenv("SMTP_USER", "site@example.com")
+    monkeypatch.setenv("SMTP_PASS", "secret")
+    monkeypatch.setenv("ADMIN_EMAIL", "admin@example.com")
+
+
+async def queued_payload(mongo):
+    await outbox.enqueue([{
+        "key": contact_emails_key(CONTACT["id"]),
+        "kind": "contact_emails",
+        "payload": {"contact": CONTACT, "notify_admin": True}
+    }])
+    return (await mongo[OUTBOX_COLLECTION].find_one({"_id": contact_emails_key(CONTACT["id"])}))["payload"]
+
+
+async def test_sends_notification_and_auto_reply(mongo, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(email, "mail_pool", pool)
+
+    await deliver_contact_emails(await queued_payload(mongo))
+
+    assert pool.sent == ["admin@example.com", "ana@example.com"]
+
+
+async def test_retry_after_partial_failure_does_not_resend_the_notification(mongo, monkeypatch):
+    monkeypatch.setattr(email, "mail_pool", FakePool(fail_on="ana@example.com"))
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        await deliver_contact_emails(await queued_payload(mongo))
+
+    retry = FakePool()
+    monkeypatch.setattr(email, "mail_pool", retry)
+    document = await mongo[OUTBOX_COLLECTION].find_one({"_id": contact_emails_key(CONTACT["id"])})
+    await deliver_contact_emails(document["payload"])
+
+    assert document["payload"]["completed"] == ["notification"]
+    assert retry.sent == ["ana@example.com"]
+
+
+async def test_digested_submissions_only_get_the_auto_reply(mongo, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(email, "mail_pool", pool)
+
+    await deliver_contact_emails({"contact": CONTACT, "notify_admin": False})
+
+    assert pool.sent == ["ana@example.com"]
+
+
+async def test_unconfigured_smtp_skips_delivery(monkeypatch):
+    monkeypatch.delenv("SMTP_PASS")
+
+    with pytest.raises(email.DeliverySkipped):
+        await deliver_contact_emails({"contact": CONTACT, "notify_admin": True})
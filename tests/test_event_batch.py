@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+import json
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from routes.analytics import _event_time, router as analytics_router
+
+pytestmark = pytest.mark.anyio
+
+EVENT = {"type": "page_view", "page": "/"}
+
+
+@pytest.fixture
+async def client(mongo):
+    app = FastAPI()
+    app.include_router(analytics_router)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def post(client, body, content_type="application/json"):
+    return await client.post("/api/analytics/events", content=body, headers={"content-type": content_type})
+
+
+@pytest.mark.parametrize("body, accepted", [
+    (json.dumps([EVENT, EVENT]), 2),
+    (json.dumps(EVENT), 1),
+    (json.dumps({"events": [EVENT, EVENT, EVENT]}), 3),
+    # Pretty-printed JSON spans lines but is still one document
+    (json.dumps([EVENT], indent=2), 1),
+    (json.dumps(EVENT, indent=2), 1),
+    # A sequence of objects without an NDJSON content type
+    (json.dumps(EVENT) + "\n" + json.dumps(EVENT) + "\n", 2),
+    ("", 0),
+])
+async def test_json_bodies(client, mongo, body, accepted):
+    response = await post(client, body, "text/plain")
+
+    assert response.status_code == 200
+    assert response.json()["accepted"] == accepted
+    assert await mongo.analytics.count_documents({}) == accepted
+
+
+async def test_ndjson_content_type(client, mongo):
+    body = "\n".join(json.dumps({**EVENT, "page": f"/{i}"}) for i in range(4))
+    response = await post(client, body, "application/x-ndjson")
+
+    assert response.json()["accepted"] == 4
+    assert sorted(await mongo.analytics.distinct("page")) == ["/0", "/1", "/2", "/3"]
+
+
+@pytest.mark.parametrize("body", ["null", "42", "\"text\"", "{not json", "[1, 2", json.dumps(EVENT) + "\n{broken"])
+async def test_invalid_bodies_are_rejected(client, mongo, body):
+    response = await post(client, body)
+
+    assert response.status_code == 400
+    assert await mongo.analytics.count_documents({}) == 0
+
+
+async def test_invalid_entries_are_dropped_from_a_batch(client, mongo):
+    response = await post(client, json.dumps([EVENT, {"page": "/missing-type"}, EVENT]))
+
+    assert response.json() == {"success": True, "accepted": 2, "rejected": 1}
+
+
+async def test_oversized_batch_is_rejected(client, monkeypatch):
+    monkeypatch.setenv("ANALYTICS_MAX_BATCH_EVENTS", "2")
+    response = await post(client, json.dumps([EVENT] * 3))
+
+    assert response.status_code == 413
+
+
+async def test_client_timestamp_is_kept_within_skew(client, mongo):
+    sent = datetime.utcnow() - timedelta(seconds=5)
+    await post(client, json.dumps([{**EVENT, "timestamp": sent.isoformat() + "Z"}]))
+
+    stored = await mongo.analytics.find_one({})
+    assert abs(stored["timestamp"] - sent) < timedelta(milliseconds=1)
+
+
+@pytest.mark.parametrize("offset", [timedelta(hours=-2), timedelta(hours=3)])
+async def test_client_timestamp_outside_skew_is_replaced(client, mongo, offset):
+    before = datetime.utcnow()
+    await post(client, json.dumps([{**EVENT, "timestamp": (before + offset).isoformat()}]))
+
+    stored = await mongo.analytics.find_one({})
+    # BSON dates keep milliseconds
+    assert before - timedelta(milliseconds=1) < stored["timestamp"] <= datetime.utcnow()
+
+
+def test_event_time_is_never_in_the_future_or_before_the_listener():
+    now = datetime(2026, 10, 1, 12)
+    skew = timedelta(seconds=60)
+    aware = datetime(2026, 10, 1, 19, 59, 50, tzinfo=timezone(timedelta(hours=8)))
+
+    assert _event_time(aware, now, skew) == datetime(2026, 10, 1, 11, 59, 50)
+    assert _event_time(now + timedelta(seconds=30), now, skew) == now
+    assert _event_time(now - timedelta(seconds=30), now, skew, floor=now - timedelta(seconds=10)) == now - timedelta(seconds=10)
+    assert _event_time(None, now, skew) == now
@@ -0,0 +1,93 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from routes.contacts import router as contacts_router
+from utils import export
+from utils.export import _csv_value, csv_chunks, gzip_chunks, ndjson_chunks
+
+pytestmark = pytest.mark.anyio
+
+
+async def stream(documents):
+    for document in documents:
+        yield document
+
+
+async def collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+@pytest.mark.parametrize("value", ["=SUM(A1:A9)", "+1", "-2", "@cmd", "\tx", "\rx"])
+def test_csv_value_neutralizes_formulas(value):
+    assert _csv_value(value) == "'" + value
+
+
+def test_csv_value_formats_non_strings():
+    assert _csv_value(None) == ""
+    assert _csv_value(datetime(2026, 10, 1, 12)) == "2026-10-01T12:00:00"
+    assert _csv_value({"a": [1]}) == '{"a": [1]}'
+    assert _csv_value(-2) == -2
+    assert _csv_value("plain") == "plain"
+
+
+async def test_csv_chunks_write_a_header_and_rename_id(monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_SIZE", 16)
+    documents = [{"_id": str(index), "name": f"Name {index}"} for index in range(5)]
+
+    chunks = [chunk async for chunk in csv_chunks(stream(documents), ["id", "name", "missing"])]
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+
+    assert len(chunks) > 1
+    assert rows == [["id", "name", "missing"]] + [[str(index), f"Name {index}", ""] for index in range(5)]
+
+
+async def test_ndjson_chunks_encode_one_document_per_line():
+    documents = [{"_id": "a", "at": datetime(2026, 10, 1)}, {"_id": "b", "text": "héllo"}]
+
+    lines = (await collect(ndjson_chunks(stream(documents)))).decode("utf-8").splitlines()
+
+    assert [json.loads(line) for line in lines] == [
+        {"id": "a", "at": "2026-10-01T00:00:00"}, {"id": "b", "text": "héllo"}
+    ]
+
+
+async def test_gzip_chunks_produce_one_gzip_file():
+    body = await collect(gzip_chunks(stream([b"first,", b"second"])))
+
+    assert gzip.decompress(body) == b"first,second"
+
+
+@pytest.fixture
+async def client(mongo):
+    app = FastAPI()
+    app.include_router(contacts_router)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_contact_export_downloads_filtered_csv(mongo, client):
+    await mongo.contacts.insert_many([
+        {"_id": "1", "name": "=HYPERLINK()", "status": "new", "created_at": datetime(2026, 10, 2)},
+        {"_id": "2", "name": "Closed", "status": "closed", "created_at": datetime(2026, 10, 1)},
+        {"_id": "3", "name": "First", "status": "new", "created_at": datetime(2026, 10, 1)},
+    ])
+
+    response = await client.get("/api/contacts/export", params={"status": "new", "gzip": "true"})
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode("utf-8"))))
+
+    assert response.headers["content-type"] == "application/gzip"
+    assert response.headers["content-disposition"].endswith('.csv.gz"')
+    assert [(row["id"], row["name"]) for row in rows] == [("3", "First"), ("1", "'=HYPERLINK()")]
+
+
+async def test_contact_export_rejects_unknown_formats(client):
+    response = await client.get("/api/contacts/export", params={"format": "xlsx"})
+
+    assert response.status_code == 422
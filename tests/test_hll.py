@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import database
+from utils import hll
+from utils.hll import ALL_PAGES, HLL_COLLECTION, HyperLogLog, _fold, apply_events, sketch_id, unique_visitors
+
+
+@pytest.mark.parametrize("cardinality", [10, 1000, 50_000])
+def test_hll_estimate_is_within_error_bound(cardinality):
+    sketch = HyperLogLog()
+    sketch.add_many(f"visitor-{i}" for i in range(cardinality))
+    # Three standard errors (~1.6% each)
+    assert abs(sketch.estimate() - cardinality) <= max(1, 0.05 * cardinality)
+
+
+def test_hll_ignores_repeats_and_merges_as_union():
+    first = HyperLogLog()
+    first.add_many(f"v{i}" for i in range(0, 6000))
+    first.add_many(f"v{i}" for i in range(0, 6000))
+    second = HyperLogLog()
+    second.add_many(f"v{i}" for i in range(3000, 9000))
+
+    merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+
+    assert abs(first.estimate() - 6000) <= 300
+    assert abs(merged.estimate() - 9000) <= 450
+
+
+@pytest.mark.anyio
+async def test_stored_sketches_merge_across_batches_and_days(mongo):
+    day = datetime(2026, 10, 1)
+
+    def view(i, page, timestamp):
+        return {"type": "page_view", "page": page, "timestamp": timestamp, "ip_address": f"10.0.{i // 256}.{i % 256}", "user_agent": "ua"}
+
+    await apply_events([view(i, "/a", day + timedelta(hours=1)) for i in range(500)])
+    await apply_events([view(i, "/a", day + timedelta(hours=2)) for i in range(250, 750)])
+    await apply_events([view(i, "/b", day + timedelta(days=1)) for i in range(1000)])
+
+    visitors = await unique_visitors(day, day + timedelta(days=1, hours=23))
+
+    assert abs(visitors["/a"] - 750) <= 38
+    assert abs(visitors["/b"] - 1000) <= 50
+    assert abs(visitors[ALL_PAGES] - 1000) <= 50
+
+
+def view(i, page, timestamp):
+    return {"type": "page_view", "page": page, "timestamp": timestamp, "ip_address": f"10.0.0.{i}", "user_agent": "ua"}
+
+
+def counted_writes(monkeypatch):
+    calls = {"find": 0, "bulk_write": 0}
+    find_many, bulk_write = hll.find_many, hll.bulk_write
+
+    async def counting_find_many(*args, **kwargs):
+        calls["find"] += 1
+        return await find_many(*args, **kwargs)
+
+    async def counting_bulk_write(*args, **kwargs):
+        calls["bulk_write"] += 1
+        return await bulk_write(*args, **kwargs)
+
+    monkeypatch.setattr(hll, "find_many", counting_find_many)
+    monkeypatch.setattr(hll, "bulk_write", counting_bulk_write)
+    return calls
+
+
+@pytest.mark.anyio
+async def test_a_batch_folds_every_sketch_in_one_round_trip(mongo, monkeypatch):
+    day = datetime(2026, 10, 1)
+    await apply_events([view(1, "/a", day)])
+    calls = counted_writes(monkeypatch)
+
+    # Updates /a and the day's site-wide sketch, creates /b plus /c and the site-wide sketch of the next day
+    await apply_events([view(2, "/a", day), view(3, "/b", day), view(4, "/c", day + timedelta(days=1))])
+
+    assert calls == {"find": 1, "bulk_write": 1}
+    assert await mongo[HLL_COLLECTION].count_documents({}) == 5
+    assert (await mongo[HLL_COLLECTION].find_one({"_id": sketch_id(day, "/a")}))["version"] == 2
+
+
+@pytest.mark.anyio
+async def test_batch_with_nothing_new_writes_nothing(mongo, monkeypatch):
+    day = datetime(2026, 10, 1)
+    await apply_events([view(1, "/a", day)])
+    calls = counted_writes(monkeypatch)
+
+    await apply_events([view(1, "/a", day + timedelta(hours=3))])
+
+    assert calls == {"find": 1, "bulk_write": 0}
+
+
+@pytest.mark.anyio
+async def test_conflicting_writes_are_retried_without_losing_registers(mongo, monkeypatch):
+    day = datetime(2026, 10, 1)
+    await apply_events([view(1, "/a", day)])
+    bulk_write = hll.bulk_write
+    raced = []
+
+    async def racing_bulk_write(collection, operations, ordered=False):
+        if not raced:
+            # Another worker folds its own visitor in between our read and write
+            raced.append(True)
+            theirs = HyperLogLog()
+            theirs.add_many(["someone-else"])
+            stored = await mongo[HLL_COLLECTION].find_one({"_id": sketch_id(day, "/a")})
+            merged = HyperLogLog.from_bytes(stored["registers"]).merge(theirs)
+            await database.db.database[HLL_COLLECTION].update_one(
+                {"_id": stored["_id"]}, {"$set": {"registers": merged.to_bytes()}, "$inc": {"version": 1}}
+            )
+        return await bulk_write(collection, operations, ordered=ordered)
+
+    monkeypatch.setattr(hll, "bulk_write", racing_bulk_write)
+    ours = HyperLogLog()
+    ours.add_many(["10.0.0.2|ua"])
+
+    assert await _fold({(day, "/a"): ours}) == 0
+
+    stored = HyperLogLog.from_bytes((await mongo[HLL_COLLECTION].find_one({"_id": sketch_id(day, "/a")}))["registers"])
+    expected = HyperLogLog()
+    expected.add_many(["10.0.0.1|ua", "10.0.0.2|ua", "someone-else"])
+    assert np.array_equal(stored.registers, expected.registers)
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from utils.ingest import IngestBuffer
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_flushes_on_batch_size(mongo):
+    buffer = IngestBuffer("events")
+    batches = []
+
+    async def listener(batch):
+        batches.append(len(batch))
+
+    buffer.add_flush_listener(listener)
+    await buffer.start(max_batch=3, flush_interval=60, max_queue=10)
+    for i in range(3):
+        assert await buffer.put({"_id": i})
+    await asyncio.sleep(0.05)
+
+    assert await mongo.events.count_documents({}) == 3
+    assert batches == [3]
+    await buffer.stop()
+
+
+async def test_flushes_on_interval(mongo):
+    buffer = IngestBuffer("events")
+    await buffer.start(max_batch=100, flush_interval=0.05, max_queue=100)
+    await buffer.put({"_id": 1})
+    await asyncio.sleep(0.2)
+
+    assert await mongo.events.count_documents({}) == 1
+    await buffer.stop()
+
+
+async def test_stop_drains_queue(mongo):
+    buffer = IngestBuffer("events")
+    await buffer.start(max_batch=100, flush_interval=60, max_queue=1000)
+    assert await buffer.put_many([{"_id": i} for i in range(250)]) == 250
+    await buffer.stop()
+
+    assert await mongo.events.count_documents({}) == 250
+    assert buffer.stats["written"] == 250
+    assert not buffer.running
+
+
+async def test_put_during_stop_is_written(mongo):
+    buffer = IngestBuffer("events")
+    await buffer.start(max_batch=100, flush_interval=60, max_queue=100)
+    await buffer.put({"_id": 1})
+
+    stopping = asyncio.create_task(buffer.stop())
+    await asyncio.sleep(0)
+    # The sentinel is queued but the flush task has not finished yet
+    assert not buffer.running
+    assert await buffer.put({"_id": 2})
+    await stopping
+
+    assert await mongo.events.count_documents({}) == 2
+
+
+async def test_writes_through_when_not_running(mongo):
+    buffer = IngestBuffer("events")
+    assert await buffer.put({"_id": 1})
+    assert await buffer.put_many([{"_id": 2}, {"_id": 3}]) == 2
+    assert await mongo.events.count_documents({}) == 3
+
+
+async def test_put_many_drops_rest_of_batch_when_full(mongo):
+    buffer = IngestBuffer("events")
+    await buffer.start(max_batch=2, flush_interval=60, max_queue=2, put_timeout=0.01)
+    # Hold the flush task so nothing leaves the queue
+    buffer._task.cancel()
+    await asyncio.gather(buffer._task, return_exceptions=True)
+    buffer._task = asyncio.create_task(asyncio.sleep(60))
+
+    assert await buffer.put_many([{"_id": i} for i in range(10)]) == 2
+    assert buffer.stats["dropped"] == 8
+
+    buffer._task.cancel()
+    await asyncio.gather(buffer._task, return_exceptions=True)
+    buffer._task = None
+
+
+async def test_partial_batch_failure_reports_written_documents(mongo):
+    await mongo.events.insert_one({"_id": 1})
+    buffer = IngestBuffer("events")
+    written = []
+
+    async def listener(batch):
+        written.extend(document["_id"] for document in batch)
+
+    buffer.add_flush_listener(listener)
+    await buffer.start(max_batch=10, flush_interval=60, max_queue=10)
+    await buffer.put_many([{"_id": 1}, {"_id": 2}, {"_id": 3}])
+    await buffer.stop()
+
+    assert written == [2, 3]
+    assert buffer.stats["failed"] == 1
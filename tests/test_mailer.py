@@ -0,0 +1,138 @@
+import smtplib
+import time
+from email.message import EmailMessage
+
+import pytest
+
+from utils import mailer
+from utils.mailer import SMTPPool
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeSMTP:
+    instances = []
+    fail_next = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        self.alive = True
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def noop(self):
+        if not self.alive:
+            raise smtplib.SMTPServerDisconnected("gone")
+        return (250, b"OK")
+
+    def sendmail(self, sender, recipients, message):
+        if FakeSMTP.fail_next:
+            raise FakeSMTP.fail_next.pop(0)
+        self.sent.append((sender, recipients))
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+async def pool(monkeypatch):
+    FakeSMTP.instances = []
+    FakeSMTP.fail_next = []
+    monkeypatch.setattr(mailer.smtplib, "SMTP", FakeSMTP)
+    monkeypatch.setenv("SMTP_USER", "user")
+    monkeypatch.setenv("SMTP_PASS", "secret")
+    pool = SMTPPool()
+    yield pool
+    await pool.close()
+
+
+def message(subject="Hello"):
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg.set_content("Body")
+    return msg
+
+
+async def test_sends_reuse_one_session(pool):
+    await pool.send("from@example.com", [("a@example.com", message()), ("b@example.com", message())])
+    await pool.send("from@example.com", [("c@example.com", message())])
+
+    assert len(FakeSMTP.instances) == 1
+    assert [recipients for _, recipients in FakeSMTP.instances[0].sent] == [
+        ["a@example.com"], ["b@example.com"], ["c@example.com"]
+    ]
+    assert pool.stats == {"connects": 1, "reconnects": 0, "sent": 3, "failed": 0}
+
+
+async def test_dropped_session_is_reconnected_and_the_message_retried(pool):
+    FakeSMTP.fail_next = [smtplib.SMTPServerDisconnected("closed")]
+
+    await pool.send("from@example.com", [("a@example.com", message())])
+
+    first, second = FakeSMTP.instances
+    assert first.closed and not second.closed
+    assert second.sent == [("from@example.com", ["a@example.com"])]
+    assert pool.stats["reconnects"] == 1
+
+
+async def test_rejected_message_keeps_the_session(pool):
+    FakeSMTP.fail_next = [smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"no")})]
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        await pool.send("from@example.com", [("a@example.com", message())])
+    await pool.send("from@example.com", [("b@example.com", message())])
+
+    assert len(FakeSMTP.instances) == 1
+    assert pool.stats["failed"] == 1
+
+
+async def test_second_failure_closes_the_session(pool):
+    FakeSMTP.fail_next = [ConnectionResetError(), ConnectionResetError()]
+
+    with pytest.raises(ConnectionResetError):
+        await pool.send("from@example.com", [("a@example.com", message())])
+
+    assert all(smtp.closed for smtp in FakeSMTP.instances)
+    assert pool._idle == []
+
+
+async def test_idle_session_is_health_checked(pool):
+    await pool.send("from@example.com", [("a@example.com", message())])
+    FakeSMTP.instances[0].alive = False
+    pool._idle[0].last_used = time.monotonic() - pool.settings.healthcheck_after - 1
+
+    await pool.send("from@example.com", [("b@example.com", message())])
+
+    first, second = FakeSMTP.instances
+    assert first.closed
+    assert second.sent == [("from@example.com", ["b@example.com"])]
+
+
+async def test_session_idle_past_the_limit_is_replaced_without_probing(pool):
+    await pool.send("from@example.com", [("a@example.com", message())])
+    pool._idle[0].last_used = time.monotonic() - pool.settings.max_idle - 1
+
+    await pool.send("from@example.com", [("b@example.com", message())])
+
+    assert len(FakeSMTP.instances) == 2
+    assert FakeSMTP.instances[0].closed
+
+
+async def test_on_sent_reports_each_delivered_message(pool):
+    delivered = []
+
+    async def on_sent(index):
+        delivered.append(index)
+
+    await pool.send("from@example.com", [("a@example.com", message()), ("b@example.com", message())], on_sent=on_sent)
+
+    assert delivered == [0, 1]
@@ -0,0 +1,70 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import ASGITransport, AsyncClient
+
+from utils.metrics import Histogram, MetricsMiddleware, MetricsRegistry, UNMATCHED, app_collector, histogram_samples
+
+pytestmark = pytest.mark.anyio
+
+
+def test_histogram_buckets_are_upper_inclusive():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram_samples("latency", {"route": "/"}, histogram) == [
+        'latency_bucket{route="/",le="0.1"} 2',
+        'latency_bucket{route="/",le="1.0"} 3',
+        'latency_bucket{route="/",le="+Inf"} 4',
+        'latency_sum{route="/"} 3.65',
+        'latency_count{route="/"} 4',
+    ]
+
+
+@pytest.fixture
+async def registry():
+    registry = MetricsRegistry()
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        if item_id == "missing":
+            raise HTTPException(status_code=404)
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware, registry=registry)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        registry.client = client
+        yield registry
+
+
+async def test_requests_are_grouped_by_route_template(registry):
+    for path in ("/items/1", "/items/2", "/items/missing", "/nowhere/1", "/nowhere/2"):
+        await registry.client.get(path)
+
+    assert registry.routes[("GET", "/items/{item_id}")].statuses == {200: 2, 404: 1}
+    assert registry.routes[("GET", UNMATCHED)].statuses == {404: 2}
+    assert registry.in_flight == 0
+
+
+async def test_render_exposes_prometheus_text(registry):
+    await registry.client.get("/items/1")
+    registry.register_collector(lambda: [("queue_depth", "gauge", "Queued items", [({"queue": 'a"b'}, 3)])])
+
+    text = registry.render()
+
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}"} 1' in text
+    assert 'http_responses_total{method="GET",route="/items/{item_id}",status="200"} 1' in text
+    assert 'http_response_size_bytes_sum{method="GET",route="/items/{item_id}"} 10.0' in text
+    assert 'queue_depth{queue="a\\"b"} 3' in text
+    assert text.endswith("\n")
+
+
+def test_app_collector_reports_every_family():
+    names = [name for name, _, _, _ in app_collector()]
+
+    assert "analytics_ingest_queue_depth" in names
+    assert "cache_hit_ratio" in names
+    assert "mongo_singleflight_reads_total" in names
@@ -0,0 +1,79 @@
+import json
+from types import SimpleNamespace
+
+from utils.mongo_monitor import CommandMonitor, command_collection, command_shape, query_shape
+
+
+def started(command_name, command, request_id=1):
+    return SimpleNamespace(command_name=command_name, command=command, connection_id=("db", 27017), request_id=request_id)
+
+
+def finished(duration_ms, request_id=1, failure=None):
+    return SimpleNamespace(
+        duration_micros=int(duration_ms * 1000), connection_id=("db", 27017), request_id=request_id, failure=failure
+    )
+
+
+def test_query_shape_hides_every_literal():
+    shape = query_shape({"email": "ana@example.com", "status": {"$in": ["new", "closed"]}, "$or": [{"a": 1}, {"b": {"$gt": 2}}]})
+
+    assert shape == {"email": "?", "status": {"$in": ["?"]}, "$or": [{"a": "?"}, {"b": {"$gt": "?"}}]}
+
+
+def test_command_shape_per_command():
+    pipeline = [{"$match": {"page": "/"}}, {"$group": {"_id": "$page", "n": {"$sum": 1}}}]
+
+    assert json.loads(command_shape("find", {"find": "contacts", "filter": {"_id": "x"}})) == {"_id": "?"}
+    assert json.loads(command_shape("aggregate", {"aggregate": "analytics", "pipeline": pipeline})) == [
+        {"$match": {"page": "?"}}, {"$group": {"_id": "?", "n": {"$sum": "?"}}}
+    ]
+    assert json.loads(command_shape("update", {"update": "c", "updates": [{"q": {"_id": 1}, "u": {}}]})) == {"_id": "?"}
+    assert command_shape("insert", {"insert": "c", "documents": [{"secret": 1}]}) is None
+
+
+def test_command_collection():
+    assert command_collection("find", {"find": "contacts"}) == "contacts"
+    assert command_collection("getMore", {"getMore": 5, "collection": "analytics"}) == "analytics"
+    assert command_collection("aggregate", {"aggregate": 1}) == "(database)"
+
+
+def test_commands_are_timed_and_slow_ones_logged_without_values():
+    monitor = CommandMonitor()
+    monitor.configure(slow_ms=50, slow_log_size=10)
+
+    monitor.started(started("find", {"find": "contacts", "filter": {"email": "ana@example.com"}}, 1))
+    monitor.succeeded(finished(2, 1))
+    monitor.started(started("find", {"find": "contacts", "filter": {"email": "bob@example.com"}}, 2))
+    monitor.succeeded(finished(120, 2))
+    monitor.started(started("aggregate", {"aggregate": "analytics", "pipeline": []}, 3))
+    monitor.failed(finished(1, 3, failure={"errmsg": "boom"}))
+
+    summary = {(row["collection"], row["command"]): row for row in monitor.summary()}
+    assert summary[("contacts", "find")]["count"] == 2
+    assert summary[("contacts", "find")]["max_ms"] == 120.0
+    assert summary[("analytics", "aggregate")]["failures"] == 1
+
+    slow, = monitor.slow_operations()
+    assert slow["duration_ms"] == 120.0
+    assert slow["shape"] == '{"email": "?"}'
+    assert "bob" not in json.dumps(slow, default=str)
+
+
+def test_housekeeping_commands_are_ignored():
+    monitor = CommandMonitor()
+
+    monitor.started(started("hello", {"hello": 1}))
+    monitor.succeeded(finished(1))
+
+    assert monitor.summary() == []
+
+
+def test_slow_log_keeps_the_newest_entries():
+    monitor = CommandMonitor()
+    monitor.configure(slow_ms=0, slow_log_size=2)
+    for request_id, collection in enumerate(("a", "b", "c")):
+        monitor.started(started("find", {"find": collection, "filter": {}}, request_id))
+        monitor.succeeded(finished(1, request_id))
+
+    assert [entry["collection"] for entry in monitor.slow_operations()] == ["c", "b"]
+    assert [entry["collection"] for entry in monitor.slow_operations(limit=1)] == ["c"]
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.outbox import OUTBOX_COLLECTION, DeliverySkipped, EmailOutbox
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def outbox():
+    box = EmailOutbox()
+    box.max_attempts = 3
+    return box
+
+
+async def test_enqueue_is_idempotent_on_key(mongo, outbox):
+    message = {"key": "contact:1:emails", "kind": "test", "payload": {}}
+    assert await outbox.enqueue([message]) == 1
+    assert await outbox.enqueue([message]) == 0
+    assert outbox.stats["duplicates"] == 1
+    assert await mongo[OUTBOX_COLLECTION].count_documents({}) == 1
+
+
+async def test_claim_takes_a_lease(mongo, outbox):
+    await outbox.enqueue([{"key": "m1", "kind": "test", "payload": {}}])
+
+    message = await outbox._claim()
+    assert message["status"] == "sending"
+    assert message["attempts"] == 1
+    assert message["locked_until"] > datetime.utcnow()
+    # Leased, so no other worker can claim it
+    assert await outbox._claim() is None
+
+
+async def test_expired_lease_is_reclaimed(mongo, outbox):
+    await outbox.enqueue([{"key": "m1", "kind": "test", "payload": {}}])
+    await outbox._claim()
+    await mongo[OUTBOX_COLLECTION].update_one({"_id": "m1"}, {"$set": {"locked_until": datetime.utcnow() - timedelta(seconds=1)}})
+
+    message = await outbox._claim()
+    assert message["attempts"] == 2
+
+
+async def test_stale_worker_cannot_overwrite_a_reclaimed_message(mongo, outbox):
+    async def handler(payload):
+        pass
+
+    outbox.register_handler("test", handler)
+    await outbox.enqueue([{"key": "m1", "kind": "test", "payload": {}}])
+    stale = await outbox._claim()
+    await mongo[OUTBOX_COLLECTION].update_one({"_id": "m1"}, {"$set": {"locked_until": datetime.utcnow() - timedelta(seconds=1)}})
+    await outbox._claim()
+
+    await outbox._deliver(stale)
+
+    assert (await mongo[OUTBOX_COLLECTION].find_one({"_id": "m1"}))["status"] == "sending"
+
+
+async def test_failure_is_retried_with_backoff_then_dead_lettered(mongo, outbox):
+    async def handler(payload):
+        raise ConnectionError("smtp down")
+
+    outbox.register_handler("test", handler)
+    await outbox.enqueue([{"key": "m1", "kind": "test", "payload": {}}])
+
+    await outbox._deliver(await outbox._claim())
+    document = await mongo[OUTBOX_COLLECTION].find_one({"_id": "m1"})
+    assert document["status"] == "pending"
+    assert document["last_error"] == "smtp down"
+    assert document["next_attempt_at"] > datetime.utcnow() + timedelta(seconds=outbox.base_delay * 0.5 - 1)
+    # Not due yet
+    assert await outbox._claim() is None
+
+    for _ in range(outbox.max_attempts - 1):
+        await mongo[OUTBOX_COLLECTION].update_one({"_id": "m1"}, {"$set": {"next_attempt_at": datetime.utcnow()}})
+        await outbox._deliver(await outbox._claim())
+
+    document = await mongo[OUTBOX_COLLECTION].find_one({"_id": "m1"})
+    assert document["status"] == "dead"
+    assert outbox.stats["retried"] == outbox.max_attempts - 1
+    assert outbox.stats["dead"] == 1
+
+
+async def test_skipped_and_sent_messages_are_final(mongo, outbox):
+    async def skip(payload):
+        raise DeliverySkipped("not configured")
+
+    async def send(payload):
+        pass
+
+    outbox.register_handler("skip", skip)
+    outbox.register_handler("send", send)
+    await outbox.enqueue([{"key": "a", "kind": "skip", "payload": {}}, {"key": "b", "kind": "send", "payload": {}}])
+
+    await outbox._deliver(await outbox._claim())
+    await outbox._deliver(await outbox._claim())
+
+    assert await outbox.status_counts() == {"pending": 0, "sending": 0, "sent": 1, "skipped": 1, "dead": 0}
+
+
+def test_backoff_grows_exponentially_and_is_capped(outbox):
+    outbox.base_delay = 10.0
+    outbox.max_delay = 100.0
+    for attempts, base in [(1, 10.0), (2, 20.0), (3, 40.0), (8, 100.0)]:
+        delay = outbox._backoff(attempts)
+        assert base * 0.5 <= delay <= base * 1.5
+
+
+async def test_record_progress_is_visible_to_the_next_attempt(mongo, outbox):
+    await outbox.enqueue([{"key": "m1", "kind": "test", "payload": {"to": "a"}}])
+
+    await outbox.record_progress("m1", "first")
+    await outbox.record_progress("m1", "first")
+
+    assert (await outbox._claim())["payload"] == {"to": "a", "completed": ["first"]}
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from models import Contact
+from routes.contacts import router as contacts_router
+from utils.pagination import decode_cursor, encode_cursor, keyset_filter
+
+pytestmark = pytest.mark.anyio
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 10, 1, 12, 30, 5, 123000)
+    assert decode_cursor(encode_cursor(created_at, "abc")) == (created_at, "abc")
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "e30"])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_keyset_filter_breaks_ties_on_id():
+    created_at = datetime(2026, 10, 1)
+    assert keyset_filter(created_at, "b") == {
+        "$or": [{"created_at": {"$lt": created_at}}, {"created_at": created_at, "_id": {"$lt": "b"}}]
+    }
+
+
+@pytest.fixture
+async def client(mongo):
+    app = FastAPI()
+    app.include_router(contacts_router)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def store_contacts(mongo, count):
+    base = datetime(2026, 10, 1)
+    documents = []
+    for i in range(count):
+        # Pairs share a timestamp so pages must split on the _id tie-breaker
+        contact = Contact(name=f"Contact {i}", email=f"c{i}@example.com", service="Web Development", message="Hello there")
+        document = contact.dict()
+        document["_id"] = f"{i:03d}"
+        del document["id"]
+        document["created_at"] = base + timedelta(minutes=i // 2)
+        documents.append(document)
+    await mongo.contacts.insert_many(documents)
+
+
+async def test_cursor_pages_walk_every_contact_once(mongo, client):
+    await store_contacts(mongo, 11)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 4, "count": "none"}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/api/contacts/", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        seen.extend(contact["id"] for contact in body["contacts"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [f"{i:03d}" for i in reversed(range(11))]
+
+
+async def test_invalid_cursor_is_rejected(client):
+    response = await client.get("/api/contacts/", params={"cursor": "garbage"})
+    assert response.status_code == 400
@@ -0,0 +1,113 @@
+import os
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from routes.profiles import router as profiles_router
+from utils import profiling
+from utils.profiling import ProfileSettings, ProfileStore, ProfilingMiddleware, route_directory_name, token_matches
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("PROFILE_ADMIN_TOKEN", "s3cret")
+    monkeypatch.setenv("PROFILE_MAX_FILES", "2")
+    monkeypatch.setenv("PROFILE_FORMAT", "collapsed")
+    return ProfileSettings()
+
+
+def test_token_matches(settings):
+    assert token_matches(settings, "s3cret")
+    assert not token_matches(settings, "wrong")
+    assert not token_matches(settings, None)
+    assert not token_matches(settings, "sécret")
+
+
+@pytest.mark.parametrize("template, name", [
+    ("/api/contacts/{contact_id}/status", "api_contacts_contact_id_status"),
+    ("/", "root"),
+    ("unmatched", "unmatched"),
+])
+def test_route_directory_name(template, name):
+    assert route_directory_name(template) == name
+
+
+def test_store_keeps_the_newest_files(settings):
+    store = ProfileStore(settings)
+    for index in range(3):
+        store.write("/api/services", f"p{index}.collapsed.txt", "main 1\n")
+        path = settings.directory / "api_services" / f"p{index}.collapsed.txt"
+        os.utime(path, (time.time() + index, time.time() + index))
+        store._prune()
+
+    assert [profile["file"] for profile in store.listing()] == ["p2.collapsed.txt", "p1.collapsed.txt"]
+
+
+def test_resolve_rejects_unsafe_names(settings):
+    store = ProfileStore(settings)
+    store.write("/api/services", "p.collapsed.txt", "main 1\n")
+
+    assert store.resolve("api_services", "p.collapsed.txt") == (settings.directory / "api_services" / "p.collapsed.txt").resolve()
+    assert store.resolve("..", "p.collapsed.txt") is None
+    assert store.resolve("api_services", ".p.collapsed.txt.tmp") is None
+    assert store.resolve("api_services", "missing.collapsed.txt") is None
+
+
+class FakeProfiler:
+    started = 0
+
+    def __init__(self, interval, async_mode):
+        self.is_running = False
+
+    def start(self):
+        FakeProfiler.started += 1
+        self.is_running = True
+
+    def stop(self):
+        self.is_running = False
+        return "session"
+
+
+@pytest.fixture
+async def client(settings, monkeypatch):
+    FakeProfiler.started = 0
+    monkeypatch.setattr(profiling, "Profiler", FakeProfiler)
+    monkeypatch.setattr(profiling, "render_profile", lambda session, profile_format: "main 1\n")
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.include_router(profiles_router)
+    app.add_middleware(ProfilingMiddleware, settings=settings)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_token_requests_are_profiled_and_stored(client, settings):
+    plain = await client.get("/api/ping")
+    profiled = await client.get("/api/ping", headers={"x-profile-token": "s3cret"})
+
+    assert "x-profile-id" not in plain.headers
+    assert profiled.headers["x-profile-id"]
+    assert FakeProfiler.started == 1
+    listing = (await client.get("/api/profiles/", headers={"x-profile-token": "s3cret"})).json()
+    assert listing["total"] == 1
+    assert listing["profiles"][0]["route"] == "api_ping"
+
+
+async def test_non_ascii_tokens_are_refused_not_errors(client):
+    token = "sécret".encode("utf-8")
+
+    profiled = await client.get("/api/ping", headers={"x-profile-token": token})
+    listing = await client.get("/api/profiles/", headers={"x-profile-token": token})
+
+    assert profiled.status_code == 200
+    assert "x-profile-id" not in profiled.headers
+    assert listing.status_code == 403
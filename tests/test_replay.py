@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+import gzip
+import json
+from pathlib import Path
+import sys
+
+import pytest
+from fastapi import FastAPI, Request
+from httpx import ASGITransport, AsyncClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend" / "benchmarks"))
+
+from replay import _timestamp, calls_for, events_from_ndjson, replay  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+AT = datetime(2026, 10, 1, 12)
+
+
+def contact_event(seconds, ip="1.2.3.4"):
+    return {
+        "type": "contact_form", "page": "contact", "timestamp": AT + timedelta(seconds=seconds),
+        "ip_address": ip, "user_agent": "Browser", "metadata": {"service": "Web Development", "company": "Acme"}
+    }
+
+
+@pytest.mark.parametrize("value", [AT, "2026-10-01T12:00:00", "2026-10-01T12:00:00Z", "2026-10-01T19:00:00+07:00"])
+def test_timestamp_is_naive_utc(value):
+    assert _timestamp(value) == AT
+
+
+def test_page_view_replays_content_reads_and_beacon():
+    calls = calls_for({"type": "page_view", "page": "home", "timestamp": AT, "user_agent": "UA"}, 0, {})
+
+    assert [label for label, _, _, _ in calls] == [
+        "GET /api/services", "GET /api/products", "GET /api/projects", "POST /api/analytics/events"
+    ]
+    assert calls[-1][3]["json"] == [{"type": "page_view", "page": "home", "metadata": {}}]
+    assert calls[0][3]["headers"] == {"user-agent": "UA"}
+
+
+def test_contact_pair_replays_the_submission_then_the_beacon():
+    pending = {}
+
+    first = calls_for(contact_event(0), 1, pending)
+    second = calls_for(contact_event(4), 2, pending)
+    # Too late to be the first submission's beacon: a new submission
+    third = calls_for(contact_event(200), 3, pending)
+
+    assert [label for label, _, _, _ in first] == ["POST /api/contacts/"]
+    assert first[0][3]["json"]["service"] == "Web Development"
+    assert [label for label, _, _, _ in second] == ["POST /api/analytics/events"]
+    assert [label for label, _, _, _ in third] == ["POST /api/contacts/"]
+
+
+def test_other_events_replay_as_beacons():
+    calls = calls_for({"type": "click", "page": None, "timestamp": AT}, 0, {})
+
+    assert calls == [("POST /api/analytics/events", "POST", "/api/analytics/events", {
+        "json": [{"type": "click", "page": "/", "metadata": {}}], "headers": {"user-agent": "replay"}
+    })]
+
+
+async def test_ndjson_events_are_filtered_by_range(tmp_path):
+    path = tmp_path / "events.ndjson.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as handle:
+        for hour in range(4):
+            handle.write(json.dumps({"type": "page_view", "timestamp": f"2026-10-01T{10 + hour}:00:00Z"}) + "\n")
+        handle.write("\n")
+
+    events = [event async for event in events_from_ndjson(str(path), AT - timedelta(hours=1), AT + timedelta(hours=1))]
+
+    assert [event["timestamp"] for event in events] == [AT - timedelta(hours=1), AT]
+
+
+async def test_replay_sends_every_call():
+    received = []
+    app = FastAPI()
+
+    @app.api_route("/{path:path}", methods=["GET", "POST"])
+    async def record(path: str, request: Request):
+        received.append((request.method, "/" + path))
+        return {}
+
+    async def events():
+        yield {"type": "page_view", "page": "home", "timestamp": AT}
+        yield contact_event(1)
+        yield {"type": "click", "page": "/", "timestamp": AT + timedelta(seconds=2)}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        summary = await replay(client, events(), speedup=0, concurrency=2, limit=None)
+
+    assert summary["events"] == 3
+    assert summary["total"]["requests"] == len(received) == 6
+    assert ("POST", "/api/contacts/") in received
@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import ASGITransport, AsyncClient
+
+from routes.reports import _date_range, router as reports_router
+from utils.reports import (
+    ReportCache, cohort_retention, conversion_funnel, page_view_series, report_cache, service_conversion
+)
+
+pytestmark = pytest.mark.anyio
+
+DAY = datetime(2026, 9, 7)  # a Monday
+
+
+def frame(rows):
+    events = pd.DataFrame(rows, columns=["type", "page", "timestamp", "ip_address", "user_agent"])
+    events["timestamp"] = pd.to_datetime(events["timestamp"])
+    return events
+
+
+def visit(visitor, event_type, at, page="/"):
+    return (event_type, page, at, f"10.0.0.{visitor}", "Browser")
+
+
+def test_date_range_converts_offsets_to_utc_and_aligns_to_hours():
+    start = datetime(2026, 9, 1, 9, 30, tzinfo=timezone(timedelta(hours=7)))
+    end = datetime(2026, 9, 1, 5, 10, tzinfo=timezone.utc)
+
+    assert _date_range(start, end, 30) == (datetime(2026, 9, 1, 2), datetime(2026, 9, 1, 6))
+
+
+def test_date_range_rejects_an_inverted_range():
+    with pytest.raises(HTTPException):
+        _date_range(datetime(2026, 9, 2), datetime(2026, 9, 1), 30)
+
+
+def test_page_view_series_counts_views_and_unique_visitors():
+    events = frame([
+        visit(1, "page_view", DAY + timedelta(hours=1)),
+        visit(1, "page_view", DAY + timedelta(hours=2)),
+        visit(2, "page_view", DAY + timedelta(hours=2)),
+        visit(2, "click", DAY + timedelta(hours=2)),
+        visit(3, "page_view", DAY + timedelta(days=1)),
+    ])
+
+    assert page_view_series(events) == [
+        {"bucket": DAY, "views": 3, "visitors": 2},
+        {"bucket": DAY + timedelta(days=1), "views": 1, "visitors": 1},
+    ]
+    assert page_view_series(events, "hour")[1] == {"bucket": DAY + timedelta(hours=2), "views": 2, "visitors": 2}
+    assert page_view_series(events, page="/missing") == []
+
+
+def test_funnel_requires_order_and_window():
+    events = frame([
+        visit(1, "page_view", DAY),
+        visit(1, "contact_form", DAY + timedelta(hours=1)),
+        # Converted, but outside the window
+        visit(2, "page_view", DAY),
+        visit(2, "contact_form", DAY + timedelta(hours=30)),
+        # Wrong order
+        visit(3, "contact_form", DAY),
+        visit(3, "page_view", DAY + timedelta(hours=1)),
+        visit(4, "page_view", DAY, page="/pricing"),
+    ])
+
+    steps = conversion_funnel(events, ["page_view", "contact_form"], timedelta(hours=24))
+
+    assert steps == [
+        {"step": "page_view", "visitors": 4, "conversion_from_start": 1.0, "conversion_from_previous": 1.0},
+        {"step": "contact_form", "visitors": 1, "conversion_from_start": 0.25, "conversion_from_previous": 0.25},
+    ]
+    assert conversion_funnel(events, ["page_view:/pricing"], timedelta(hours=1))[0]["visitors"] == 1
+
+
+def test_service_conversion_rates():
+    contacts = pd.DataFrame({
+        "service": ["Web", "Web", "Web", "Apps"],
+        "status": ["closed", "new", "qualified", None],
+        "created_at": [DAY] * 4,
+    })
+    events = frame([visit(index, "page_view", DAY) for index in range(8)])
+
+    web, apps = service_conversion(contacts, events)
+
+    assert web == {
+        "service": "Web", "submissions": 3, "statuses": {"closed": 1, "new": 1, "qualified": 1},
+        "converted": 2, "conversion_rate": 0.6667, "share_of_submissions": 0.75, "submissions_per_visitor": 0.375
+    }
+    assert apps["statuses"] == {"new": 1}
+
+
+def test_cohort_retention_by_week():
+    events = frame([
+        visit(1, "page_view", DAY),
+        visit(1, "page_view", DAY + timedelta(days=8)),
+        visit(2, "page_view", DAY + timedelta(days=2)),
+        visit(3, "page_view", DAY + timedelta(days=7)),
+    ])
+
+    first, second = cohort_retention(events, "week", 2)
+
+    assert first == {"cohort": DAY, "visitors": 2, "retention": [1.0, 0.5]}
+    assert second["cohort"] == DAY + timedelta(days=7)
+    assert second["visitors"] == 1
+
+
+async def test_report_cache_shares_one_computation():
+    cache = ReportCache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": 1}
+
+    results = await asyncio.gather(*(cache.get("key", compute) for _ in range(3)))
+    await cache.get("key", compute)
+
+    assert len(calls) == 1
+    assert results == [{"value": 1}] * 3
+    assert cache.stats == {"hits": 1, "misses": 3}
+
+
+@pytest.fixture
+async def client(mongo):
+    report_cache._entries.clear()
+    app = FastAPI()
+    app.include_router(reports_router)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+async def test_timeseries_endpoint_reads_mongo(mongo, client):
+    await mongo.analytics.insert_many([
+        {"type": "page_view", "page": "/", "timestamp": DAY + timedelta(hours=hour), "ip_address": f"10.0.0.{hour % 2}", "user_agent": "B"}
+        for hour in range(4)
+    ])
+
+    response = await client.get("/api/analytics/reports/timeseries", params={
+        "start": "2026-09-07T00:00:00Z", "end": "2026-09-08T00:00:00Z", "granularity": "day"
+    })
+
+    assert response.status_code == 200
+    assert response.json()["series"] == [{"bucket": "2026-09-07T00:00:00", "views": 4, "visitors": 2}]
+
+
+async def test_funnel_endpoint_validates_steps(client):
+    response = await client.get("/api/analytics/reports/funnel", params={"steps": ","})
+
+    assert response.status_code == 400
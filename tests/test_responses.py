@@ -0,0 +1,75 @@
+import gzip
+import json
+
+import pytest
+
+from utils import responses
+from utils.responses import EncodedBody, PreEncodedJSONResponse, parse_accept_encoding
+
+PAYLOAD = {"items": [{"id": str(index), "title": "Item " + str(index)} for index in range(100)]}
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, br;q=0.5, identity;q=0, x;q=bad") == {
+        "gzip": 1.0, "br": 0.5, "identity": 0.0, "x": 0.0
+    }
+    assert parse_accept_encoding(None) == {}
+
+
+def test_small_bodies_are_not_compressed():
+    body = EncodedBody({"items": []})
+
+    assert body.variants == {}
+    assert body.select("gzip") == (body.raw, None)
+
+
+def test_gzip_variant_is_deterministic_and_round_trips():
+    first, second = EncodedBody(PAYLOAD), EncodedBody(PAYLOAD)
+
+    assert first.variants["gzip"] == second.variants["gzip"]
+    assert json.loads(gzip.decompress(first.variants["gzip"])) == PAYLOAD
+    assert first.etag == second.etag
+
+
+def test_variant_etags_differ_per_encoding():
+    body = EncodedBody(PAYLOAD)
+
+    assert body.variant_etag(None) == body.etag
+    assert body.variant_etag("gzip") == body.etag[:-1] + '-gzip"'
+    assert len(set(body.etags())) == len(body.variants) + 1
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*, gzip;q=0", None),
+])
+def test_encoding_for_respects_q_values(monkeypatch, header, expected):
+    monkeypatch.setattr(responses, "brotli", None)
+    assert EncodedBody(PAYLOAD).encoding_for(header) == expected
+
+
+def test_response_headers_follow_the_selected_variant(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+    body = EncodedBody(PAYLOAD)
+
+    compressed = PreEncodedJSONResponse(body, "gzip, deflate")
+    plain = PreEncodedJSONResponse(body, None)
+
+    assert compressed.body == body.variants["gzip"]
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["etag"] == body.variant_etag("gzip")
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert plain.body == body.raw
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] == body.etag
+    assert plain.headers["content-type"] == "application/json"
+
+
+def test_uncompressed_bodies_do_not_vary():
+    response = PreEncodedJSONResponse(EncodedBody({"items": []}), "gzip")
+
+    assert "vary" not in response.headers
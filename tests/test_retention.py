@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+from utils.analytics import build_event_document
+from utils.retention import AnalyticsRetention
+from utils.rollups import ROLLUP_COLLECTION, apply_events, bucket_start, mark_raw_removed, oldest_intact_day
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def retention_env(monkeypatch):
+    monkeypatch.setenv("ANALYTICS_RAW_RETENTION_DAYS", "10")
+    monkeypatch.delenv("ANALYTICS_ARCHIVE_AFTER_DAYS", raising=False)
+
+
+@pytest.fixture
+def retention():
+    job = AnalyticsRetention()
+    job.hourly_retention_days = 5
+    return job
+
+
+def event(index, timestamp):
+    return {"_id": f"e{index}", "type": "page_view", "page": "/", "timestamp": timestamp}
+
+
+async def test_oldest_intact_day_follows_the_earliest_horizon(mongo, monkeypatch):
+    today = bucket_start(datetime.utcnow(), "day")
+    assert await oldest_intact_day() == today - timedelta(days=9)
+
+    monkeypatch.setenv("ANALYTICS_ARCHIVE_AFTER_DAYS", "3")
+    assert await oldest_intact_day() == today - timedelta(days=2)
+
+    # An archive run that removed more than the horizon moves the boundary on
+    await mark_raw_removed(today - timedelta(days=1))
+    assert await oldest_intact_day() == today - timedelta(days=1)
+
+
+async def test_oldest_intact_day_is_none_without_retention(mongo, monkeypatch):
+    monkeypatch.delenv("ANALYTICS_RAW_RETENTION_DAYS")
+
+    assert await oldest_intact_day() is None
+
+
+async def test_run_once_finalizes_the_expiring_day_once(mongo, retention):
+    day = bucket_start(datetime.utcnow(), "day") - timedelta(days=9)
+    await mongo.analytics.insert_many([event(index, day + timedelta(hours=2)) for index in range(3)])
+    # The listener missed one of them
+    await apply_events([event(0, day + timedelta(hours=2))])
+
+    first = await retention.run_once()
+    second = await retention.run_once()
+
+    assert first["finalized"] == day
+    assert second["finalized"] is None
+    rollup = await mongo[ROLLUP_COLLECTION].find_one({"granularity": "day", "bucket": day})
+    assert rollup["count"] == 3
+    assert retention.stats["days_finalized"] == 1
+
+
+async def test_run_once_prunes_old_hourly_rollups_only(mongo, retention, monkeypatch):
+    monkeypatch.delenv("ANALYTICS_RAW_RETENTION_DAYS")
+    old = bucket_start(datetime.utcnow(), "day") - timedelta(days=6)
+    recent = bucket_start(datetime.utcnow(), "day") - timedelta(days=4)
+    await apply_events([event(1, old + timedelta(hours=1)), event(2, recent + timedelta(hours=1))])
+
+    result = await retention.run_once()
+
+    assert result["hourly_pruned"] == 1
+    hours = await mongo[ROLLUP_COLLECTION].distinct("bucket", {"granularity": "hour"})
+    assert hours == [recent + timedelta(hours=1)]
+    assert await mongo[ROLLUP_COLLECTION].count_documents({"granularity": "day"}) == 2
+
+
+async def test_scheduled_runs_take_one_slot_per_interval(mongo, retention):
+    holder = await retention._acquire_lease(scheduled=True)
+    assert holder
+    assert await retention._acquire_lease(scheduled=True) is None
+    assert await retention._acquire_lease(scheduled=False) is None
+
+    await retention._release_lease(holder)
+
+    # Released, but the next scheduled run is not due; on-demand archiving may go ahead
+    assert await retention._acquire_lease(scheduled=True) is None
+    assert await retention._acquire_lease(scheduled=False)
+
+
+def test_timeseries_events_carry_the_meta_field(monkeypatch):
+    monkeypatch.setattr(database.db, "analytics_timeseries", True)
+    at = datetime(2026, 10, 1, 12)
+
+    document = build_event_document("click", "/pricing", timestamp=at)
+
+    assert document["meta"] == {"type": "click", "page": "/pricing"}
+    assert document["timestamp"] == at
+    assert "id" not in document and document["_id"]
+
+
+def test_regular_events_have_no_meta_field(monkeypatch):
+    monkeypatch.setattr(database.db, "analytics_timeseries", False)
+
+    assert "meta" not in build_event_document("page_view", "/")
@@ -0,0 +1,168 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils import rollups
+from utils.rollups import (
+    ROLLUP_COLLECTION, RebuildInProgress, apply_events, bootstrap_rollups, bucket_start, mark_raw_removed, page_counts,
+    rebuild_rollups
+)
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def no_retention(monkeypatch):
+    monkeypatch.delenv("ANALYTICS_RAW_RETENTION_DAYS", raising=False)
+    monkeypatch.delenv("ANALYTICS_ARCHIVE_AFTER_DAYS", raising=False)
+
+
+def event(i, timestamp, page="/"):
+    return {"_id": f"e{i}", "type": "page_view", "page": page, "timestamp": timestamp}
+
+
+async def rollup_counts(mongo, granularity):
+    documents = await mongo[ROLLUP_COLLECTION].find({"granularity": granularity}).to_list(None)
+    return {(document["bucket"], document["page"]): document["count"] for document in documents}
+
+
+async def test_apply_events_increments_hour_and_day(mongo):
+    at = datetime(2026, 10, 1, 13, 20)
+    await apply_events([event(1, at), event(2, at, "/a"), event(3, at + timedelta(minutes=5))])
+
+    assert await rollup_counts(mongo, "hour") == {(datetime(2026, 10, 1, 13), "/"): 2, (datetime(2026, 10, 1, 13), "/a"): 1}
+    assert await rollup_counts(mongo, "day") == {(datetime(2026, 10, 1), "/"): 2, (datetime(2026, 10, 1), "/a"): 1}
+
+
+async def test_rebuild_replaces_closed_buckets(mongo):
+    day = bucket_start(datetime.utcnow(), "day") - timedelta(days=3)
+    await mongo.analytics.insert_many([event(i, day + timedelta(hours=1)) for i in range(4)])
+    # Drifted and stale counters from an earlier run
+    await apply_events([event(9, day + timedelta(hours=1))])
+    await apply_events([event(10, day + timedelta(hours=5), "/gone")])
+
+    await rebuild_rollups()
+
+    assert await rollup_counts(mongo, "hour") == {(day + timedelta(hours=1), "/"): 4}
+    assert await rollup_counts(mongo, "day") == {(day, "/"): 4}
+
+
+async def test_rebuild_leaves_open_buckets_to_the_listener(mongo):
+    now = datetime.utcnow()
+    await mongo.analytics.insert_many([event(i, now) for i in range(3)])
+    await apply_events([event(1, now)])
+
+    await rebuild_rollups()
+
+    assert await rollup_counts(mongo, "day") == {(bucket_start(now, "day"), "/"): 1}
+
+
+async def test_rebuild_skips_archived_days(mongo):
+    today = bucket_start(datetime.utcnow(), "day")
+    archived = today - timedelta(days=5)
+    await apply_events([event(i, archived + timedelta(hours=2)) for i in range(6)])
+    await mark_raw_removed(archived + timedelta(days=1))
+
+    await rebuild_rollups()
+
+    assert await rollup_counts(mongo, "day") == {(archived, "/"): 6}
+
+
+async def test_bootstrap_counts_each_event_once(mongo):
+    now = datetime.utcnow()
+    earlier = now - timedelta(days=2)
+    await mongo.analytics.insert_many([event(i, earlier) for i in range(5)] + [event(i, now - timedelta(seconds=1)) for i in range(5, 8)])
+    # The listener has already counted events stamped after listening_since
+    await apply_events([event(8, now)])
+
+    await bootstrap_rollups(now)
+
+    days = await rollup_counts(mongo, "day")
+    assert days[(bucket_start(earlier, "day"), "/")] == 5
+    assert days[(bucket_start(now, "day"), "/")] == 4
+
+
+async def test_bootstrap_runs_once_across_workers(mongo, monkeypatch):
+    now = datetime.utcnow()
+    first_listener = now - timedelta(seconds=20)
+    earlier = now - timedelta(days=2)
+    await mongo.analytics.insert_many([event(i, earlier) for i in range(5)] + [event(i, first_listener - timedelta(seconds=1)) for i in range(5, 8)])
+    # The first worker's listener counted an event flushed before the second worker started
+    counted = event(8, first_listener + timedelta(seconds=1))
+    await mongo.analytics.insert_one(counted)
+    await apply_events([counted])
+
+    # Make every worker's rebuild yield so their bootstraps interleave
+    rebuild = rollups._rebuild
+
+    async def slow_rebuild(*args):
+        await asyncio.sleep(0.05)
+        return await rebuild(*args)
+
+    monkeypatch.setattr(rollups, "_rebuild", slow_rebuild)
+    await asyncio.gather(*(bootstrap_rollups(first_listener + timedelta(seconds=i * 5), retry_interval=0.01) for i in range(3)))
+
+    days = await rollup_counts(mongo, "day")
+    assert days[(bucket_start(earlier, "day"), "/")] == 5
+    assert days[(bucket_start(first_listener, "day"), "/")] == 4
+    # A worker restarting later leaves the finished bootstrap alone
+    await bootstrap_rollups(now)
+    assert await rollup_counts(mongo, "day") == days
+
+
+async def test_concurrent_rebuild_is_refused(mongo, monkeypatch):
+    day = bucket_start(datetime.utcnow(), "day") - timedelta(days=3)
+    await mongo.analytics.insert_many([event(i, day) for i in range(2)])
+    rebuild = rollups._rebuild
+
+    async def slow_rebuild(*args):
+        await asyncio.sleep(0.05)
+        return await rebuild(*args)
+
+    monkeypatch.setattr(rollups, "_rebuild", slow_rebuild)
+    results = await asyncio.gather(rebuild_rollups(), rebuild_rollups(), return_exceptions=True)
+
+    assert sum(isinstance(result, RebuildInProgress) for result in results) == 1
+    # The lease is released once the rebuild is done
+    assert await rebuild_rollups() == {"hourly": 1, "daily": 1}
+    assert await rollup_counts(mongo, "day") == {(day, "/"): 2}
+
+
+async def test_page_counts_reads_partial_first_day_from_hours(mongo):
+    day = datetime(2026, 10, 1)
+    await apply_events(
+        [event(i, day + timedelta(hours=2), "/a") for i in range(3)]
+        + [event(i, day + timedelta(hours=20), "/b") for i in range(3, 5)]
+        + [event(i, day + timedelta(days=1, hours=1), "/a") for i in range(5, 9)]
+    )
+
+    counts = await page_counts(day + timedelta(hours=12), day + timedelta(days=2))
+
+    assert counts == [{"page": "/a", "count": 4}, {"page": "/b", "count": 2}]
+
+
+async def test_failed_rebuild_keeps_the_previous_counts(mongo, monkeypatch):
+    day = bucket_start(datetime.utcnow(), "day") - timedelta(days=3)
+    await apply_events([event(1, day + timedelta(hours=1)), event(2, day + timedelta(hours=1))])
+    await mongo.analytics.insert_many([event(i, day + timedelta(hours=h)) for i, h in enumerate(range(5))])
+    before = await rollup_counts(mongo, "hour")
+    writes = []
+    bulk_write = rollups.bulk_write
+
+    async def failing_bulk_write(collection, operations, ordered=False):
+        writes.append(len(operations))
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(rollups, "bulk_write", failing_bulk_write)
+    with pytest.raises(RuntimeError):
+        await rebuild_rollups()
+
+    assert writes
+    assert await rollup_counts(mongo, "hour") == before
+    assert await rollup_counts(mongo, "day") == {(day, "/"): 2}
+
+    # The lease was released, so the next run can rebuild
+    monkeypatch.setattr(rollups, "bulk_write", bulk_write)
+    await rebuild_rollups()
+    assert await rollup_counts(mongo, "day") == {(day, "/"): 5}
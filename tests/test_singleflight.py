@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import database
+from database import _canonical_filter, _flight_key, _single_flight
+
+pytestmark = pytest.mark.anyio
+
+
+def slow_query(result, calls, fail=False):
+    async def query():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if fail:
+            raise RuntimeError("query failed")
+        return result
+
+    return query
+
+
+async def test_identical_reads_share_one_query():
+    calls = []
+    query = slow_query([{"_id": 1, "tags": ["a"]}], calls)
+
+    results = await asyncio.gather(*(_single_flight("key", query) for _ in range(4)))
+
+    assert len(calls) == 1
+    assert all(result == [{"_id": 1, "tags": ["a"]}] for result in results)
+    assert database.get_singleflight_stats()["in_flight"] == 0
+
+
+async def test_followers_get_their_own_copy():
+    query = slow_query([{"tags": ["a"]}], [])
+
+    leader, follower = await asyncio.gather(_single_flight("key", query), _single_flight("key", query))
+    follower[0]["tags"].append("b")
+
+    assert leader == [{"tags": ["a"]}]
+
+
+async def test_failure_reaches_every_caller():
+    calls = []
+    query = slow_query(None, calls, fail=True)
+
+    results = await asyncio.gather(*(_single_flight("key", query) for _ in range(3)), return_exceptions=True)
+
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_cancelled_leader_does_not_cancel_followers():
+    query = slow_query(["ok"], [])
+
+    leader = asyncio.create_task(_single_flight("key", query))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(_single_flight("key", query))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == ["ok"]
+
+
+async def test_a_read_after_completion_runs_again():
+    calls = []
+    query = slow_query([], calls)
+
+    await _single_flight("key", query)
+    await _single_flight("key", query)
+
+    assert len(calls) == 2
+
+
+def test_filter_key_order_does_not_change_the_key():
+    first = _canonical_filter({"b": 1, "a": {"$lt": 5, "$gt": 1}})
+    second = _canonical_filter({"a": {"$gt": 1, "$lt": 5}, "b": 1})
+
+    assert _flight_key("find", "c", first) == _flight_key("find", "c", second)
+    # Embedded documents match exactly, so their field order is significant
+    assert list(_canonical_filter({"a": {"y": 1, "x": 2}})["a"]) == ["y", "x"]
+
+
+async def test_find_many_coalesces_equivalent_filters(mongo):
+    await mongo.items.insert_many([{"_id": index, "kind": "a", "rank": index} for index in range(3)])
+    executed = database.get_singleflight_stats()["executed"]
+
+    first, second = await asyncio.gather(
+        database.find_many("items", {"kind": "a", "rank": {"$gte": 1}}, {"rank": 1}),
+        database.find_many("items", {"rank": {"$gte": 1}, "kind": "a"}, {"rank": 1})
+    )
+
+    assert first == second == [{"_id": 1, "kind": "a", "rank": 1}, {"_id": 2, "kind": "a", "rank": 2}]
+    assert database.get_singleflight_stats()["executed"] == executed + 1
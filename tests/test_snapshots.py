@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.snapshots import SnapshotStore
+
+pytestmark = pytest.mark.anyio
+
+
+def counting_compute():
+    calls = []
+
+    async def compute():
+        calls.append(datetime.utcnow())
+        await asyncio.sleep(0.01)
+        return {"version": len(calls)}
+
+    return compute, calls
+
+
+async def test_first_read_computes_once_for_concurrent_callers(mongo):
+    store = SnapshotStore()
+    compute, calls = counting_compute()
+    store.register("dashboard", compute)
+
+    results = await asyncio.gather(*(store.get("dashboard") for _ in range(5)))
+
+    assert len(calls) == 1
+    assert all(data == {"version": 1} for data, _ in results)
+    assert store.stats["misses"] == 5
+
+
+async def test_stale_read_serves_old_data_and_refreshes_in_background(mongo):
+    store = SnapshotStore()
+    store.max_age = 30.0
+    compute, calls = counting_compute()
+    store.register("dashboard", compute)
+    await store.get("dashboard")
+    store._entries["dashboard"].computed_at -= timedelta(seconds=60)
+
+    data, age = await store.get("dashboard")
+
+    assert data == {"version": 1}
+    assert age >= 60
+    assert store.stats["stale_hits"] == 1
+    await asyncio.sleep(0.05)
+    assert (await store.get("dashboard"))[0] == {"version": 2}
+    assert store.stats["hits"] == 1
+
+
+async def test_failed_refresh_keeps_the_previous_snapshot(mongo):
+    store = SnapshotStore()
+    failing = False
+
+    async def compute():
+        if failing:
+            raise RuntimeError("database down")
+        return {"ok": True}
+
+    store.register("dashboard", compute)
+    await store.get("dashboard")
+    failing = True
+    with pytest.raises(RuntimeError):
+        await store.refresh("dashboard")
+
+    assert (await store.get("dashboard"))[0] == {"ok": True}
+    assert store.stats["errors"] == 1
+
+
+async def test_shared_snapshot_is_read_by_other_workers(mongo):
+    first, second = SnapshotStore(), SnapshotStore()
+    first.shared = second.shared = True
+    compute, calls = counting_compute()
+    first.register("dashboard", compute)
+    second.register("dashboard", compute)
+
+    await first.get("dashboard")
+    data, _ = await second.get("dashboard")
+
+    assert data == {"version": 1}
+    assert len(calls) == 1
+    assert (await mongo.snapshots.find_one({"_id": "dashboard"}))["data"] == {"version": 1}
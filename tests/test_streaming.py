@@ -0,0 +1,58 @@
+import pytest
+
+import database
+from database import iter_aggregate, iter_many
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def items(mongo):
+    await mongo.items.insert_many([{"_id": index, "group": index % 2, "rank": index} for index in range(10)])
+
+
+async def test_iter_many_streams_sorted_projected_documents(items):
+    documents = [
+        document async for document in iter_many("items", {"group": 0}, {"rank": -1}, {"rank": 1}, batch_size=2)
+    ]
+
+    assert documents == [{"_id": index, "rank": index} for index in (8, 6, 4, 2, 0)]
+
+
+async def test_iter_many_applies_the_limit(items):
+    documents = [document async for document in iter_many("items", sort_dict={"rank": 1}, limit=3)]
+
+    assert [document["_id"] for document in documents] == [0, 1, 2]
+
+
+async def test_iter_many_closes_the_cursor_when_the_consumer_stops(items, monkeypatch):
+    closed = []
+    collection = database.db.database["items"]
+    find = collection.find
+
+    def tracking_find(*args, **kwargs):
+        cursor = find(*args, **kwargs)
+        close = cursor.close
+
+        async def tracked_close():
+            closed.append(True)
+            return await close()
+
+        cursor.close = tracked_close
+        return cursor
+
+    monkeypatch.setattr(type(collection), "find", lambda self, *args, **kwargs: tracking_find(*args, **kwargs))
+    stream = iter_many("items", batch_size=2)
+    async for _ in stream:
+        break
+    await stream.aclose()
+
+    assert closed == [True]
+
+
+async def test_iter_aggregate_streams_results(items):
+    pipeline = [{"$group": {"_id": "$group", "total": {"$sum": "$rank"}}}, {"$sort": {"_id": 1}}]
+
+    results = [result async for result in iter_aggregate("items", pipeline, batch_size=1)]
+
+    assert results == [{"_id": 0, "total": 20}, {"_id": 1, "total": 25}]
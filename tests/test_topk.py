@@ -0,0 +1,99 @@
+from collections import Counter
+from datetime import datetime
+import random
+
+import pytest
+
+from utils.topk import TOPK_COLLECTION, SpaceSaving, TopKTracker, referrer_host
+
+
+def zipf_stream(items, length, seed=7):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(items)]
+    return rng.choices([f"/page-{rank}" for rank in range(items)], weights=weights, k=length)
+
+
+def test_space_saving_keeps_heavy_hitters_with_bounded_error():
+    stream = zipf_stream(2000, 50_000)
+    exact = Counter(stream)
+    summary = SpaceSaving(100)
+    for item in stream:
+        summary.add(item)
+
+    assert summary.total == len(stream)
+    tracked = {item["item"]: item for item in summary.items()}
+    for item, count in exact.items():
+        if count > len(stream) / summary.capacity:
+            # Guaranteed: anything above total/capacity is tracked
+            assert item in tracked
+    for item, entry in tracked.items():
+        assert entry["count"] - entry["error"] <= exact[item] <= entry["count"]
+
+    top = [entry["item"] for entry in summary.top(5)]
+    assert top == [item for item, _ in exact.most_common(5)]
+
+
+def test_space_saving_merge_adds_checkpoints():
+    first = SpaceSaving(10)
+    second = SpaceSaving(10)
+    for item in ["/a"] * 5 + ["/b"] * 2:
+        first.add(item)
+    for item in ["/a"] * 3 + ["/c"]:
+        second.add(item)
+
+    merged = SpaceSaving(10)
+    merged.merge(first.items(), first.total)
+    merged.merge(second.items(), second.total)
+
+    assert merged.total == 11
+    assert {entry["item"]: entry["count"] for entry in merged.items()} == {"/a": 8, "/b": 2, "/c": 1}
+
+
+def test_merged_full_summaries_keep_count_as_an_upper_bound():
+    streams = [zipf_stream(500, 5000, seed=seed) for seed in (1, 2, 3)]
+    exact = Counter(item for stream in streams for item in stream)
+    merged = SpaceSaving(20)
+    for stream in streams:
+        summary = SpaceSaving(20)
+        for item in stream:
+            summary.add(item)
+        merged.merge(summary.items(), summary.total)
+
+    for entry in merged.items():
+        assert entry["count"] - entry["error"] <= exact[entry["item"]] <= entry["count"]
+
+
+def test_merging_a_summary_that_is_not_full_adds_no_error():
+    merged = SpaceSaving(10)
+    merged.merge([{"item": "/a", "count": 3, "error": 0}], 3)
+    merged.merge([{"item": "/b", "count": 2, "error": 0}], 2)
+
+    assert merged.items() == [{"item": "/a", "count": 3, "error": 0}, {"item": "/b", "count": 2, "error": 0}]
+
+
+@pytest.mark.anyio
+async def test_restart_resumes_todays_checkpoint_without_a_worker_id(mongo):
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    views = [{"type": "page_view", "page": "/a", "timestamp": today, "metadata": {"referrer": "https://x.org/"}}] * 3
+    before = TopKTracker()
+    await before.apply_events(views)
+    await before.checkpoint()
+
+    after = TopKTracker()
+    await after.start(checkpoint_interval=3600, retention_days=0)
+    await after.apply_events(views[:1])
+    await after.stop()
+
+    assert after.worker_id == before.worker_id
+    document = await mongo[TOPK_COLLECTION].find_one({"dimension": "pages", "worker": after.worker_id})
+    assert document["items"] == [{"item": "/a", "count": 4, "error": 0}]
+
+
+@pytest.mark.parametrize("referrer, host", [
+    (None, "(direct)"),
+    ("", "(direct)"),
+    ("https://www.Google.com/search?q=x", "google.com"),
+    ("https://github.com/", "github.com"),
+])
+def test_referrer_host(referrer, host):
+    assert referrer_host(referrer) == host